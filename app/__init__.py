@@ -17,6 +17,37 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', 'dev_secret_key_please_change_in_production'), 
         DATABASE=os.path.join(app.instance_path, 'budget.db'), 
+        NWS_TARGET_RATIOS={'Need': 0.50, 'Want': 0.30, 'Saving': 0.20}, # Default 50/30/20 rule
+        FISCAL_YEAR_START_MONTH=1, # First month of the fiscal year for fiscal-year analytics (e.g. 10 = October)
+        CUBE_MAX_AGE_SECONDS=300, # Full reload interval for the in-memory analytics cube
+        FORECAST_HISTORY_MONTHS=12, # Months of daily spend history behind category forecasts
+        GOAL_PROJECTION_LOOKBACK_MONTHS=24, # Months of funding history behind goal ETAs
+        COMPRESS_ENABLED=True, # gzip/brotli for HTML and JSON responses
+        COMPRESS_MIN_SIZE=1024, # Bytes; smaller bodies are sent uncompressed
+        COMPRESS_LEVEL=6, # gzip level 1-9
+        COMPRESS_BROTLI_QUALITY=5, # brotli quality 0-11 (used only if the brotli package is installed)
+        COMPRESS_CACHE_ENTRIES=64, # Compressed bodies kept in memory, keyed by ETag
+        FRAGMENT_CACHE_ENABLED=True, # Cache rendered template fragments keyed by table versions
+        FRAGMENT_CACHE_ENTRIES=32, # Rendered fragments kept in memory
+        FRAGMENT_CACHE_MAX_BYTES=64 * 1024 * 1024, # Total size of cached fragments (counted in characters of HTML)
+        SINGLE_FLIGHT_ENABLED=True, # Concurrent identical summary/category loads share one execution
+        SINGLE_FLIGHT_WAIT_SECONDS=30, # Waiters give up and compute themselves after this
+        JINJA_BYTECODE_CACHE_DIR=os.path.join(app.instance_path, 'jinja_cache'), # None disables it
+        REPORT_JOB_WORKERS=2, # Background report threads per process
+        REPORT_JOB_MAX_PENDING=8, # Queued + running jobs per process before new submissions get 503
+        REPORT_JOB_STALE_SECONDS=900, # Queued/running jobs without a heartbeat this long are marked failed
+        REPORT_JOB_RETENTION_DAYS=7, # Finished jobs and their files are pruned after this
+        REPORT_OUTPUT_DIR=os.path.join(app.instance_path, 'reports'),
+        BACKUP_DIR=os.path.join(app.instance_path, 'backups'),
+        BACKUP_KEEP=7, # Newest backups kept by rotation
+        BACKUP_PAGES_PER_STEP=256, # Pages copied per backup step (the source is read-locked only per step)
+        BACKUP_STEP_SLEEP_SECONDS=0.05, # Pause between steps so writers get the lock
+        BACKUP_INTERVAL_HOURS=0, # Scheduled backups in a background thread; 0 disables (use 'flask backup-db')
+        ARCHIVE_DATABASE=os.path.join(app.instance_path, 'budget-archive.db'), # Closed years moved by 'flask archive-years'
+        ARCHIVE_KEEP_YEARS=2, # Years before the current one kept live by default
+        DUPLICATE_DATE_WINDOW_DAYS=3, # Same type, amount and description within this many days counts as a duplicate
+        REPORTING_CURRENCY='USD', # Summaries convert to this; transactions/budgets without a currency are in it
+        CASH_FLOW_MAX_DAYS=3660, # Longest range the daily cash-flow endpoint returns
     )
 
     if test_config is None:
@@ -33,10 +64,33 @@ def create_app(test_config=None):
     from . import database
     database.init_app(app) 
 
+    # --- Response Compression ---
+    from .utils import compression
+    compression.init_app(app)
+
+    # --- Background Report Jobs ---
+    from .utils import report_jobs
+    report_jobs.init_app(app)
+
+    # --- Scheduled Backups (optional) ---
+    from .utils import backups
+    backups.init_app(app)
+
+    # --- Template Bytecode Cache ---
+    # Compiled templates persist across restarts and worker processes
+    if app.config.get('JINJA_BYTECODE_CACHE_DIR'):
+        from jinja2 import FileSystemBytecodeCache
+        os.makedirs(app.config['JINJA_BYTECODE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['JINJA_BYTECODE_CACHE_DIR'])
+
     # --- Register Blueprints ---
     from .blueprints import main_routes, transaction_routes, category_routes, budget_routes
     from .blueprints import paycheck_routes 
     from .blueprints import goal_routes 
+    from .blueprints import analytics_routes
+    from .blueprints import report_routes
+    from .blueprints import sync_routes
+    from .blueprints import rule_routes
     
     app.register_blueprint(main_routes.bp) 
     app.register_blueprint(transaction_routes.bp, url_prefix='/transactions') 
@@ -46,10 +100,29 @@ def create_app(test_config=None):
     
     # Updated registration for goal_routes blueprint
     app.register_blueprint(goal_routes.bp, url_prefix='/goals') 
+    app.register_blueprint(analytics_routes.bp, url_prefix='/analytics')
+    app.register_blueprint(report_routes.bp, url_prefix='/reports')
+    app.register_blueprint(sync_routes.bp, url_prefix='/sync')
+    app.register_blueprint(rule_routes.bp, url_prefix='/rules')
     
+    # --- CLI Commands ---
+    app.cli.add_command(paycheck_routes.import_paychecks_command) # 'flask import-paychecks FILE'
+    app.cli.add_command(budget_routes.rebuild_nws_rollup_command) # 'flask rebuild-nws-rollup'
+    app.cli.add_command(backups.backup_db_command) # 'flask backup-db [--keep N] [--no-verify]'
+    from .utils import change_log
+    app.cli.add_command(change_log.compact_change_log_command) # 'flask compact-change-log [--before-seq N]'
+    from .utils import archive
+    app.cli.add_command(archive.archive_years_command) # 'flask archive-years [--before YEAR] [--vacuum]'
+    app.cli.add_command(transaction_routes.import_transactions_command) # 'flask import-transactions FILE'
+    from .utils import categorizer
+    app.cli.add_command(categorizer.recategorize_command) # 'flask recategorize [--only-uncategorized] [--dry-run]'
+    from .utils import currency
+    app.cli.add_command(currency.load_fx_rates_command) # 'flask load-fx-rates FILE...'
+
     # --- Custom Jinja Filters (if any) ---
     from .utils import helpers
     app.jinja_env.filters['month_name'] = helpers.format_month_name
+    app.jinja_env.filters['money'] = currency.format_money
 
     app.logger.info("Flask app created and configured.")
     return app
@@ -0,0 +1,141 @@
+# app/blueprints/analytics_routes.py
+# API endpoints for interactive budget exploration backed by the in-memory analytics cube.
+
+from flask import Blueprint, request, jsonify, current_app
+from app.utils import analytics_cube, cash_flow, chart_payloads, currency, db_helpers, helpers, single_flight
+import datetime
+import time
+
+bp = Blueprint('analytics', __name__) # url_prefix='/analytics' will be set in app/__init__.py
+
+def parse_year_month(value, default):
+    """Parses 'YYYY-MM' into a cube month index, falling back to default on bad input."""
+    if not value:
+        return default
+    try:
+        year_str, month_str = value.split('-')
+        year, month = int(year_str), int(month_str)
+        if not 1 <= month <= 12:
+            return None
+        return analytics_cube.month_index(year, month)
+    except ValueError:
+        return None
+
+@bp.route('/api/cube', methods=['GET'])
+def query_cube():
+    """
+    Slices the category x month x type cube.
+    Query params:
+        start, end (YYYY-MM, inclusive; default: January to December of the current year)
+        level ('main' or 'category'), main_cat_focus (main category ID to drill into)
+        by_month ('true' to keep the month axis), rolling (trailing window in months, with by_month)
+    Returns columnar arrays: labels, category_ids, budgeted, expense, income, variance (and months).
+    """
+    today = datetime.date.today()
+    start = parse_year_month(request.args.get('start'), analytics_cube.month_index(today.year, 1))
+    end = parse_year_month(request.args.get('end'), analytics_cube.month_index(today.year, 12))
+    if start is None or end is None or start > end:
+        return jsonify({'status': 'error', 'message': 'Invalid start/end. Use YYYY-MM with start <= end.'}), 400
+
+    level = request.args.get('level', default='main')
+    if level not in ('main', 'category'):
+        return jsonify({'status': 'error', 'message': "level must be 'main' or 'category'."}), 400
+    by_month = request.args.get('by_month', default='false').lower() in ('true', '1')
+    rolling = request.args.get('rolling', type=int)
+
+    try:
+        cube = analytics_cube.get_cube()
+        started = time.perf_counter()
+        result = cube.query(start, end, level=level,
+                            focused_main_category_id=request.args.get('main_cat_focus', type=int),
+                            by_month=by_month, rolling=rolling)
+        result['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        result['status'] = 'success'
+        return jsonify(result), 200
+    except Exception as e:
+        current_app.logger.error(f"Error in analytics cube query: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/cube/refresh', methods=['POST'])
+def refresh_cube():
+    """Forces a full reload of the analytics cube on the next query."""
+    analytics_cube.invalidate_cube()
+    return jsonify({'status': 'success', 'message': 'Analytics cube will be reloaded on next query.'}), 200
+
+@bp.route('/api/coalescing', methods=['GET'])
+def coalescing_metrics():
+    """
+    Single-flight coalescing counters for this process: calls, executions, coalesced
+    (calls that shared another caller's in-flight execution), timeouts and hit_rate,
+    in total and per coalesced function.
+    """
+    return jsonify({'status': 'success', **single_flight.get_metrics()}), 200
+
+@bp.route('/api/charts', methods=['GET'])
+def get_chart_payload():
+    """
+    Budget vs. actual chart, NWS charts and breakdown rows for one analytics view, in the
+    compact format of chart_payloads.build_chart_payload. Used by charts.js to drill into
+    a main category (main_cat_focus) without reloading the page.
+    Query params: period_type, year, month, quarter, start_date, end_date, pay_date,
+    main_cat_focus (same as the dashboard).
+    """
+    today = datetime.date.today()
+    period_type, year, month = helpers.parse_analytics_view_args(request.args, today.year, today.month)
+    if period_type not in helpers.PERIOD_TYPES:
+        return jsonify({'status': 'error', 'message': f"period_type must be one of: {', '.join(helpers.PERIOD_TYPES)}."}), 400
+    try:
+        summary = db_helpers.get_financial_summary(
+            year=year, month=month, period_type=period_type,
+            focused_main_category_id=request.args.get('main_cat_focus', type=int),
+            **helpers.parse_analytics_range_args(request.args)
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    try:
+        payload = chart_payloads.build_chart_payload(summary)
+        payload.update({'year': year, 'month': month, 'period_type': period_type})
+        return current_app.response_class(chart_payloads.serialize_chart_payload(payload), mimetype='application/json')
+    except Exception as e:
+        current_app.logger.error(f"Error building chart payload: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/cash_flow', methods=['GET'])
+def get_cash_flow():
+    """
+    Daily income/expense cash flow and running balance for a date range.
+    Query params: start_date, end_date (YYYY-MM-DD, inclusive; default: the last 30 days).
+    Returns columnar arrays (dates, income, expense, net, balance) rounded to CHART_PRECISION,
+    plus opening_balance and closing_balance, all in the reporting currency.
+    """
+    today = datetime.date.today()
+    end = helpers.parse_iso_date(request.args.get('end_date')) if request.args.get('end_date') else today
+    if request.args.get('start_date'):
+        start = helpers.parse_iso_date(request.args.get('start_date'))
+    else:
+        start = end - datetime.timedelta(days=min(29, (end - datetime.date.min).days)) if end else None
+    if start is None or end is None or start > end:
+        return jsonify({'status': 'error', 'message': 'Invalid start_date/end_date. Use YYYY-MM-DD with start_date <= end_date.'}), 400
+    if end >= datetime.date.max: # The series reads up to the day after end
+        return jsonify({'status': 'error', 'message': f"end_date must be before {datetime.date.max.isoformat()}."}), 400
+    max_days = current_app.config.get('CASH_FLOW_MAX_DAYS', 3660)
+    if (end - start).days + 1 > max_days:
+        return jsonify({'status': 'error', 'message': f"Range too long; at most {max_days} days."}), 400
+    try:
+        started = time.perf_counter()
+        series = cash_flow.get_daily_cash_flow(start, end)
+        precision = chart_payloads.CHART_PRECISION
+        result = {key: [round(value, precision) for value in series[key]] for key in ('income', 'expense', 'net', 'balance')}
+        result.update({
+            'status': 'success',
+            'start_date': start.isoformat(), 'end_date': end.isoformat(),
+            'currency': currency.get_reporting_currency(),
+            'dates': series['dates'],
+            'opening_balance': round(series['opening_balance'], precision),
+            'closing_balance': result['balance'][-1],
+            'elapsed_ms': (time.perf_counter() - started) * 1000
+        })
+        return jsonify(result), 200
+    except Exception as e:
+        current_app.logger.error(f"Error building cash flow series: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
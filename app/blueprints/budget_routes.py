@@ -2,11 +2,14 @@
 # Blueprint for budget goal management.
 
 from flask import Blueprint, request, redirect, url_for, flash, current_app, jsonify
+from flask.cli import with_appcontext
 from app.database import get_db 
 from app.utils.helpers import format_month_name 
 from app.utils import db_helpers # Import db_helpers to use its functions
+from app.utils import analytics_cube, currency, rollover
 import datetime
 import sqlite3
+import click
 
 
 bp = Blueprint('budgets', __name__) # url_prefix='/budget'
@@ -25,6 +28,8 @@ def set_budget_goal():
         
         category_ids_str = request.form.getlist('budget_category_id') 
         budgeted_amounts_str = request.form.getlist('budgeted_amount')
+        # Optional, aligned with the ids; without it each budget keeps its currency
+        budget_currencies_str = request.form.getlist('budget_currency')
 
         if not all([year, month]):
             flash("Year and month are required and must be valid numbers for budget setting.", "error")
@@ -34,11 +39,22 @@ def set_budget_goal():
             flash("Data mismatch: Number of category IDs does not match number of budget amounts.", "error")
             current_app.logger.error("Budget setting failed: Category IDs and amounts list length mismatch.")
             has_errors = True
+        elif budget_currencies_str and len(budget_currencies_str) != len(category_ids_str):
+            flash("Data mismatch: Number of category IDs does not match number of budget currencies.", "error")
+            current_app.logger.error("Budget setting failed: Category IDs and currencies list length mismatch.")
+            has_errors = True
         
         if not has_errors:
             conn = get_db()
             updated_count = 0
             processed_categories = 0 
+            # Previous amounts for this month (in the reporting currency), so the analytics cube can be updated by delta
+            converted_query = f"""
+                SELECT b.category_id, {currency.budget_amount_sql('b')} AS amount FROM budget_goals b
+                WHERE b.year = ? AND b.month = ?
+            """
+            previous_amounts = {row['category_id']: row['amount'] for row in conn.execute(converted_query, (year, month))}
+            saved_amounts = {}
 
             for i in range(len(category_ids_str)):
                 try:
@@ -62,21 +78,36 @@ def set_budget_goal():
                             flash(f"Invalid amount '{amount_str}' for category ID {cat_id}. Setting to 0.", "warning")
                             budgeted_amount = 0.0 
                     
-                    current_app.logger.info(f"Processing budget for Cat ID: {cat_id}, Year: {year}, Month: {month}, Amount: {budgeted_amount}")
+                    budget_currency = None
+                    if budget_currencies_str:
+                        if currency.is_valid_currency(budget_currencies_str[i]):
+                            budget_currency = currency.normalize_currency(budget_currencies_str[i])
+                        else:
+                            flash(f"Invalid currency '{budget_currencies_str[i]}' for category ID {cat_id}. Using {currency.get_reporting_currency()}.", "warning")
+
+                    current_app.logger.info(f"Processing budget for Cat ID: {cat_id}, Year: {year}, Month: {month}, Amount: {budgeted_amount} {budget_currency or ''}")
                     cursor = conn.execute("""
-                        INSERT INTO budget_goals (category_id, year, month, budgeted_amount) 
-                        VALUES (?, ?, ?, ?)
+                        INSERT INTO budget_goals (category_id, year, month, budgeted_amount, currency) 
+                        VALUES (?, ?, ?, ?, ?)
                         ON CONFLICT(category_id, year, month) DO UPDATE SET
-                        budgeted_amount = excluded.budgeted_amount;
-                    """, (cat_id, year, month, budgeted_amount))
+                        budgeted_amount = excluded.budgeted_amount,
+                        currency = CASE WHEN ? THEN excluded.currency ELSE currency END;
+                    """, (cat_id, year, month, budgeted_amount, budget_currency, bool(budget_currencies_str)))
                     if cursor.rowcount > 0 : 
                         updated_count +=1 
+                    saved_amounts[cat_id] = budgeted_amount
                 except ValueError as ve: 
                     flash(f"Invalid category ID format '{category_ids_str[i]}'. Skipped.", "warning")
                     current_app.logger.warning(f"ValueError for category ID '{category_ids_str[i]}': {ve}")
                     continue 
             
+            cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
             conn.commit()
+            if saved_amounts:
+                new_amounts = {row['category_id']: row['amount'] for row in conn.execute(converted_query, (year, month))}
+                for cat_id in saved_amounts:
+                    analytics_cube.record_amount_change(cat_id, (year, month), 'budgeted',
+                                                        new_amounts.get(cat_id, 0.0) - previous_amounts.get(cat_id, 0.0), cube=cube)
 
             if updated_count > 0:
                 flash(f"{updated_count} budget goal(s) saved successfully for {format_month_name(month)} {year}!", "success")
@@ -126,4 +157,146 @@ def get_planning_data():
         })
     except Exception as e:
         current_app.logger.error(f"Error in get_planning_data: {e}", exc_info=True)
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+def parse_nws_targets(targets_str):
+    """
+    Parses target ratios such as '50/30/20' or '0.5,0.3,0.2' (Needs, Wants, Savings).
+    Returns a dict keyed by goal type, or None if the string is invalid.
+    """
+    parts = targets_str.replace('/', ',').split(',')
+    if len(parts) != 3:
+        return None
+    try:
+        values = [float(p) for p in parts]
+    except ValueError:
+        return None
+    total = sum(values)
+    if total <= 0 or any(v < 0 for v in values):
+        return None
+    return dict(zip(['Need', 'Want', 'Saving'], (v / total for v in values)))
+
+
+@bp.route('/api/nws_ratios', methods=['GET'])
+def get_nws_ratios():
+    """
+    Needs/Wants/Savings spending ratios per month for a span, compared with target ratios.
+    Query params: start_year, start_month, end_year, end_month (default: the last 12 months
+    ending this month), targets (optional, e.g. '50/30/20'; defaults to NWS_TARGET_RATIOS).
+    Ratios are shares of the month's total (actual or budgeted) expense amount.
+    """
+    today = datetime.date.today()
+    end_year = request.args.get('end_year', default=today.year, type=int)
+    end_month = request.args.get('end_month', default=today.month, type=int)
+    default_start = (end_year * 12 + end_month - 1) - 11
+    start_year = request.args.get('start_year', default=default_start // 12, type=int)
+    start_month = request.args.get('start_month', default=default_start % 12 + 1, type=int)
+    if not (1 <= start_month <= 12 and 1 <= end_month <= 12) or (start_year, start_month) > (end_year, end_month):
+        return jsonify({'status': 'error', 'message': 'Invalid month span.'}), 400
+
+    if request.args.get('targets'):
+        targets = parse_nws_targets(request.args['targets'])
+        if targets is None:
+            return jsonify({'status': 'error', 'message': "Invalid targets. Use e.g. '50/30/20'."}), 400
+    else:
+        targets = current_app.config['NWS_TARGET_RATIOS']
+
+    try:
+        rows = db_helpers.get_nws_rollup((start_year, start_month), (end_year, end_month))
+    except Exception as e:
+        current_app.logger.error(f"Error in nws_ratios: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    goal_types = list(db_helpers.NWS_GOAL_TYPE_INDEX)
+    months = {}
+    span_totals = {'actual': dict.fromkeys(goal_types, 0.0), 'budgeted': dict.fromkeys(goal_types, 0.0)}
+    for row in rows:
+        key = f"{row['year']:04d}-{row['month']:02d}"
+        month_totals = months.setdefault(key, {'actual': dict.fromkeys(goal_types, 0.0), 'budgeted': dict.fromkeys(goal_types, 0.0)})
+        goal_type = row['goal_type'] if row['goal_type'] in month_totals['actual'] else 'Unclassified'
+        for kind, amount in (('actual', row['actual_amount']), ('budgeted', row['budgeted_amount'])):
+            month_totals[kind][goal_type] += amount
+            span_totals[kind][goal_type] += amount
+
+    def with_ratios(totals):
+        result = {}
+        for kind, amounts in totals.items():
+            total = sum(amounts.values())
+            ratios = {t: (amounts[t] / total if total > 0 else None) for t in goal_types}
+            result[kind] = {
+                'amounts': amounts,
+                'ratios': ratios,
+                'variance_from_target': {t: (ratios[t] - targets[t] if ratios[t] is not None else None) for t in targets}
+            }
+        return result
+
+    return jsonify({
+        'status': 'success',
+        'start': f"{start_year:04d}-{start_month:02d}",
+        'end': f"{end_year:04d}-{end_month:02d}",
+        'targets': targets,
+        'months': [dict(month=key, **with_ratios(months[key])) for key in sorted(months)],
+        'span': with_ratios(span_totals)
+    })
+
+
+@bp.route('/api/rollover', methods=['GET'])
+def get_rollover_envelopes():
+    """
+    Envelope balances of rollover categories: budgeted, actual, carry_in and available per month.
+    Query params: start_year, start_month, end_year, end_month (default: this month only).
+    """
+    today = datetime.date.today()
+    end_year = request.args.get('end_year', default=today.year, type=int)
+    end_month = request.args.get('end_month', default=today.month, type=int)
+    start_year = request.args.get('start_year', default=end_year, type=int)
+    start_month = request.args.get('start_month', default=end_month, type=int)
+    if not (1 <= start_month <= 12 and 1 <= end_month <= 12) or (start_year, start_month) > (end_year, end_month):
+        return jsonify({'status': 'error', 'message': 'Invalid month span.'}), 400
+    try:
+        db = get_db()
+        envelopes = rollover.get_envelopes((start_year, start_month), (end_year, end_month), db)
+        names = {row['id']: (row['name'], row['rollover_since']) for row in db.execute(
+            "SELECT id, name, rollover_since FROM categories WHERE rollover_since IS NOT NULL").fetchall()}
+    except Exception as e:
+        current_app.logger.error(f"Error in rollover envelopes: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({
+        'status': 'success',
+        'start': f"{start_year:04d}-{start_month:02d}",
+        'end': f"{end_year:04d}-{end_month:02d}",
+        'currency': currency.get_reporting_currency(),
+        'categories': [{'category_id': category_id, 'name': names[category_id][0], 'rollover_since': names[category_id][1][:7],
+                        'months': months} for category_id, months in envelopes.items() if category_id in names]
+    })
+
+@bp.route('/api/rollover/<int:category_id>', methods=['POST'])
+def set_category_rollover(category_id):
+    """
+    Enables or disables rollover for a category. JSON body: {'enabled': bool, 'since': 'YYYY-MM'}
+    (since defaults to the current month). Changing since re-bases the carry, since the
+    running total starts there.
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        since = None
+        if payload.get('enabled', True):
+            since = rollover.parse_rollover_since(payload.get('since') or datetime.date.today().strftime('%Y-%m'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    try:
+        if not rollover.set_rollover(category_id, since):
+            return jsonify({'status': 'error', 'message': 'Category not found.'}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error setting rollover for category {category_id}: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({'status': 'success', 'category_id': category_id, 'rollover_since': since[:7] if since else None})
+
+
+@click.command('rebuild-nws-rollup')
+@with_appcontext
+def rebuild_nws_rollup_command():
+    """CLI command to recompute the Needs/Wants/Savings monthly rollup from scratch."""
+    row_count = db_helpers.rebuild_nws_rollup()
+    click.echo(f"Rebuilt NWS rollup ({row_count} rows).")
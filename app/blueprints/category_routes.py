@@ -1,6 +1,7 @@
 # app/blueprints/category_routes.py
 from flask import Blueprint, request, redirect, url_for, flash, jsonify, current_app
 from app.database import get_db
+from app.utils import analytics_cube
 import sqlite3
 
 bp = Blueprint('categories', __name__)
@@ -27,105 +28,110 @@ def save_all_category_changes():
     deletion_errors = [] 
 
     try:
+        # --- Start Transaction: validation and all writes are atomic ---
+        # IMMEDIATE takes the write lock up front so the pre-checks cannot be invalidated
+        # by a concurrent writer before the changes below are applied.
+        conn.execute("BEGIN IMMEDIATE")
+
         # --- Stage 0: Pre-deletion checks for categories marked for deletion ---
+        # Each check is a single grouped query over all candidate IDs.
         valid_deletions = [] 
         
         if deletions_ids:
             current_app.logger.info(f"Starting pre-deletion checks for IDs: {deletions_ids}")
             placeholders = ','.join('?' for _ in deletions_ids)
-            if not placeholders: 
-                current_app.logger.warning("Placeholders for deletion query are empty, though deletions_ids is not.")
-            else:
-                categories_to_delete_details = cursor.execute(
-                    f"SELECT id, name, parent_id FROM categories WHERE id IN ({placeholders})", 
-                    deletions_ids
-                ).fetchall()
-                
-                categories_to_delete_map = {row['id']: row for row in categories_to_delete_details}
-                current_app.logger.info(f"Fetched details for deletion candidates: {categories_to_delete_map}")
-
-                main_cats_to_delete_ids = [cid for cid in deletions_ids if categories_to_delete_map.get(cid) and categories_to_delete_map[cid]['parent_id'] is None]
-                sub_cats_to_delete_ids = [cid for cid in deletions_ids if categories_to_delete_map.get(cid) and categories_to_delete_map[cid]['parent_id'] is not None]
-                current_app.logger.info(f"Main cats marked for del: {main_cats_to_delete_ids}, Sub cats marked for del: {sub_cats_to_delete_ids}")
-
-                # Check all categories (subs and mains)
-                for cat_id in deletions_ids: # Iterate original list to check all marked items
-                    cat_info = categories_to_delete_map.get(cat_id)
-                    if not cat_info:
-                        current_app.logger.warning(f"Category ID {cat_id} marked for deletion not found in DB query results during pre-check.")
-                        deletion_errors.append(f"Category ID {cat_id} marked for deletion was not found in the database.")
-                        continue
-                    
-                    cat_name = cat_info['name']
-                    is_main_category = cat_info['parent_id'] is None
-                    current_app.logger.info(f"Pre-checking {'main' if is_main_category else 'sub'}category for deletion: '{cat_name}' (ID: {cat_id})")
+            categories_to_delete_details = cursor.execute(
+                f"SELECT id, name, parent_id FROM categories WHERE id IN ({placeholders})", 
+                deletions_ids
+            ).fetchall()
+            categories_to_delete_map = {row['id']: row for row in categories_to_delete_details}
+            current_app.logger.info(f"Fetched details for deletion candidates: {categories_to_delete_map}")
 
-                    # Check for linked transactions
-                    if cursor.execute("SELECT 1 FROM transactions WHERE category_id = ? LIMIT 1", (cat_id,)).fetchone():
-                        err_msg = f"Category '{cat_name}' (ID: {cat_id}) has linked transactions and cannot be deleted yet."
-                        current_app.logger.warning(err_msg)
-                        deletion_errors.append(err_msg)
-                        continue # Move to next category in deletions_ids
+            ids_with_transactions = {row['category_id'] for row in cursor.execute(
+                f"SELECT category_id FROM transactions WHERE category_id IN ({placeholders}) "
+                f"UNION SELECT category_id FROM transaction_splits WHERE category_id IN ({placeholders}) "
+                f"UNION SELECT category_id FROM archive_monthly_summary WHERE category_id IN ({placeholders})",
+                deletions_ids * 3
+            )}
+            # Only *non-zero* budget goals block deletion
+            ids_with_budgets = {row['category_id'] for row in cursor.execute(
+                f"SELECT DISTINCT category_id FROM budget_goals WHERE category_id IN ({placeholders}) AND budgeted_amount != 0",
+                deletions_ids
+            )}
+            # Subcategories of candidate main categories that are not themselves marked for deletion
+            remaining_subs_by_parent = {}
+            for sub_row in cursor.execute(
+                f"SELECT id, name, parent_id FROM categories WHERE parent_id IN ({placeholders}) AND id NOT IN ({placeholders}) ORDER BY parent_id, id",
+                deletions_ids + deletions_ids
+            ):
+                remaining_subs_by_parent.setdefault(sub_row['parent_id'], []).append(f"'{sub_row['name']}' (ID: {sub_row['id']})")
 
-                    # MODIFICATION: Refined budget goal check
-                    # Check if there are any *non-zero* budget goals
-                    budget_goal_check_cursor = cursor.execute(
-                        "SELECT 1 FROM budget_goals WHERE category_id = ? AND budgeted_amount != 0 LIMIT 1", (cat_id,)
-                    )
-                    if budget_goal_check_cursor.fetchone():
-                        err_msg = f"Category '{cat_name}' (ID: {cat_id}) has non-zero budget goals and cannot be deleted yet."
-                        current_app.logger.warning(err_msg)
-                        deletion_errors.append(err_msg)
-                        continue # Move to next category in deletions_ids
+            # Check all categories (subs and mains)
+            for cat_id in deletions_ids: # Iterate original list to check all marked items
+                cat_info = categories_to_delete_map.get(cat_id)
+                if not cat_info:
+                    current_app.logger.warning(f"Category ID {cat_id} marked for deletion not found in DB query results during pre-check.")
+                    deletion_errors.append(f"Category ID {cat_id} marked for deletion was not found in the database.")
+                    continue
+                
+                cat_name = cat_info['name']
+                is_main_category = cat_info['parent_id'] is None
 
-                    if is_main_category:
-                        sub_check_cursor = cursor.execute("SELECT id, name FROM categories WHERE parent_id = ?", (cat_id,))
-                        remaining_subs_details = []
-                        has_remaining_subs = False
-                        for sub_row in sub_check_cursor.fetchall():
-                            if sub_row['id'] not in deletions_ids: 
-                                has_remaining_subs = True
-                                remaining_subs_details.append(f"'{sub_row['name']}' (ID: {sub_row['id']})")
-                        if has_remaining_subs:
-                            err_msg = f"Main category '{cat_name}' (ID: {cat_id}) still has subcategories not marked for deletion: {', '.join(remaining_subs_details)}. Delete or mark subcategories for deletion first."
-                            current_app.logger.warning(err_msg)
-                            deletion_errors.append(err_msg)
-                            continue # Move to next category in deletions_ids
-                    
-                    # If all checks passed for this cat_id
+                if cat_id in ids_with_transactions:
+                    err_msg = f"Category '{cat_name}' (ID: {cat_id}) has linked transactions and cannot be deleted yet."
+                elif cat_id in ids_with_budgets:
+                    err_msg = f"Category '{cat_name}' (ID: {cat_id}) has non-zero budget goals and cannot be deleted yet."
+                elif is_main_category and cat_id in remaining_subs_by_parent:
+                    err_msg = f"Main category '{cat_name}' (ID: {cat_id}) still has subcategories not marked for deletion: {', '.join(remaining_subs_by_parent[cat_id])}. Delete or mark subcategories for deletion first."
+                else:
                     valid_deletions.append(cat_id)
-                    current_app.logger.info(f"Category '{cat_name}' (ID: {cat_id}) PASSED all pre-deletion checks.")
+                    continue
+                current_app.logger.warning(err_msg)
+                deletion_errors.append(err_msg)
         
         if deletion_errors: # If any category failed its checks
+            conn.rollback()
             current_app.logger.error(f"Pre-deletion checks failed for one or more categories. Errors: {deletion_errors}")
             # We join all errors found, so the user knows everything that's blocking.
             return jsonify({'status': 'error', 'message': "Deletion pre-checks failed: " + " | ".join(deletion_errors)}), 400
 
-        # --- Start Transaction (if desired for all operations to be atomic) ---
-        # conn.execute("BEGIN") # Example: Start transaction
-
         # --- Stage 1: Add New Main Categories ---
+        # Existing names are looked up in one query; the rest are inserted with one executemany.
+        main_items = []
         for main_cat_item in new_main_categories_data:
             name = main_cat_item.get('name','').strip()
-            temp_id = main_cat_item.get('temp_id') 
             if not name:
                 processed_messages.append({'type': 'warning', 'text': f"A new main category with an empty name was ignored."})
                 continue
-            try:
-                cursor.execute("INSERT INTO categories (name, parent_id, financial_goal_type) VALUES (?, NULL, NULL)", (name,))
-                db_id = cursor.lastrowid
-                if temp_id: 
-                    temp_main_id_to_db_id[temp_id] = db_id
-                processed_messages.append({'type': 'info', 'text': f"Added main category: {name}"})
-            except sqlite3.IntegrityError:
-                existing_main = cursor.execute("SELECT id FROM categories WHERE name = ? AND parent_id IS NULL", (name,)).fetchone()
-                if existing_main and temp_id:
-                    temp_main_id_to_db_id[temp_id] = existing_main['id']
-                processed_messages.append({'type': 'warning', 'text': f"Main category '{name}' already exists or could not be added."})
+            main_items.append((name, main_cat_item.get('temp_id')))
+
+        if main_items:
+            main_names = list(dict.fromkeys(name for name, _ in main_items))
+            name_placeholders = ','.join('?' for _ in main_names)
+            existing_main_names = {row['name'] for row in cursor.execute(
+                f"SELECT name FROM categories WHERE parent_id IS NULL AND name IN ({name_placeholders})", main_names
+            )}
+            cursor.executemany(
+                "INSERT INTO categories (name, parent_id, financial_goal_type) VALUES (?, NULL, NULL)",
+                [(name,) for name in main_names if name not in existing_main_names]
+            )
+            main_name_to_db_id = {row['name']: row['id'] for row in cursor.execute(
+                f"SELECT id, name FROM categories WHERE parent_id IS NULL AND name IN ({name_placeholders})", main_names
+            )}
+            added_main_names = set()
+            for name, temp_id in main_items:
+                if temp_id and name in main_name_to_db_id:
+                    temp_main_id_to_db_id[temp_id] = main_name_to_db_id[name]
+                if name in existing_main_names or name in added_main_names:
+                    processed_messages.append({'type': 'warning', 'text': f"Main category '{name}' already exists or could not be added."})
+                else:
+                    added_main_names.add(name)
+                    processed_messages.append({'type': 'info', 'text': f"Added main category: {name}"})
 
         # --- Stage 2: Add New Subcategories ---
+        # Parent existence and existing (name, parent) pairs are checked in one query, then inserted in one batch.
+        sub_items = []
         for sub_cat_item in new_sub_categories_data:
-            # ... (rest of add sub logic from previous version, no changes here) ...
             name = sub_cat_item.get('name','').strip()
             parent_id_or_temp_id = sub_cat_item.get('parent_id_or_temp_id')
             financial_goal_type = sub_cat_item.get('financial_goal_type')
@@ -145,72 +151,97 @@ def save_all_category_changes():
             if actual_parent_db_id is None:
                 processed_messages.append({'type': 'warning', 'text': f"Could not find or resolve parent for subcategory '{name}'. Ignored."})
                 continue
-            try:
-                cursor.execute( "INSERT INTO categories (name, parent_id, financial_goal_type) VALUES (?, ?, ?)", (name, actual_parent_db_id, db_financial_goal_type))
-                processed_messages.append({'type': 'info', 'text': f"Added subcategory: {name}"})
-            except sqlite3.IntegrityError: processed_messages.append({'type': 'warning', 'text': f"Subcategory '{name}' under selected parent already exists or could not be added."})
-            except Exception as e_sub: processed_messages.append({'type': 'error', 'text': f"Error adding subcategory '{name}': {e_sub}"})
+            sub_items.append((name, actual_parent_db_id, db_financial_goal_type))
+
+        if sub_items:
+            parent_ids = list({parent_id for _, parent_id, _ in sub_items})
+            parent_placeholders = ','.join('?' for _ in parent_ids)
+            existing_parent_ids = set()
+            existing_pairs = set()
+            for row in cursor.execute(f"""
+                SELECT id AS parent_id, NULL AS name FROM categories WHERE id IN ({parent_placeholders})
+                UNION ALL
+                SELECT parent_id, name FROM categories WHERE parent_id IN ({parent_placeholders})
+            """, parent_ids + parent_ids):
+                if row['name'] is None:
+                    existing_parent_ids.add(row['parent_id'])
+                else:
+                    existing_pairs.add((row['name'], row['parent_id']))
+
+            sub_rows_to_insert = []
+            for name, parent_id, db_financial_goal_type in sub_items:
+                if parent_id not in existing_parent_ids:
+                    processed_messages.append({'type': 'warning', 'text': f"Could not find or resolve parent for subcategory '{name}'. Ignored."})
+                elif (name, parent_id) in existing_pairs:
+                    processed_messages.append({'type': 'warning', 'text': f"Subcategory '{name}' under selected parent already exists or could not be added."})
+                else:
+                    existing_pairs.add((name, parent_id))
+                    sub_rows_to_insert.append((name, parent_id, db_financial_goal_type))
+                    processed_messages.append({'type': 'info', 'text': f"Added subcategory: {name}"})
+            cursor.executemany(
+                "INSERT INTO categories (name, parent_id, financial_goal_type) VALUES (?, ?, ?)", sub_rows_to_insert
+            )
 
         # --- Stage 3: Update Financial Types ---
+        # Only subcategories carry a financial type; they are resolved in one query and updated in one batch.
         updated_type_count = 0
+        requested_types = {}
         for type_update in financial_type_updates:
-            # ... (rest of update financial types logic from previous version, no changes here) ...
             cat_id_str = type_update.get('id')
             if not cat_id_str or not cat_id_str.isdigit(): continue 
             cat_id = int(cat_id_str)
             if cat_id in valid_deletions: continue 
             new_type = type_update.get('type')
-            category_info = cursor.execute("SELECT parent_id FROM categories WHERE id = ?", (cat_id,)).fetchone()
-            if category_info and category_info['parent_id'] is not None:
-                db_new_type = new_type if new_type in ['Need', 'Want', 'Saving'] else None
-                update_cursor = cursor.execute("UPDATE categories SET financial_goal_type = ? WHERE id = ?", (db_new_type, cat_id))
-                if update_cursor.rowcount > 0: updated_type_count += 1
+            requested_types[cat_id] = new_type if new_type in ['Need', 'Want', 'Saving'] else None
+        if requested_types:
+            type_placeholders = ','.join('?' for _ in requested_types)
+            sub_ids = [row['id'] for row in cursor.execute(
+                f"SELECT id FROM categories WHERE id IN ({type_placeholders}) AND parent_id IS NOT NULL", list(requested_types)
+            )]
+            update_cursor = cursor.executemany(
+                "UPDATE categories SET financial_goal_type = ? WHERE id = ?",
+                [(requested_types[cat_id], cat_id) for cat_id in sub_ids]
+            )
+            updated_type_count = max(update_cursor.rowcount, 0)
         if updated_type_count > 0: processed_messages.append({'type': 'info', 'text': f"{updated_type_count} financial type(s) updated."})
 
         # --- Stage 4: Process Deletions (using valid_deletions) ---
         deleted_count = 0
         if valid_deletions: 
             current_app.logger.info(f"Proceeding to delete category IDs that passed checks: {valid_deletions}")
-            # Re-fetch details to ensure correct parent_id status for ordering deletion,
-            # and to get names for logging/messages.
-            placeholders_del = ','.join('?' for _ in valid_deletions)
-            cats_for_deletion_final = cursor.execute(
-                f"SELECT id, parent_id, name FROM categories WHERE id IN ({placeholders_del})",
-                valid_deletions
-            ).fetchall()
-            
-            del_sub_ids = [r['id'] for r in cats_for_deletion_final if r['parent_id'] is not None]
-            del_main_ids = [r['id'] for r in cats_for_deletion_final if r['parent_id'] is None]
-            
+            del_sub_rows = [categories_to_delete_map[cid] for cid in valid_deletions if categories_to_delete_map[cid]['parent_id'] is not None]
+            del_main_rows = [categories_to_delete_map[cid] for cid in valid_deletions if categories_to_delete_map[cid]['parent_id'] is None]
             cat_names_deleted = []
 
-            for cat_id_to_delete in del_sub_ids:
-                cat_name_to_delete = next((r['name'] for r in cats_for_deletion_final if r['id'] == cat_id_to_delete), f"ID {cat_id_to_delete}")
-                current_app.logger.info(f"Deleting subcategory '{cat_name_to_delete}' (ID {cat_id_to_delete})")
-                cursor.execute("DELETE FROM categories WHERE id = ?", (cat_id_to_delete,))
-                deleted_count += 1
-                cat_names_deleted.append(f"'{cat_name_to_delete}' (Subcategory)")
-            
-            for cat_id_to_delete in del_main_ids:
-                cat_name_to_delete = next((r['name'] for r in cats_for_deletion_final if r['id'] == cat_id_to_delete), f"ID {cat_id_to_delete}")
+            # Subcategories first so their parents are free to be deleted
+            if del_sub_rows:
+                cursor.executemany("DELETE FROM categories WHERE id = ?", [(r['id'],) for r in del_sub_rows])
+                deleted_count += len(del_sub_rows)
+                cat_names_deleted.extend(f"'{r['name']}' (Subcategory)" for r in del_sub_rows)
+
+            if del_main_rows:
+                main_placeholders = ','.join('?' for _ in del_main_rows)
                 # Safety: Final check for remaining subcategories (should have been caught by pre-check)
-                if cursor.execute("SELECT 1 FROM categories WHERE parent_id = ? LIMIT 1", (cat_id_to_delete,)).fetchone():
-                    err_msg = f"Main category '{cat_name_to_delete}' (ID: {cat_id_to_delete}) still has subcategories. Deletion aborted for this item."
-                    processed_messages.append({'type': 'error', 'text': err_msg})
-                    current_app.logger.error(f"Critical safety check failed: {err_msg}")
-                    # This indicates a flaw in pre-check logic or a race condition.
-                    # For now, we just log and add to processed_messages, a full rollback might be better.
-                else:
-                    current_app.logger.info(f"Deleting main category '{cat_name_to_delete}' (ID {cat_id_to_delete})")
-                    cursor.execute("DELETE FROM categories WHERE id = ?", (cat_id_to_delete,))
-                    deleted_count += 1
-                    cat_names_deleted.append(f"'{cat_name_to_delete}' (Main Category)")
+                mains_with_subs = {row['parent_id'] for row in cursor.execute(
+                    f"SELECT DISTINCT parent_id FROM categories WHERE parent_id IN ({main_placeholders})",
+                    [r['id'] for r in del_main_rows]
+                )}
+                for r in del_main_rows:
+                    if r['id'] in mains_with_subs:
+                        err_msg = f"Main category '{r['name']}' (ID: {r['id']}) still has subcategories. Deletion aborted for this item."
+                        processed_messages.append({'type': 'error', 'text': err_msg})
+                        current_app.logger.error(f"Critical safety check failed: {err_msg}")
+                mains_to_delete = [r for r in del_main_rows if r['id'] not in mains_with_subs]
+                cursor.executemany("DELETE FROM categories WHERE id = ?", [(r['id'],) for r in mains_to_delete])
+                deleted_count += len(mains_to_delete)
+                cat_names_deleted.extend(f"'{r['name']}' (Main Category)" for r in mains_to_delete)
             
             if deleted_count > 0:
                  processed_messages.append({'type': 'info', 'text': f"Successfully deleted {deleted_count} categor(y/ies): {', '.join(cat_names_deleted)}."})
         
         # --- Commit all changes (or rollback if any stage had a critical failure earlier) ---
         conn.commit() 
+        analytics_cube.invalidate_cube() # Category structure changed
         current_app.logger.info(f"Save_all_category_changes completed. Processed messages: {processed_messages}")
         
         # Determine overall status and flash messages
@@ -265,7 +296,10 @@ def delete_category(category_id):
             if subcategories: 
                 flash(f"Cannot delete main category '{category_name}'. It still has subcategories. Please delete or reassign them first.", 'error')
                 return redirect(redirect_url)
-        transactions_linked = conn.execute("SELECT 1 FROM transactions WHERE category_id = ? LIMIT 1", (category_id,)).fetchone()
+        transactions_linked = conn.execute(
+            "SELECT 1 FROM transactions WHERE category_id = ? UNION ALL SELECT 1 FROM transaction_splits WHERE category_id = ? "
+            "UNION ALL SELECT 1 FROM archive_monthly_summary WHERE category_id = ? LIMIT 1",
+            (category_id, category_id, category_id)).fetchone()
         if transactions_linked:
             flash(f"Cannot delete category '{category_name}'. It is used in transactions. Please reassign them first or ensure transactions are deleted.", 'error')
             return redirect(redirect_url)
@@ -283,6 +317,7 @@ def delete_category(category_id):
 
         conn.execute("DELETE FROM categories WHERE id = ?", (category_id,))
         conn.commit()
+        analytics_cube.invalidate_cube()
         flash(f"Category '{category_name}' deleted successfully.", 'success')
         return redirect(redirect_url)
     except sqlite3.IntegrityError as e: 
@@ -1,11 +1,11 @@
 # app/blueprints/main_routes.py
 # Blueprint for main application routes like the dashboard.
 
-from flask import Blueprint, render_template, request, g, current_app
+from flask import Blueprint, render_template, request, g, current_app, flash
 from app.database import get_db 
 from app.utils import db_helpers # Ensure db_helpers is imported
+from app.utils import fragment_cache, chart_payloads, helpers, change_log, archive, currency, cash_flow
 import datetime
-import json
 
 bp = Blueprint('main', __name__)
 
@@ -16,8 +16,9 @@ def get_dynamic_year_options(conn, current_year_int):
 
     budget_years_cursor = conn.execute("SELECT DISTINCT year FROM budget_goals ORDER BY year DESC")
     budget_years = {str(row['year']) for row in budget_years_cursor.fetchall() if row['year'] is not None} 
+    archived_years = {str(year) for year in archive.get_archived_years(conn)}
     
-    all_years_str = transaction_years.union(budget_years)
+    all_years_str = transaction_years.union(budget_years, archived_years)
     all_years_str.add(str(current_year_int))
     all_years_str.add(str(current_year_int - 1)) 
     all_years_str.add(str(current_year_int + 1)) 
@@ -39,6 +40,48 @@ def get_dynamic_year_options(conn, current_year_int):
     return [str(y) for y in sorted_years_str] 
 
 
+def get_transactions_for_history(conn):
+    """Returns all transactions, newest first, with display names for the history table."""
+    transactions_data = conn.execute("""
+        SELECT t.id, t.amount, t.category_id, c.name as category_name, 
+               c.parent_id as category_parent_id, p.name as parent_category_name, 
+               t.date, t.type, t.description, t.currency, sp.split_count, sp.split_names
+        FROM transactions t LEFT JOIN categories c ON t.category_id = c.id
+        LEFT JOIN categories p ON c.parent_id = p.id
+        LEFT JOIN (
+            SELECT s.transaction_id, COUNT(*) AS split_count, group_concat(COALESCE(sc.name, 'Uncategorized'), ', ') AS split_names
+            FROM transaction_splits s LEFT JOIN categories sc ON sc.id = s.category_id
+            GROUP BY s.transaction_id
+        ) sp ON sp.transaction_id = t.id
+        ORDER BY t.date DESC, t.id DESC
+    """).fetchall()
+    
+    transactions_list = []
+    for t_row in transactions_data:
+        full_category_name = t_row['category_name']
+        main_category_for_edit = None 
+        if t_row['parent_category_name']: 
+            full_category_name = f"{t_row['parent_category_name']} → {t_row['category_name']}"
+            main_category_for_edit = t_row['category_parent_id'] 
+        elif t_row['category_name'] is None and t_row['category_id'] is not None: 
+            full_category_name = "Error: Invalid Category Link"
+        elif t_row['category_id'] is None: 
+            full_category_name = "Uncategorized"
+        else: 
+            main_category_for_edit = t_row['category_id']
+        if t_row['split_count']: # The parent keeps its largest line's category for editing
+            full_category_name = f"Split: {t_row['split_names']}"
+            
+        transactions_list.append({
+            'id': t_row['id'], 'amount': t_row['amount'], 
+            'full_category_name': full_category_name, 'date': t_row['date'], 'type': t_row['type'],
+            'description': t_row['description'], 'currency': t_row['currency'],
+            'category_id': t_row['category_id'], 
+            'main_category_for_edit': main_category_for_edit,
+            'split_count': t_row['split_count'] or 0
+        })
+    return transactions_list
+
 @bp.route('/')
 def index():
     conn = get_db()
@@ -47,22 +90,9 @@ def index():
     current_month_int = current_time.month 
 
     current_app.logger.info(f"--- main.index route called ---")
-    # ... (existing analytics period and budget planning period logic remains the same) ...
-    analytics_period_type = request.args.get('period_type', default='monthly') 
-    try:
-        analytics_view_year = int(request.args.get('year')) if request.args.get('year') and request.args.get('year').isdigit() else current_year_int
-    except (ValueError, TypeError): 
-        analytics_view_year = current_year_int
-    
-    analytics_view_month_str = request.args.get('month') 
-    if analytics_period_type == 'yearly':
-        analytics_view_month = None 
-    elif analytics_view_month_str and analytics_view_month_str.isdigit():
-        analytics_view_month = int(analytics_view_month_str)
-        if not (1 <= analytics_view_month <= 12): 
-            analytics_view_month = current_month_int 
-    else: 
-        analytics_view_month = current_month_int if analytics_period_type == 'monthly' else None
+    analytics_period_type, analytics_view_year, analytics_view_month = helpers.parse_analytics_view_args(
+        request.args, current_year_int, current_month_int
+    )
     
     modal_budget_year_from_args = request.args.get('budget_year')
     modal_budget_month_from_args = request.args.get('budget_month')
@@ -84,69 +114,71 @@ def index():
         month_for_budget_modal_data
     )
     
-    categories_for_management = db_helpers.get_categories_for_management()
     hierarchical_categories_for_js_data = db_helpers.get_hierarchical_categories_for_js()
     
-    transactions_data = conn.execute("""
-        SELECT t.id, t.amount, t.category_id, c.name as category_name, 
-               c.parent_id as category_parent_id, p.name as parent_category_name, 
-               t.date, t.type, t.description
-        FROM transactions t LEFT JOIN categories c ON t.category_id = c.id
-        LEFT JOIN categories p ON c.parent_id = p.id ORDER BY t.date DESC, t.id DESC
-    """).fetchall()
-    
-    transactions_list = []
-    for t_row in transactions_data:
-        full_category_name = t_row['category_name']
-        main_category_for_edit = None 
-        if t_row['parent_category_name']: 
-            full_category_name = f"{t_row['parent_category_name']} → {t_row['category_name']}"
-            main_category_for_edit = t_row['category_parent_id'] 
-        elif t_row['category_name'] is None and t_row['category_id'] is not None: 
-            full_category_name = "Error: Invalid Category Link"
-        elif t_row['category_id'] is None: 
-            full_category_name = "Uncategorized"
-        else: 
-            main_category_for_edit = t_row['category_id']
-            
-        transactions_list.append({
-            'id': t_row['id'], 'amount': t_row['amount'], 
-            'full_category_name': full_category_name, 'date': t_row['date'], 'type': t_row['type'],
-            'description': t_row['description'], 
-            'category_id': t_row['category_id'], 
-            'main_category_for_edit': main_category_for_edit
-        })
-
-    financial_summary = db_helpers.get_financial_summary(
-        year=analytics_view_year, 
-        month=analytics_view_month, 
-        period_type=analytics_period_type,
-        focused_main_category_id=request.args.get('main_cat_focus', type=int) 
-    )
+    if analytics_period_type not in helpers.PERIOD_TYPES:
+        analytics_period_type, analytics_view_month = 'monthly', current_month_int
+    period_range_args = helpers.parse_analytics_range_args(request.args)
+    try:
+        financial_summary = db_helpers.get_financial_summary(
+            year=analytics_view_year, 
+            month=analytics_view_month, 
+            period_type=analytics_period_type,
+            focused_main_category_id=request.args.get('main_cat_focus', type=int),
+            **period_range_args
+        )
+    except ValueError as e:
+        # Unresolvable period (e.g. a custom range without dates): show the current month instead
+        flash(f"{e} Showing the current month instead.", 'warning')
+        analytics_period_type, analytics_view_year, analytics_view_month = 'monthly', current_year_int, current_month_int
+        financial_summary = db_helpers.get_financial_summary(
+            year=analytics_view_year, month=analytics_view_month, period_type=analytics_period_type,
+            focused_main_category_id=request.args.get('main_cat_focus', type=int)
+        )
     
-    total_income_row = conn.execute("SELECT SUM(amount) FROM transactions WHERE type = 'income'").fetchone()
-    total_income = total_income_row[0] if total_income_row and total_income_row[0] is not None else 0.0
-    total_expenses_row = conn.execute("SELECT SUM(amount) FROM transactions WHERE type = 'expense'").fetchone()
-    total_expenses = total_expenses_row[0] if total_expenses_row and total_expenses_row[0] is not None else 0.0
+    # All-time totals from the monthly cash flow rollup (live) and archive summaries, not the transactions table
+    all_time_totals = cash_flow.get_all_time_totals(conn)
+    total_income = all_time_totals['income']
+    total_expenses = all_time_totals['expense']
     balance = total_income - total_expenses
+    missing_rates = currency.get_currencies_without_rates(conn)
+    if missing_rates:
+        flash(f"No exchange rates loaded for {', '.join(missing_rates)}; those amounts are counted 1:1 in "
+              f"{currency.get_reporting_currency()}. Load rates with 'flask load-fx-rates'.", 'warning')
     
-    main_categories_for_sub_add = categories_for_management if categories_for_management else []
-    
+    # History rows and the category modal are the bulk of the page; they are rendered
+    # through the fragment cache and only re-queried when their tables change.
+    focused_main_category_id = financial_summary['focused_main_category_id']
+    view_args = {'view_year': analytics_view_year, 'view_month': analytics_view_month,
+                 'view_period_type': analytics_period_type, 'focused_main_category_id': focused_main_category_id}
+    transaction_table_rows_html = fragment_cache.render_fragment(
+        '_transaction_table_rows.html', ('transactions', 'transaction_splits', 'categories'),
+        lambda: dict(view_args, transactions=get_transactions_for_history(conn)),
+        key_args=tuple(view_args.values())
+    )
+    def load_manage_categories_context():
+        categories_for_management = db_helpers.get_categories_for_management()
+        return {'categories_for_management': categories_for_management,
+                'main_categories_for_sub_add': categories_for_management if categories_for_management else []}
+    manage_categories_modal_html = fragment_cache.render_fragment(
+        '_manage_categories_modal.html', ('categories',),
+        load_manage_categories_context
+    )
+
     all_years_for_dropdowns = get_dynamic_year_options(conn, current_year_int) 
 
     # ADDED: Fetch initial goals data for the dashboard scroller
+    sync_cursor = change_log.get_latest_seq(conn) # Read first, so the scroller's delta sync can't miss a change
     initial_goals = db_helpers.get_all_goals()
 
     return render_template('index.html',
-                           transactions=transactions_list,
-                           categories_for_management=categories_for_management,
+                           transaction_table_rows_html=transaction_table_rows_html,
+                           manage_categories_modal_html=manage_categories_modal_html,
                            hierarchical_categories_data_for_js=hierarchical_categories_for_js_data, 
-                           main_categories_for_sub_add=main_categories_for_sub_add,
                            
                            monthly_summary_table_data=financial_summary['summary_table_data'],
-                           expected_vs_actual_chart_data=json.dumps(financial_summary['expected_vs_actual_chart']),
-                           nws_actual_chart_data=json.dumps(financial_summary['nws_actual_chart']),
-                           nws_budgeted_chart_data=json.dumps(financial_summary['nws_budgeted_chart']),
+                           chart_payload_json=chart_payloads.serialize_chart_payload(
+                               chart_payloads.build_chart_payload(financial_summary), html_safe=True),
                            current_chart_title_suffix=financial_summary['current_chart_title_suffix'], 
                            focused_main_category_id=financial_summary['focused_main_category_id'],       
                            focused_main_category_name=financial_summary['focused_main_category_name'], 
@@ -154,10 +186,16 @@ def index():
                            period_total_expenses=financial_summary.get('period_total_expenses', 0.0),
                            period_total_income=financial_summary.get('period_total_income', 0.0),
                            period_total_budgeted=financial_summary.get('period_total_budgeted', 0.0),
+                           period_projected_expenses=financial_summary.get('period_projected_expenses'),
+                           period_total_carry_forward=financial_summary.get('period_total_carry_forward'),
                            
                            view_period_type=analytics_period_type, 
                            view_year=analytics_view_year, 
                            view_month=analytics_view_month, 
+                           view_quarter=(int(financial_summary['period_start'][5:7]) - 1) // 3 + 1,
+                           view_period_label=financial_summary['period_label'],
+                           view_period_start=financial_summary['period_start'],
+                           view_period_end=financial_summary['period_end'],
                            
                            budget_planning_year=year_for_budget_modal_data, 
                            budget_planning_month=month_for_budget_modal_data, 
@@ -171,5 +209,7 @@ def index():
                            current_month=current_month_int,
 
                            all_years_for_dropdowns=all_years_for_dropdowns,
-                           initial_goals_data=initial_goals # ADDED: Pass goals data to index.html
+                           initial_goals_data=initial_goals, # ADDED: Pass goals data to index.html
+                           sync_cursor=sync_cursor,
+                           reporting_currency=currency.get_reporting_currency()
                            )
@@ -1,8 +1,15 @@
 # app/blueprints/paycheck_routes.py
 from flask import Blueprint, request, jsonify, current_app, g
+from flask.cli import with_appcontext
 from app.database import get_db
+from app.utils import db_helpers
+from app.utils import analytics_cube
+from app.utils import duplicates
+from app.utils import currency
 import sqlite3
 import datetime
+import json
+import click
 
 bp = Blueprint('paychecks', __name__, url_prefix='/paychecks')
 
@@ -20,10 +27,10 @@ def get_net_pay_category_id(conn):
     if row:
         return row['id']
     
-    # Fallback: If not found, create a default "Salary" category
+    # Fallback: If not found, create a default "Salary" category.
+    # Not committed here; the caller commits it together with the paycheck(s) it logs.
     try:
         cursor = conn.execute("INSERT INTO categories (name, parent_id) VALUES (?, NULL)", ("Salary",))
-        conn.commit() # Commit this individual insert
         current_app.logger.info("Created default 'Salary' category for net pay deposits.")
         return cursor.lastrowid
     except sqlite3.IntegrityError: # Should not happen if previous check was thorough
@@ -36,91 +43,220 @@ def get_net_pay_category_id(conn):
         return None
 
 
-@bp.route('/log', methods=['POST'])
-def log_paycheck():
-    data = request.get_json()
+def validate_paycheck_data(data):
+    """
+    Validates a single paycheck payload (as sent by the Log Paycheck modal).
+    Returns:
+        tuple: (paycheck dict with parsed values, None) on success,
+               or (None, error message) if the payload is invalid.
+    """
     if not data:
-        return jsonify({'status': 'error', 'message': 'No data received.'}), 400
+        return None, 'No data received.'
+    if not isinstance(data, dict):
+        return None, 'Paycheck must be a JSON object.'
 
     pay_date_str = data.get('pay_date')
-    employer_name = data.get('employer_name')
     gross_pay_str = data.get('gross_pay')
-    notes = data.get('notes')
-    deductions_data = data.get('deductions', []) # List of deduction objects
+    deductions_data = data.get('deductions') or [] # List of deduction objects
 
     # Validate required fields
     if not pay_date_str:
-        return jsonify({'status': 'error', 'message': 'Pay date is required.'}), 400
+        return None, 'Pay date is required.'
     try:
         # Ensure date is in YYYY-MM-DD format for SQLite
         datetime.datetime.strptime(pay_date_str, '%Y-%m-%d')
-    except ValueError:
-        return jsonify({'status': 'error', 'message': 'Invalid pay date format. Use YYYY-MM-DD.'}), 400
-        
+    except (ValueError, TypeError):
+        return None, 'Invalid pay date format. Use YYYY-MM-DD.'
+
     if gross_pay_str is None: # Check for None explicitly because 0 is a valid gross pay
-        return jsonify({'status': 'error', 'message': 'Gross pay is required.'}), 400
+        return None, 'Gross pay is required.'
     try:
         gross_pay = float(gross_pay_str)
-        if gross_pay < 0:
-            return jsonify({'status': 'error', 'message': 'Gross pay cannot be negative.'}), 400
-    except ValueError:
-        return jsonify({'status': 'error', 'message': 'Invalid gross pay amount.'}), 400
+    except (ValueError, TypeError):
+        return None, 'Invalid gross pay amount.'
+    if gross_pay < 0:
+        return None, 'Gross pay cannot be negative.'
+
+    if not isinstance(deductions_data, list):
+        return None, 'Deductions must be a list.'
+
+    # Calculate total deductions
+    deductions = []
+    total_deductions = 0
+    for ded in deductions_data:
+        if not isinstance(ded, dict):
+            return None, 'Each deduction must be an object with description, amount and type.'
+        try:
+            ded_amount = float(ded.get('amount', 0))
+        except (ValueError, TypeError):
+            return None, f"Invalid amount for deduction: {ded.get('description')}"
+        if ded_amount < 0:
+            return None, f"Deduction amount for '{ded.get('description')}' cannot be negative."
+        if not ded.get('description') or not ded.get('type'):
+            return None, 'Each deduction must have a description and type.'
+        total_deductions += ded_amount
+        deductions.append((ded['description'], ded_amount, ded['type']))
+
+    return {
+        'pay_date': pay_date_str,
+        'employer_name': data.get('employer_name'),
+        'gross_pay': gross_pay,
+        'net_pay': gross_pay - total_deductions,
+        'notes': data.get('notes'),
+        'deductions': deductions
+    }, None
+
+
+def net_pay_description(paycheck):
+    """Description of a paycheck's net pay income transaction."""
+    employer_name = paycheck['employer_name']
+    return f"Net Pay - {employer_name if employer_name else 'Paycheck'}"
+
+
+def find_duplicate_paycheck(conn, paycheck):
+    """
+    Returns the existing net pay transaction that this paycheck would duplicate
+    (same employer and net pay within the duplicate date window), or None.
+    """
+    fingerprint = duplicates.transaction_fingerprint(paycheck['net_pay'], 'income', net_pay_description(paycheck))
+    return duplicates.find_duplicate(conn, fingerprint, paycheck['pay_date'])
+
+
+def insert_paycheck(conn, paycheck, net_pay_category_id):
+    """
+    Inserts the net pay income transaction and the paycheck record for an already
+    validated paycheck. Does not commit and does not insert deductions.
+    Returns:
+        tuple: (paycheck_id, net_pay_transaction_id)
+    """
+    net_pay = paycheck['net_pay']
+    if net_pay < 0:
+        # This could be valid if deductions exceed gross, but flag it.
+        current_app.logger.warning(f"Net pay is negative for gross: {paycheck['gross_pay']}, deductions: {paycheck['gross_pay'] - net_pay}")
+        # Depending on policy, you might want to return an error or just proceed.
+
+    employer_name = paycheck['employer_name']
+    description = net_pay_description(paycheck)
+
+    # 1. Create the Net Pay income transaction
+    cursor = conn.execute(
+        "INSERT INTO transactions (amount, category_id, date, type, description, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+        (net_pay, net_pay_category_id, paycheck['pay_date'], 'income', description,
+         duplicates.transaction_fingerprint(net_pay, 'income', description))
+    )
+    net_pay_transaction_id = cursor.lastrowid
+
+    # 2. Create the Paycheck record
+    cursor = conn.execute(
+        "INSERT INTO paychecks (pay_date, employer_name, gross_pay, net_pay_transaction_id, notes) VALUES (?, ?, ?, ?, ?)",
+        (paycheck['pay_date'], employer_name, paycheck['gross_pay'], net_pay_transaction_id, paycheck['notes'])
+    )
+    return cursor.lastrowid, net_pay_transaction_id
+
+
+def ingest_paychecks(conn, paychecks_data, allow_duplicates=False):
+    """
+    Logs many paychecks in a single database transaction.
+    Invalid items are skipped and reported; valid items are inserted together.
+    Items duplicating an existing paycheck (or an earlier item) are reported as errors
+    unless allow_duplicates.
+    The net pay category is resolved once and all deductions are written with
+    one executemany call. Raises on database errors after rolling back the batch.
+    Returns:
+        list: One result dict per input item, in input order.
+    """
+    results = []
+    valid_items = []
+    for index, data in enumerate(paychecks_data):
+        paycheck, error = validate_paycheck_data(data if isinstance(data, dict) else None)
+        if error:
+            results.append({'index': index, 'status': 'error', 'message': error})
+        else:
+            results.append({'index': index, 'status': 'pending'})
+            valid_items.append((index, paycheck))
+
+    if not valid_items:
+        return results
+
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        net_pay_category_id = get_net_pay_category_id(conn)
+        if net_pay_category_id is None:
+            raise sqlite3.DatabaseError('Could not determine category for net pay.')
+
+        deduction_rows = []
+        inserted_items = []
+        for index, paycheck in valid_items:
+            duplicate = None if allow_duplicates else find_duplicate_paycheck(conn, paycheck)
+            if duplicate:
+                results[index] = {'index': index, 'status': 'error',
+                                  'message': f"Possible duplicate of the paycheck recorded on {duplicate['date']}."}
+                continue
+            inserted_items.append((index, paycheck))
+            paycheck_id, net_pay_transaction_id = insert_paycheck(conn, paycheck, net_pay_category_id)
+            deduction_rows.extend(
+                (paycheck_id, description, amount, ded_type)
+                for description, amount, ded_type in paycheck['deductions']
+            )
+            results[index] = {
+                'index': index, 'status': 'success',
+                'paycheck_id': paycheck_id, 'net_pay_transaction_id': net_pay_transaction_id,
+                'net_pay': paycheck['net_pay']
+            }
+
+        conn.executemany(
+            "INSERT INTO paycheck_deductions (paycheck_id, description, amount, type) VALUES (?, ?, ?, ?)",
+            deduction_rows
+        )
+        cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    for index, paycheck in inserted_items:
+        analytics_cube.record_amount_change(net_pay_category_id, paycheck['pay_date'], 'income', paycheck['net_pay'], cube=cube)
+
+    current_app.logger.info(f"Bulk-logged {len(inserted_items)} paychecks with {len(deduction_rows)} deductions.")
+    return results
+
+
+@bp.route('/log', methods=['POST'])
+def log_paycheck():
+    data = request.get_json()
+    paycheck, error = validate_paycheck_data(data)
+    if error:
+        return jsonify({'status': 'error', 'message': error}), 400
 
     conn = get_db()
     try:
-        # Calculate total deductions and net pay
-        total_deductions = 0
-        for ded in deductions_data:
-            try:
-                ded_amount = float(ded.get('amount', 0))
-                if ded_amount < 0 :
-                     return jsonify({'status': 'error', 'message': f"Deduction amount for '{ded.get('description')}' cannot be negative."}), 400
-                total_deductions += ded_amount
-            except (ValueError, TypeError):
-                return jsonify({'status': 'error', 'message': f"Invalid amount for deduction: {ded.get('description')}"}), 400
-            if not ded.get('description') or not ded.get('type'):
-                return jsonify({'status': 'error', 'message': 'Each deduction must have a description and type.'}), 400
-
-
-        net_pay = gross_pay - total_deductions
-        if net_pay < 0:
-            # This could be valid if deductions exceed gross, but flag it.
-            current_app.logger.warning(f"Net pay is negative for gross: {gross_pay}, deductions: {total_deductions}")
-            # Depending on policy, you might want to return an error or just proceed.
-
-        # 1. Create the Net Pay income transaction
         net_pay_category_id = get_net_pay_category_id(conn)
         if net_pay_category_id is None:
             # This is a critical setup issue if category can't be found/created
             current_app.logger.error("Net pay category ID could not be determined. Aborting paycheck log.")
             return jsonify({'status': 'error', 'message': 'Could not determine category for net pay. Please ensure a "Salary" or "Paycheck Deposit" category exists.'}), 500
 
-        net_pay_description = f"Net Pay - {employer_name if employer_name else 'Paycheck'}"
-        
-        cursor = conn.execute(
-            "INSERT INTO transactions (amount, category_id, date, type, description) VALUES (?, ?, ?, ?, ?)",
-            (net_pay, net_pay_category_id, pay_date_str, 'income', net_pay_description)
-        )
-        net_pay_transaction_id = cursor.lastrowid
-        current_app.logger.info(f"Logged net pay income transaction. ID: {net_pay_transaction_id}, Amount: {net_pay}")
+        if not data.get('allow_duplicate'):
+            duplicate = find_duplicate_paycheck(conn, paycheck)
+            if duplicate:
+                return jsonify({'status': 'error', 'duplicate': True, 'duplicate_transaction_id': duplicate['id'],
+                                'message': f"A paycheck of {currency.format_money(duplicate['amount'], duplicate['currency'])} from the same employer was already "
+                                           f"logged on {duplicate['date']}."}), 409
 
-        # 2. Create the Paycheck record
-        cursor = conn.execute(
-            "INSERT INTO paychecks (pay_date, employer_name, gross_pay, net_pay_transaction_id, notes) VALUES (?, ?, ?, ?, ?)",
-            (pay_date_str, employer_name, gross_pay, net_pay_transaction_id, notes)
-        )
-        paycheck_id = cursor.lastrowid
-        current_app.logger.info(f"Logged paycheck record. ID: {paycheck_id}")
+        paycheck_id, net_pay_transaction_id = insert_paycheck(conn, paycheck, net_pay_category_id)
+        current_app.logger.info(f"Logged paycheck record. ID: {paycheck_id}, net pay transaction ID: {net_pay_transaction_id}, Amount: {paycheck['net_pay']}")
 
         # 3. Create Paycheck Deduction records
-        for ded in deductions_data:
-            conn.execute(
-                "INSERT INTO paycheck_deductions (paycheck_id, description, amount, type) VALUES (?, ?, ?, ?)",
-                (paycheck_id, ded['description'], float(ded['amount']), ded['type'])
-            )
-        current_app.logger.info(f"Logged {len(deductions_data)} deductions for paycheck ID: {paycheck_id}")
+        conn.executemany(
+            "INSERT INTO paycheck_deductions (paycheck_id, description, amount, type) VALUES (?, ?, ?, ?)",
+            [(paycheck_id, description, amount, ded_type) for description, amount, ded_type in paycheck['deductions']]
+        )
+        current_app.logger.info(f"Logged {len(paycheck['deductions'])} deductions for paycheck ID: {paycheck_id}")
 
+        cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
         conn.commit()
+        analytics_cube.record_amount_change(net_pay_category_id, paycheck['pay_date'], 'income', paycheck['net_pay'], cube=cube)
         return jsonify({'status': 'success', 'message': 'Paycheck logged successfully!', 'paycheck_id': paycheck_id, 'net_pay_transaction_id': net_pay_transaction_id}), 201
 
     except sqlite3.Error as e:
@@ -132,3 +268,129 @@ def log_paycheck():
         current_app.logger.error(f"Unexpected error logging paycheck: {e}", exc_info=True)
         return jsonify({'status': 'error', 'message': f'An unexpected error occurred: {e}'}), 500
 
+
+@bp.route('/bulk_log', methods=['POST'])
+def bulk_log_paychecks():
+    """
+    Logs many paychecks (e.g. a year of payroll history) in one transaction.
+    JSON body: {"paychecks": [<paycheck>, ...]} or a bare list, where each paycheck
+    has the same shape as the /log payload.
+    Returns per-item results in input order.
+    """
+    data = request.get_json(silent=True)
+    paychecks_data = data.get('paychecks') if isinstance(data, dict) else data
+    if not isinstance(paychecks_data, list) or not paychecks_data:
+        return jsonify({'status': 'error', 'message': 'Expected a non-empty list of paychecks.'}), 400
+
+    conn = get_db()
+    try:
+        results = ingest_paychecks(conn, paychecks_data, isinstance(data, dict) and bool(data.get('allow_duplicates')))
+    except sqlite3.Error as e:
+        current_app.logger.error(f"Database error bulk logging paychecks: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f'Database error: {e}. No paychecks were logged.'}), 500
+    except Exception as e:
+        current_app.logger.error(f"Unexpected error bulk logging paychecks: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f'An unexpected error occurred: {e}. No paychecks were logged.'}), 500
+
+    logged_count = sum(1 for r in results if r['status'] == 'success')
+    failed_count = len(results) - logged_count
+    if failed_count == 0:
+        status, http_status = 'success', 201
+    elif logged_count > 0:
+        status, http_status = 'warning', 201
+    else:
+        status, http_status = 'error', 400
+    return jsonify({
+        'status': status,
+        'message': f"Logged {logged_count} paycheck(s); {failed_count} failed validation or were duplicates.",
+        'logged_count': logged_count,
+        'failed_count': failed_count,
+        'results': results
+    }), http_status
+
+
+@bp.route('/api/analytics/ytd', methods=['GET'])
+def payroll_ytd_analytics():
+    """
+    Year-to-date payroll totals: gross, net, tax and pre-tax, broken down by
+    deduction type, employer and month.
+    Query params: year (default current year), through (optional YYYY-MM-DD, inclusive;
+    defaults to today for the current year and to year end otherwise).
+    """
+    today = datetime.date.today()
+    year = request.args.get('year', default=today.year, type=int)
+    through_str = request.args.get('through')
+    try:
+        if through_str:
+            through_date = datetime.datetime.strptime(through_str, '%Y-%m-%d').date()
+        elif year == today.year:
+            through_date = today
+        else:
+            through_date = datetime.date(year, 12, 31)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid through date format. Use YYYY-MM-DD.'}), 400
+
+    start_date = f"{year:04d}-01-01"
+    end_date = min(through_date + datetime.timedelta(days=1), datetime.date(year + 1, 1, 1)).isoformat()
+    try:
+        totals = db_helpers.get_payroll_totals(start_date, end_date, 'total')
+        return jsonify({
+            'status': 'success',
+            'year': year,
+            'through': (datetime.date.fromisoformat(end_date) - datetime.timedelta(days=1)).isoformat(),
+            'totals': totals[0] if totals else None,
+            'by_deduction_type': db_helpers.get_payroll_deductions_by_type(start_date, end_date),
+            'by_employer': db_helpers.get_payroll_totals(start_date, end_date, 'employer'),
+            'by_month': db_helpers.get_payroll_totals(start_date, end_date, 'month')
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error in payroll YTD analytics for {year}: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@bp.route('/api/analytics/tax_rate_trend', methods=['GET'])
+def payroll_tax_rate_trend():
+    """
+    Effective tax rate (tax / gross) over time.
+    Query params: start_year, end_year (default: current year), granularity ('month' or 'year').
+    """
+    current_year = datetime.date.today().year
+    end_year = request.args.get('end_year', default=current_year, type=int)
+    start_year = request.args.get('start_year', default=end_year, type=int)
+    granularity = request.args.get('granularity', default='month')
+    if granularity not in ('month', 'year'):
+        return jsonify({'status': 'error', 'message': "granularity must be 'month' or 'year'."}), 400
+    if start_year > end_year:
+        return jsonify({'status': 'error', 'message': 'start_year cannot be after end_year.'}), 400
+
+    try:
+        periods = db_helpers.get_payroll_totals(f"{start_year:04d}-01-01", f"{end_year + 1:04d}-01-01", granularity)
+        return jsonify({
+            'status': 'success',
+            'granularity': granularity,
+            'labels': [p[granularity] for p in periods],
+            'effective_tax_rate': [p['effective_tax_rate'] for p in periods],
+            'gross': [p['gross'] for p in periods],
+            'tax': [p['tax'] for p in periods]
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error in payroll tax rate trend: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@click.command('import-paychecks')
+@click.argument('json_file', type=click.File('r'))
+@with_appcontext
+def import_paychecks_command(json_file):
+    """CLI command to bulk-import paychecks from a JSON file (list or {"paychecks": [...]})."""
+    data = json.load(json_file)
+    paychecks_data = data.get('paychecks') if isinstance(data, dict) else data
+    if not isinstance(paychecks_data, list):
+        raise click.ClickException('Expected a list of paychecks or an object with a "paychecks" list.')
+
+    results = ingest_paychecks(get_db(), paychecks_data)
+    for result in results:
+        if result['status'] != 'success':
+            click.echo(f"Item {result['index']}: {result['message']}", err=True)
+    logged_count = sum(1 for r in results if r['status'] == 'success')
+    click.echo(f"Imported {logged_count} of {len(results)} paycheck(s).")
@@ -0,0 +1,64 @@
+# app/blueprints/report_routes.py
+# API endpoints to submit, poll and download background report jobs.
+
+from flask import Blueprint, request, jsonify, current_app, send_file, url_for
+from app.utils import report_jobs
+import os
+
+bp = Blueprint('reports', __name__) # url_prefix='/reports' will be set in app/__init__.py
+
+@bp.route('/api/jobs', methods=['POST'])
+def submit_report_job():
+    """
+    Queues a report to run in the background.
+    JSON body: {"report": "<name>", "params": {...}}
+        yearly_summary         params: year
+        multi_year_comparison  params: start_year, end_year
+        transactions_export    params: start_date, end_date (optional, YYYY-MM-DD)
+    Returns 202 with the job ID and the URLs to poll and download.
+    """
+    data = request.get_json(silent=True) or {}
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'status': 'error', 'message': "'params' must be an object."}), 400
+    try:
+        job_id, error = report_jobs.submit_job(data.get('report'), params)
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 400
+        return jsonify({
+            'status': 'success', 'job_id': job_id,
+            'status_url': url_for('reports.get_report_job', job_id=job_id),
+            'download_url': url_for('reports.download_report', job_id=job_id)
+        }), 202
+    except report_jobs.JobQueueFull as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+    except Exception as e:
+        current_app.logger.error(f"Error submitting report job: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/jobs', methods=['GET'])
+def list_report_jobs():
+    """Most recent report jobs (limit param, default 20, max 100)."""
+    limit = min(max(request.args.get('limit', default=20, type=int), 1), 100)
+    return jsonify({'status': 'success', 'jobs': report_jobs.list_jobs(limit)}), 200
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    """Status and progress (0-1) of one job."""
+    job = report_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    job.pop('result_path', None) # Server-side path
+    return jsonify({'status': 'success', 'job': job}), 200
+
+@bp.route('/api/jobs/<job_id>/download', methods=['GET'])
+def download_report(job_id):
+    """Sends the finished report as CSV (409 while the job is still queued or running)."""
+    job = report_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found.'}), 404
+    if job['status'] != 'succeeded':
+        return jsonify({'status': 'error', 'message': f"Job is {job['status']}.", 'job_status': job['status']}), 409
+    if not job['result_path'] or not os.path.exists(job['result_path']):
+        return jsonify({'status': 'error', 'message': 'Report file is no longer available.'}), 410
+    return send_file(job['result_path'], mimetype='text/csv', as_attachment=True, download_name=job['result_name'])
@@ -0,0 +1,151 @@
+# app/blueprints/rule_routes.py
+# API endpoints for managing auto-categorization rules, suggesting a category
+# for a transaction and bulk re-categorizing existing transactions.
+
+from flask import Blueprint, request, jsonify, current_app
+from app.database import get_db
+from app.utils import categorizer
+import sqlite3
+
+bp = Blueprint('rules', __name__) # url_prefix='/rules' will be set in app/__init__.py
+
+def _parse_rule(data):
+    """Builds a rule dict from a JSON body. Returns (rule, error_message)."""
+    def optional_amount(key):
+        value = data.get(key)
+        if value in (None, ''):
+            return None
+        return float(value)
+
+    try:
+        rule = {
+            'category_id': int(data.get('category_id')),
+            'priority': int(data.get('priority') if data.get('priority') not in (None, '') else 100),
+            'description_contains': (data.get('description_contains') or '').strip() or None,
+            'description_regex': (data.get('description_regex') or '').strip() or None,
+            'min_amount': optional_amount('min_amount'),
+            'max_amount': optional_amount('max_amount'),
+            'type': data.get('type') or None,
+            'is_active': 1 if data.get('is_active', True) else 0,
+        }
+    except (TypeError, ValueError):
+        return None, 'category_id, priority and amounts must be numbers.'
+    return rule, categorizer.validate_rule(rule)
+
+@bp.route('/api/rules', methods=['GET'])
+def list_rules():
+    """Lists all rules (active and inactive) in match order, with their category names."""
+    try:
+        rules = categorizer.load_rules(include_inactive=True)
+        names = {row['id']: row['name'] for row in get_db().execute("SELECT id, name FROM categories").fetchall()}
+        for rule in rules:
+            rule['category_name'] = names.get(rule['category_id'])
+        return jsonify({'status': 'success', 'rules': rules}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error listing categorization rules: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/rules', methods=['POST'])
+def create_rule():
+    """
+    Creates a rule.
+    JSON body: category_id, priority (optional, lower wins), description_contains, description_regex,
+    min_amount, max_amount, type ('income'/'expense'), is_active. At least one condition is required.
+    """
+    rule, error = _parse_rule(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'status': 'error', 'message': error}), 400
+    try:
+        conn = get_db()
+        cursor = conn.execute("""
+            INSERT INTO categorization_rules (category_id, priority, description_contains, description_regex,
+                                              min_amount, max_amount, type, is_active)
+            VALUES (:category_id, :priority, :description_contains, :description_regex,
+                    :min_amount, :max_amount, :type, :is_active)
+        """, rule)
+        conn.commit()
+        return jsonify({'status': 'success', 'message': 'Rule created.', 'rule_id': cursor.lastrowid}), 201
+    except sqlite3.IntegrityError:
+        get_db().rollback()
+        return jsonify({'status': 'error', 'message': 'Category does not exist.'}), 400
+    except Exception as e:
+        get_db().rollback()
+        current_app.logger.error(f"Error creating categorization rule: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/rules/<int:rule_id>/update', methods=['POST'])
+def update_rule(rule_id):
+    """Replaces a rule's fields. JSON body as for create."""
+    rule, error = _parse_rule(request.get_json(silent=True) or {})
+    if error:
+        return jsonify({'status': 'error', 'message': error}), 400
+    try:
+        conn = get_db()
+        cursor = conn.execute("""
+            UPDATE categorization_rules SET category_id = :category_id, priority = :priority,
+                description_contains = :description_contains, description_regex = :description_regex,
+                min_amount = :min_amount, max_amount = :max_amount, type = :type, is_active = :is_active
+            WHERE id = :id
+        """, dict(rule, id=rule_id))
+        conn.commit()
+        if cursor.rowcount == 0:
+            return jsonify({'status': 'error', 'message': 'Rule not found.'}), 404
+        return jsonify({'status': 'success', 'message': 'Rule updated.'}), 200
+    except sqlite3.IntegrityError:
+        get_db().rollback()
+        return jsonify({'status': 'error', 'message': 'Category does not exist.'}), 400
+    except Exception as e:
+        get_db().rollback()
+        current_app.logger.error(f"Error updating categorization rule {rule_id}: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/rules/<int:rule_id>/delete', methods=['POST'])
+def delete_rule(rule_id):
+    """Deletes a rule. Transactions it already categorized keep their category."""
+    try:
+        conn = get_db()
+        cursor = conn.execute("DELETE FROM categorization_rules WHERE id = ?", (rule_id,))
+        conn.commit()
+        if cursor.rowcount == 0:
+            return jsonify({'status': 'error', 'message': 'Rule not found.'}), 404
+        return jsonify({'status': 'success', 'message': 'Rule deleted.'}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error deleting categorization rule {rule_id}: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/api/suggest', methods=['POST'])
+def suggest_category():
+    """
+    Suggests a category for one transaction.
+    JSON body: description, amount (optional), type (optional).
+    Returns category_id and rule_id (both null when no rule matches).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        amount = float(data['amount']) if data.get('amount') not in (None, '') else None
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Invalid amount.'}), 400
+    rule = categorizer.get_matcher().match(data.get('description'), amount, data.get('type'))
+    return jsonify({'status': 'success',
+                    'category_id': rule['category_id'] if rule else None,
+                    'rule_id': rule['id'] if rule else None}), 200
+
+@bp.route('/api/recategorize', methods=['POST'])
+def recategorize():
+    """
+    Re-applies the rules to existing transactions. Goal funding, net pay, System-category
+    and split transactions keep their categories.
+    JSON body: only_uncategorized (bool), start_date, end_date (optional, YYYY-MM-DD), dry_run (bool).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        stats = categorizer.recategorize_transactions(
+            only_uncategorized=bool(data.get('only_uncategorized')),
+            start_date=data.get('start_date') or None,
+            end_date=data.get('end_date') or None,
+            dry_run=bool(data.get('dry_run')))
+        return jsonify({'status': 'success', **stats}), 200
+    except Exception as e:
+        get_db().rollback()
+        current_app.logger.error(f"Error re-categorizing transactions: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
@@ -0,0 +1,36 @@
+# app/blueprints/sync_routes.py
+# Delta sync API so clients and scripts can mirror data without full reloads.
+
+from flask import Blueprint, request, jsonify, current_app
+from app.utils import change_log
+
+bp = Blueprint('sync', __name__) # url_prefix='/sync' will be set in app/__init__.py
+
+@bp.route('/api/changes', methods=['GET'])
+def get_changes_since():
+    """
+    Returns rows inserted/updated and IDs deleted since a cursor.
+    Query params:
+        cursor (int, optional): Value returned by the previous call; omit for a full snapshot.
+        tables (comma-separated, optional): Subset of transactions, budget_goals, categories, goals,
+                                             transaction_splits.
+        limit (int, optional): Maximum change log entries per call (default 1000, max 5000).
+    Keep calling with the returned cursor while has_more is true. When full_resync is true
+    the client should replace its copy with the returned rows.
+    """
+    cursor = request.args.get('cursor', type=int)
+    limit = min(max(request.args.get('limit', default=1000, type=int), 1), 5000)
+    tables = None
+    if request.args.get('tables'):
+        tables = [t.strip() for t in request.args['tables'].split(',') if t.strip()]
+        unknown = [t for t in tables if t not in change_log.SYNC_TABLES]
+        if unknown:
+            return jsonify({'status': 'error', 'message': f"Unknown tables: {', '.join(unknown)}. "
+                            f"Available: {', '.join(change_log.SYNC_TABLES)}."}), 400
+    try:
+        delta = change_log.get_sync_delta(cursor, tables=tables, limit=limit)
+        delta['status'] = 'success'
+        return jsonify(delta), 200
+    except Exception as e:
+        current_app.logger.error(f"Error building sync delta: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
@@ -1,9 +1,14 @@
 # app/blueprints/transaction_routes.py
 # Blueprint for transaction-related actions.
 
-from flask import Blueprint, request, redirect, url_for, flash
+from flask import Blueprint, request, redirect, url_for, flash, jsonify, current_app
+from flask.cli import with_appcontext
 from app.database import get_db # Use get_db from the database module
+from app.utils import analytics_cube, forecasting, categorizer, duplicates, currency, splits, goal_projections
 import sqlite3
+import datetime
+import csv
+import click
 
 bp = Blueprint('transactions', __name__) # url_prefix='/transactions' will be set in app/__init__.py
 
@@ -15,20 +20,36 @@ def add_transaction():
             category_id_str = request.form.get('final_category_id') 
             date = request.form['date']
             transaction_type = request.form['type']
+            description = request.form.get('description', '').strip() or None
+            if not category_id_str and description and amount_str:
+                # No category picked: fall back to the categorization rules
+                suggested_id = categorizer.categorize(description, float(amount_str), transaction_type)
+                category_id_str = str(suggested_id) if suggested_id is not None else None
             if not amount_str: flash('Amount is required.', 'error')
             elif not category_id_str: flash('Category selection is required.', 'error')
             elif not date: flash('Date is required.', 'error')
             elif transaction_type not in ['income', 'expense']: flash('Invalid transaction type.', 'error')
+            elif not currency.is_valid_currency(request.form.get('currency')): flash('Invalid currency code.', 'error')
             else:
                 amount = float(amount_str)
                 category_id = int(category_id_str)
+                row_currency = currency.normalize_currency(request.form.get('currency'))
                 if amount <= 0: flash('Amount must be a positive number.', 'error')
                 else:
                     conn = get_db()
-                    conn.execute("INSERT INTO transactions (amount, category_id, date, type) VALUES (?, ?, ?, ?)", 
-                                 (amount, category_id, date, transaction_type))
+                    fingerprint = duplicates.transaction_fingerprint(amount, transaction_type, description, row_currency)
+                    duplicate = duplicates.find_duplicate(conn, fingerprint, date)
+                    conn.execute("INSERT INTO transactions (amount, category_id, date, type, description, fingerprint, currency) VALUES (?, ?, ?, ?, ?, ?, ?)", 
+                                 (amount, category_id, date, transaction_type, description, fingerprint, row_currency))
+                    cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
                     conn.commit()
+                    analytics_cube.record_amount_change(category_id, date, transaction_type,
+                                                        currency.convert_amount(amount, row_currency, date, conn), cube=cube)
+                    forecasting.record_transaction_change(date)
                     flash('Transaction added successfully!', 'success')
+                    if duplicate:
+                        flash(f"Possible duplicate: an identical {duplicate['type']} of {currency.format_money(duplicate['amount'], duplicate['currency'])} "
+                              f"was already recorded on {duplicate['date']}.", 'warning')
                     # Preserve analytics view period on redirect
                     return redirect(url_for('main.index', 
                                             year=request.args.get('year'), 
@@ -56,15 +77,48 @@ def update_transaction(transaction_id):
             elif not category_id_str: flash('Category selection is required.', 'error')
             elif not date: flash('Date is required.', 'error')
             elif transaction_type not in ['income', 'expense']: flash('Invalid transaction type.', 'error')
+            elif not currency.is_valid_currency(request.form.get('currency')): flash('Invalid currency code.', 'error')
             else:
                 amount = float(amount_str)
                 category_id = int(category_id_str)
                 if amount <= 0: flash('Amount must be a positive number.', 'error')
                 else:
                     conn = get_db()
-                    conn.execute("UPDATE transactions SET amount = ?, category_id = ?, date = ?, type = ? WHERE id = ?", 
-                                 (amount, category_id, date, transaction_type, transaction_id))
+                    old_row = conn.execute("SELECT amount, category_id, date, type, description, currency, goal_id FROM transactions WHERE id = ?", (transaction_id,)).fetchone()
+                    is_split = old_row is not None and splits.is_split(transaction_id, conn)
+                    if is_split and abs(amount - old_row['amount']) > splits.SPLIT_TOLERANCE:
+                        flash('This transaction is split; change its split lines before changing its amount.', 'error')
+                        return redirect(url_for('main.index', 
+                                                year=request.args.get('year'), 
+                                                month=request.args.get('month'),
+                                                main_cat_focus=request.args.get('main_cat_focus')))
+                    if is_split:
+                        category_id = old_row['category_id'] # The split lines carry the categories
+                    if 'description' in request.form:
+                        description = request.form['description'].strip() or None
+                    else:
+                        description = old_row['description'] if old_row else None
+                    if 'currency' in request.form:
+                        row_currency = currency.normalize_currency(request.form['currency'])
+                    else:
+                        row_currency = old_row['currency'] if old_row else None
+                    conn.execute("UPDATE transactions SET amount = ?, category_id = ?, date = ?, type = ?, description = ?, fingerprint = ?, currency = ? WHERE id = ?", 
+                                 (amount, category_id, date, transaction_type, description,
+                                  duplicates.transaction_fingerprint(amount, transaction_type, description, row_currency),
+                                  row_currency, transaction_id))
+                    cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
                     conn.commit()
+                    if is_split:
+                        analytics_cube.invalidate_cube()
+                        forecasting.record_transaction_change(min(old_row['date'], date))
+                    elif old_row:
+                        analytics_cube.record_amount_change(old_row['category_id'], old_row['date'], old_row['type'],
+                                                            -currency.convert_amount(old_row['amount'], old_row['currency'], old_row['date'], conn), cube=cube)
+                        analytics_cube.record_amount_change(category_id, date, transaction_type,
+                                                            currency.convert_amount(amount, row_currency, date, conn), cube=cube)
+                        forecasting.record_transaction_change(min(old_row['date'], date))
+                    if old_row and old_row['goal_id'] is not None: # A Goal Contributions/Withdrawals funding transaction
+                        goal_projections.invalidate_goal_projection(old_row['goal_id'])
                     flash('Transaction updated!', 'success')
                     return redirect(url_for('main.index', 
                                             year=request.args.get('year'), 
@@ -82,11 +136,158 @@ def update_transaction(transaction_id):
 def delete_transaction(transaction_id):
     try:
         conn = get_db()
-        conn.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+        old_row = conn.execute("SELECT amount, category_id, date, type, currency, goal_id FROM transactions WHERE id = ?", (transaction_id,)).fetchone()
+        is_split = old_row is not None and splits.is_split(transaction_id, conn)
+        conn.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,)) # Its split lines go with it
+        cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
         conn.commit()
+        if is_split:
+            analytics_cube.invalidate_cube()
+            forecasting.record_transaction_change(old_row['date'])
+        elif old_row:
+            analytics_cube.record_amount_change(old_row['category_id'], old_row['date'], old_row['type'],
+                                                -currency.convert_amount(old_row['amount'], old_row['currency'], old_row['date'], conn), cube=cube)
+            forecasting.record_transaction_change(old_row['date'])
+        if old_row and old_row['goal_id'] is not None: # A Goal Contributions/Withdrawals funding transaction
+            goal_projections.invalidate_goal_projection(old_row['goal_id'])
         flash('Transaction deleted!', 'success')
     except Exception as e: flash(f'Error deleting: {e}', 'error'); print(f"Error delete_transaction: {e}")
     return redirect(url_for('main.index', 
                             year=request.args.get('year'), 
                             month=request.args.get('month'),
                             main_cat_focus=request.args.get('main_cat_focus')))
+
+
+@bp.route('/api/<int:transaction_id>/splits', methods=['GET', 'POST'])
+def transaction_splits(transaction_id):
+    """
+    GET: the transaction's split lines. POST: replaces them with JSON
+    {'splits': [{'category_id', 'amount', 'description'}, ...]}; the lines must add up to
+    the transaction amount. An empty list removes the split.
+    """
+    try:
+        db = get_db()
+        parent = db.execute("SELECT amount, currency FROM transactions WHERE id = ?", (transaction_id,)).fetchone()
+        if parent is None:
+            return jsonify({'status': 'error', 'message': 'Transaction not found.'}), 404
+        if request.method == 'POST':
+            payload = request.get_json(silent=True) or {}
+            if not isinstance(payload.get('splits'), list):
+                return jsonify({'status': 'error', 'message': "Expected JSON with a 'splits' list."}), 400
+            lines, error = splits.validate_splits(payload['splits'], parent['amount'], db)
+            if error:
+                return jsonify({'status': 'error', 'message': error}), 400
+            splits.set_splits(transaction_id, lines, db)
+        return jsonify({'status': 'success', 'transaction_id': transaction_id, 'amount': parent['amount'],
+                        'currency': parent['currency'] or currency.get_reporting_currency(),
+                        'splits': splits.get_splits(transaction_id, db)}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error handling splits for transaction {transaction_id}: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+
+@bp.route('/api/duplicates', methods=['GET'])
+def duplicate_report():
+    """
+    Lists groups of existing transactions that look like duplicates: same type, amount and
+    normalized description, dated within window_days of each other.
+    Query params: window_days (default DUPLICATE_DATE_WINDOW_DAYS), start_date, end_date (YYYY-MM-DD).
+    """
+    try:
+        window_days = request.args.get('window_days', type=int)
+        groups = duplicates.find_duplicate_groups(get_db(), window_days,
+                                                  request.args.get('start_date') or None,
+                                                  request.args.get('end_date') or None)
+        return jsonify({'status': 'success', 'window_days': duplicates.get_window_days(window_days),
+                        'group_count': len(groups),
+                        'duplicate_count': sum(group['count'] - 1 for group in groups),
+                        'groups': groups}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error building duplicate report: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': f"An unexpected error occurred: {str(e)}"}), 500
+
+
+def ingest_transactions(db, rows, allow_duplicates=False):
+    """
+    Validates and inserts transactions in one database transaction. Rows matching an
+    existing transaction (see duplicates.match_existing) are skipped unless allow_duplicates.
+    Rows without a category are auto-categorized with one compiled matcher for the whole batch.
+    Args:
+        db: Database connection.
+        rows (list): Dicts with date (YYYY-MM-DD), amount, and optional type, description,
+                     category_id and currency (default: the reporting currency).
+                     Without a type, a negative amount is an expense.
+        allow_duplicates (bool): Import rows even if they look like existing transactions.
+    Returns:
+        dict: {'imported', 'duplicates', 'auto_categorized', 'uncategorized', 'errors': [(row_number, message)]}.
+    """
+    valid_category_ids = {row['id'] for row in db.execute("SELECT id FROM categories").fetchall()}
+    records, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        try:
+            date = (row.get('date') or '').strip()
+            datetime.datetime.strptime(date, '%Y-%m-%d')
+            amount = float(str(row.get('amount') or '').replace(',', ''))
+            transaction_type = (row.get('type') or '').strip().lower() or ('expense' if amount < 0 else 'income')
+            category_id = int(row['category_id']) if (row.get('category_id') or '').strip() else None
+        except (TypeError, ValueError):
+            errors.append((number, 'Invalid date (YYYY-MM-DD), amount or category_id.'))
+            continue
+        if transaction_type not in ('income', 'expense'):
+            errors.append((number, f"Invalid type '{transaction_type}'."))
+        elif amount == 0:
+            errors.append((number, 'Amount must be non-zero.'))
+        elif category_id is not None and category_id not in valid_category_ids:
+            errors.append((number, f"Category {category_id} does not exist."))
+        elif not currency.is_valid_currency(row.get('currency')):
+            errors.append((number, f"Invalid currency '{row.get('currency')}'."))
+        else:
+            description = (row.get('description') or '').strip() or None
+            row_currency = currency.normalize_currency(row.get('currency'))
+            records.append([abs(amount), category_id, date, transaction_type, description,
+                            duplicates.transaction_fingerprint(abs(amount), transaction_type, description, row_currency),
+                            row_currency])
+
+    duplicate_count = 0
+    if records and not allow_duplicates:
+        matches = duplicates.match_existing(db, [(record[5], record[2]) for record in records])
+        duplicate_count = sum(1 for match in matches if match is not None)
+        records = [record for record, match in zip(records, matches) if match is None]
+
+    uncategorized = [record for record in records if record[1] is None]
+    suggested = categorizer.categorize_many((r[4], r[0], r[3]) for r in uncategorized)
+    for record, category_id in zip(uncategorized, suggested):
+        record[1] = category_id
+
+    if records:
+        try:
+            db.executemany("INSERT INTO transactions (amount, category_id, date, type, description, fingerprint, currency) VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        analytics_cube.invalidate_cube()
+        forecasting.record_transaction_change(min(record[2] for record in records))
+    auto_categorized = sum(1 for category_id in suggested if category_id is not None)
+    return {'imported': len(records), 'duplicates': duplicate_count, 'auto_categorized': auto_categorized,
+            'uncategorized': len(uncategorized) - auto_categorized, 'errors': errors}
+
+
+@click.command('import-transactions')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--allow-duplicates', is_flag=True, help='Import rows that match existing transactions.')
+@with_appcontext
+def import_transactions_command(csv_file, allow_duplicates):
+    """CLI command to bulk-import transactions from a CSV file (date, amount, type, description, category_id, currency)."""
+    reader = csv.DictReader(csv_file)
+    if not reader.fieldnames or not {'date', 'amount'} <= {name.strip().lower() for name in reader.fieldnames}:
+        raise click.ClickException('Expected a header row with at least "date" and "amount" columns.')
+    rows = [{(key or '').strip().lower(): value for key, value in row.items()} for row in reader]
+
+    result = ingest_transactions(get_db(), rows, allow_duplicates)
+    for number, message in result['errors']:
+        click.echo(f"Row {number}: {message}", err=True)
+    click.echo(f"Imported {result['imported']} of {len(rows)} transaction(s); "
+               f"{result['auto_categorized']} auto-categorized, {result['uncategorized']} left uncategorized.")
+    if result['duplicates']:
+        click.echo(f"Skipped {result['duplicates']} row(s) matching existing transactions (use --allow-duplicates to import them).")
@@ -1,132 +1,193 @@
 // app/static/js/charts.js
 
-// Assumes flaskVariables (view_month, view_year, view_period_type, focused_main_category_id) are global
-// Assumes initial chart data (initialExpectedVsActualData, nwsBudgetedChartData, nwsActualChartData) are global
+// Assumes flaskVariables (view_month, view_year, view_period_type, focused_main_category_id, reporting_currency) is global
+// Assumes the initial compact chart payload (chartPayload, see app/utils/chart_payloads.py) is global
 
 document.addEventListener('DOMContentLoaded', () => {
     console.log("Charts JS Loaded");
 
-    let expectedVsActualChartInstance = null; 
+    let expectedVsActualChartInstance = null;
     const expectedVsActualCtx = document.getElementById('expectedVsActualChart')?.getContext('2d');
     const expectedVsActualChartTitleEl = document.getElementById('expectedVsActualChartTitle');
     const backToMainCategoriesChartBtn = document.getElementById('backToMainCategoriesChartBtn');
+    const summaryBreakdownTitleEl = document.getElementById('summaryBreakdownTitle');
+    const summaryTableBody = document.getElementById('summaryTableBody');
+    // Amounts arrive converted to the reporting currency (payload.currency)
+    const reportingCurrency = (typeof chartPayload !== 'undefined' && chartPayload.currency)
+        || (typeof flaskVariables !== 'undefined' && flaskVariables.reporting_currency) || 'USD';
+    const currencyFormatter = new Intl.NumberFormat('en-US', { style: 'currency', currency: reportingCurrency });
+    const formatMoney = (value) => currencyFormatter.format(value);
 
-    function renderExpectedVsActualChart(chartData) {
-        if (expectedVsActualCtx) {
-            if (expectedVsActualChartInstance) { expectedVsActualChartInstance.destroy(); }
-            if (chartData && chartData.labels && chartData.labels.length > 0) {
-                expectedVsActualChartInstance = new Chart(expectedVsActualCtx, {
-                    type: 'bar',
-                    data: {
-                        labels: chartData.labels,
-                        datasets: [
-                            { label: 'Budgeted ($)', data: chartData.budgeted_data, backgroundColor: 'rgba(54, 162, 235, 0.6)', borderColor: 'rgba(54, 162, 235, 1)', borderWidth: 1 },
-                            { label: 'Actual ($)', data: chartData.actual_data, backgroundColor: 'rgba(255, 99, 132, 0.6)', borderColor: 'rgba(255, 99, 132, 1)', borderWidth: 1 }
-                        ]
-                    },
-                    options: { 
-                        responsive: true, maintainAspectRatio: false, 
-                        scales: { y: { beginAtZero: true, ticks: { callback: function(value) { return '$' + value; }} } }, 
-                        plugins: { 
-                            legend: { position: 'top' },
-                            tooltip: { callbacks: { label: function(context) { let label = context.dataset.label || ''; if (label) { label += ': '; } if (context.parsed.y !== null) { label += new Intl.NumberFormat('en-US', { style: 'currency', currency: 'USD' }).format(context.parsed.y); } return label;}}}
-                        },
-                        onClick: (event, elements) => {
-                            if (elements.length > 0) {
-                                const chartElement = elements[0];
-                                const index = chartElement.index;
-                                const categoryIdForDrilldown = chartData.category_ids_for_drilldown[index];
-                                if (categoryIdForDrilldown) { 
-                                    const currentUrl = new URL(window.location.href);
-                                    currentUrl.searchParams.set('main_cat_focus', categoryIdForDrilldown);
-                                    // Preserve other analytics params from current URL
-                                    const params = new URLSearchParams(window.location.search);
-                                    if(params.get('month')) currentUrl.searchParams.set('month', params.get('month'));
-                                    else if (window.flaskVariables && window.flaskVariables.view_month !== null) currentUrl.searchParams.set('month', window.flaskVariables.view_month);
-                                    
-                                    if(params.get('year')) currentUrl.searchParams.set('year', params.get('year'));
-                                    else if (window.flaskVariables) currentUrl.searchParams.set('year', window.flaskVariables.view_year);
-
-                                    if(params.get('period_type')) currentUrl.searchParams.set('period_type', params.get('period_type'));
-                                    else if (window.flaskVariables) currentUrl.searchParams.set('period_type', window.flaskVariables.view_period_type);
-                                    
-                                    window.location.href = currentUrl.toString();
-                                }
-                            }
-                        }
-                    }
-                });
-            } else { if (expectedVsActualCtx && expectedVsActualCtx.canvas) {expectedVsActualCtx.canvas.parentElement.innerHTML = '<p class="text-center text-muted p-5">No data for Budget vs. Actual chart.</p>';} }
+    function setNoDataMessage(ctx, html) {
+        // Keep the canvas in place so the chart can be re-rendered after a drilldown
+        const container = ctx.canvas.parentElement;
+        let messageEl = container.querySelector('.chart-message');
+        if (!messageEl) {
+            messageEl = document.createElement('p');
+            messageEl.className = 'chart-message text-center text-muted p-5';
+            container.appendChild(messageEl);
         }
+        messageEl.innerHTML = html;
+        messageEl.style.display = html ? '' : 'none';
+        ctx.canvas.style.display = html ? 'none' : '';
     }
-    
-    if (backToMainCategoriesChartBtn && expectedVsActualChartTitleEl) {
-        if (window.flaskVariables && window.flaskVariables.focused_main_category_id) { 
-            backToMainCategoriesChartBtn.style.display = 'inline-block';
-            backToMainCategoriesChartBtn.addEventListener('click', () => {
-                const currentUrl = new URL(window.location.href);
-                currentUrl.searchParams.delete('main_cat_focus');
-                const params = new URLSearchParams(window.location.search);
-                if(params.get('month')) currentUrl.searchParams.set('month', params.get('month'));
-                else if (window.flaskVariables && window.flaskVariables.view_month !== null) currentUrl.searchParams.set('month', window.flaskVariables.view_month);
-                
-                if(params.get('year')) currentUrl.searchParams.set('year', params.get('year'));
-                else if (window.flaskVariables) currentUrl.searchParams.set('year', window.flaskVariables.view_year);
 
-                if(params.get('period_type')) currentUrl.searchParams.set('period_type', params.get('period_type'));
-                else if (window.flaskVariables) currentUrl.searchParams.set('period_type', window.flaskVariables.view_period_type);
-                window.location.href = currentUrl.toString();
-            });
-        } else {
-            backToMainCategoriesChartBtn.style.display = 'none';
+    function renderExpectedVsActualChart(payload) {
+        if (!expectedVsActualCtx) return;
+        if (expectedVsActualChartInstance) { expectedVsActualChartInstance.destroy(); expectedVsActualChartInstance = null; }
+        if (!payload.labels || payload.labels.length === 0) {
+            setNoDataMessage(expectedVsActualCtx, 'No data for Budget vs. Actual chart.');
+            return;
         }
+        setNoDataMessage(expectedVsActualCtx, '');
+        expectedVsActualChartInstance = new Chart(expectedVsActualCtx, {
+            type: 'bar',
+            data: {
+                labels: payload.labels,
+                datasets: [
+                    { label: `Budgeted (${reportingCurrency})`, data: payload.budgeted, backgroundColor: 'rgba(54, 162, 235, 0.6)', borderColor: 'rgba(54, 162, 235, 1)', borderWidth: 1 },
+                    { label: `Actual (${reportingCurrency})`, data: payload.actual, backgroundColor: 'rgba(255, 99, 132, 0.6)', borderColor: 'rgba(255, 99, 132, 1)', borderWidth: 1 }
+                ].concat(
+                    // Projected series is only present while the viewed period is in progress
+                    payload.projected
+                        ? [{ label: `Projected (${reportingCurrency})`, data: payload.projected, backgroundColor: 'rgba(255, 159, 64, 0.35)', borderColor: 'rgba(255, 159, 64, 1)', borderWidth: 1, borderDash: [4, 4] }]
+                        : []
+                )
+            },
+            options: {
+                responsive: true, maintainAspectRatio: false,
+                scales: { y: { beginAtZero: true, ticks: { callback: function(value) { return formatMoney(value); }} } },
+                plugins: {
+                    legend: { position: 'top' },
+                    tooltip: { callbacks: { label: function(context) { let label = context.dataset.label || ''; if (label) { label += ': '; } if (context.parsed.y !== null) { label += currencyFormatter.format(context.parsed.y); } return label;}}}
+                },
+                onClick: (event, elements) => {
+                    if (elements.length > 0) {
+                        const categoryIdForDrilldown = payload.ids[elements[0].index];
+                        if (categoryIdForDrilldown) { loadChartView(categoryIdForDrilldown); }
+                    }
+                }
+            }
+        });
     }
 
-    function renderNwsPieChart(canvasId, chartTitle, chartDataJsonString) {
+    function renderNwsPieChart(canvasId, chartTitle, labels, values) {
         const ctx = document.getElementById(canvasId)?.getContext('2d');
-        if (ctx) {
-            const existingChart = Chart.getChart(ctx);
-            if (existingChart) { existingChart.destroy(); }
-            try {
-                const data = JSON.parse(chartDataJsonString); 
-                const nonZeroDataExists = data.data && data.data.some(d => parseFloat(d) > 0);
-                if (data.labels && nonZeroDataExists) {
-                    new Chart(ctx, {
-                        type: 'pie',
-                        data: {
-                            labels: data.labels,
-                            datasets: [{
-                                label: chartTitle, data: data.data,
-                                backgroundColor: ['rgba(255, 99, 132, 0.7)', 'rgba(255, 206, 86, 0.7)', 'rgba(75, 192, 192, 0.7)', 'rgba(201, 203, 207, 0.7)'],
-                                borderColor: ['#fff'], borderWidth: 1
-                            }]
-                        },
-                        options: { 
-                            responsive: true, maintainAspectRatio: false, 
-                            plugins: { 
-                                legend: { position: 'bottom' }, 
-                                tooltip: { callbacks: { label: (c) => `${c.label}: $${parseFloat(c.parsed).toFixed(2)} (${((parseFloat(c.parsed) / c.chart.getDatasetMeta(0).total) * 100).toFixed(1)}%)` }}
-                            }
-                        }
-                    });
-                } else {
-                     if (ctx.canvas) { ctx.canvas.parentElement.innerHTML = `<p class="text-center text-muted p-5">No data for ${chartTitle}.</p>`;}
+        if (!ctx) return;
+        const existingChart = Chart.getChart(ctx);
+        if (existingChart) { existingChart.destroy(); }
+        if (!values || !values.some(v => v > 0)) {
+            setNoDataMessage(ctx, `No data for ${chartTitle}.`);
+            return;
+        }
+        setNoDataMessage(ctx, '');
+        new Chart(ctx, {
+            type: 'pie',
+            data: {
+                labels: labels,
+                datasets: [{
+                    label: chartTitle, data: values,
+                    backgroundColor: ['rgba(255, 99, 132, 0.7)', 'rgba(255, 206, 86, 0.7)', 'rgba(75, 192, 192, 0.7)', 'rgba(201, 203, 207, 0.7)'],
+                    borderColor: ['#fff'], borderWidth: 1
+                }]
+            },
+            options: {
+                responsive: true, maintainAspectRatio: false,
+                plugins: {
+                    legend: { position: 'bottom' },
+                    tooltip: { callbacks: { label: (c) => `${c.label}: ${formatMoney(parseFloat(c.parsed))} (${((parseFloat(c.parsed) / c.chart.getDatasetMeta(0).total) * 100).toFixed(1)}%)` }}
                 }
-            } catch(e) {
-                console.error("Error parsing JSON for chart " + canvasId + ":", chartDataJsonString, e);
-                if (ctx.canvas) { ctx.canvas.parentElement.innerHTML = `<p class="text-center text-danger p-5">Error loading data for ${chartTitle}.</p>`;}
             }
+        });
+    }
+
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    function renderSummaryTable(payload) {
+        if (!summaryTableBody) return;
+        const typeBadgeClass = { Need: 'primary', Want: 'warning', Saving: 'success' };
+        const columnCount = 5 + (payload.projected ? 1 : 0) + (payload.carry ? 1 : 0);
+        if (!payload.labels.length) {
+            summaryTableBody.innerHTML = `<tr><td colspan="${columnCount}" class="text-center">No summary data for this period.</td></tr>`;
+            return;
+        }
+        summaryTableBody.innerHTML = payload.labels.map((label, i) => {
+            const type = payload.dict.type[payload.types[i]];
+            const variance = payload.variance[i];
+            return `<tr>
+                <td>${escapeHtml(label)}</td>
+                <td><span class="badge bg-${typeBadgeClass[type] || 'secondary'} text-dark">${type ? escapeHtml(type) : 'N/A'}</span></td>
+                <td class="text-end">${formatMoney(payload.budgeted[i])}</td>
+                ${payload.carry ? `<td class="text-end text-muted">${formatMoney(payload.carry[i])}</td>` : ''}
+                <td class="text-end">${formatMoney(payload.actual[i])}</td>
+                ${payload.projected ? `<td class="text-end text-muted">${formatMoney(payload.projected[i])}</td>` : ''}
+                <td class="text-end ${variance >= 0 ? 'variance-positive' : 'variance-negative'}">${formatMoney(variance)}</td>
+            </tr>`;
+        }).join('');
+    }
+
+    function updateTitles(payload) {
+        if (expectedVsActualChartTitleEl) {
+            expectedVsActualChartTitleEl.textContent = `Budget vs. Actual Expenses for ${payload.period.label} - ${payload.title}`;
+        }
+        if (summaryBreakdownTitleEl) {
+            summaryBreakdownTitleEl.textContent = `Detailed Breakdown (${payload.title}):`;
+        }
+        if (backToMainCategoriesChartBtn) {
+            backToMainCategoriesChartBtn.style.display = payload.focus ? 'inline-block' : 'none';
         }
     }
-    
-    // Ensure chart data is available globally (e.g., set by script tag in index.html)
-    if (typeof initialExpectedVsActualData !== 'undefined') {
-        renderExpectedVsActualChart(initialExpectedVsActualData);
+
+    function renderCharts(payload) {
+        renderExpectedVsActualChart(payload);
+        renderNwsPieChart('nwsBudgetedChart', 'Budgeted NWS', payload.dict.nws, payload.nws.budgeted);
+        renderNwsPieChart('nwsActualChart', 'Actual NWS', payload.dict.nws, payload.nws.actual);
+    }
+
+    // Fetches the chart payload for a main category focus (null for the overview) and
+    // re-renders in place; the URL is updated so reloads and back/forward keep the view.
+    async function loadChartView(mainCategoryId, pushHistory = true) {
+        const vars = window.flaskVariables || {};
+        const params = new URLSearchParams(window.location.search);
+        if (!params.get('period_type') && vars.view_period_type) params.set('period_type', vars.view_period_type);
+        if (!params.get('year') && vars.view_year) params.set('year', vars.view_year);
+        if (!params.get('month') && vars.view_month !== null && vars.view_month !== undefined) params.set('month', vars.view_month);
+        if (mainCategoryId) params.set('main_cat_focus', mainCategoryId);
+        else params.delete('main_cat_focus');
+
+        try {
+            const response = await fetch(`/analytics/api/charts?${params.toString()}`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const payload = await response.json();
+            renderCharts(payload);
+            renderSummaryTable(payload);
+            updateTitles(payload);
+            if (window.flaskVariables) window.flaskVariables.focused_main_category_id = payload.focus;
+            if (pushHistory) {
+                window.history.pushState({ mainCategoryId: payload.focus }, document.title, `${window.location.pathname}?${params.toString()}`);
+            }
+        } catch (error) {
+            // Fall back to a full page load of the requested view
+            console.error("Error loading chart drilldown:", error);
+            window.location.href = `${window.location.pathname}?${params.toString()}`;
+        }
     }
-    if (typeof nwsBudgetedChartData !== 'undefined') {
-        renderNwsPieChart('nwsBudgetedChart', 'Budgeted NWS', nwsBudgetedChartData);
+
+    if (backToMainCategoriesChartBtn) {
+        backToMainCategoriesChartBtn.style.display = (window.flaskVariables && window.flaskVariables.focused_main_category_id) ? 'inline-block' : 'none';
+        backToMainCategoriesChartBtn.addEventListener('click', () => loadChartView(null));
     }
-    if (typeof nwsActualChartData !== 'undefined') {
-        renderNwsPieChart('nwsActualChart', 'Actual NWS', nwsActualChartData);
+
+    window.addEventListener('popstate', () => {
+        loadChartView(new URLSearchParams(window.location.search).get('main_cat_focus'), false);
+    });
+
+    // The breakdown table is server-rendered on page load; only drilldowns rebuild it
+    if (typeof chartPayload !== 'undefined') {
+        renderCharts(chartPayload);
     }
 });
@@ -52,6 +52,20 @@ class GoalApiService {
         return this._fetch(this.flaskUrls.api_goals_list_url);
     }
 
+    /**
+     * Fetches rows changed since a sync cursor (see /sync/api/changes).
+     * @param {number|null} cursor - Cursor from the previous call; null for a full snapshot.
+     * @param {string[]} tables - Tables to sync, e.g. ['goals'].
+     */
+    async fetchChangesSince(cursor, tables = ['goals']) {
+        if (!this.flaskUrls.api_sync_changes_url) {
+            throw new Error("Sync URL not defined.");
+        }
+        const params = new URLSearchParams({ tables: tables.join(',') });
+        if (cursor !== null && typeof cursor !== 'undefined') params.set('cursor', cursor);
+        return this._fetch(`${this.flaskUrls.api_sync_changes_url}?${params.toString()}`);
+    }
+
     async fetchGoalDetails(goalId) {
         if (!this.flaskUrls.api_goal_details_url_template) {
             throw new Error("Goal details URL template not defined.");
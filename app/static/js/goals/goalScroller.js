@@ -3,11 +3,14 @@
  * animation, and click interactions.
  */
 class GoalScroller {
-    constructor(scrollerContentSelector, scrollerContainerSelector, initialGoals, apiService, modalManager) {
+    constructor(scrollerContentSelector, scrollerContainerSelector, initialGoals, apiService, modalManager, initialSyncCursor = null) {
         this.scrollerContentEl = document.querySelector(scrollerContentSelector);
         this.scrollerContainerEl = document.querySelector(scrollerContainerSelector);
         this.apiService = apiService;
         this.modalManager = modalManager;
+        // Local mirror of the goals table, kept current with delta sync instead of full reloads
+        this.goalsById = new Map((initialGoals || []).map(goal => [goal.id, goal]));
+        this.syncCursor = initialSyncCursor;
 
         if (!this.scrollerContentEl || !this.scrollerContainerEl) {
             console.error("Scroller content or container element not found.");
@@ -86,12 +89,34 @@ class GoalScroller {
         });
     }
 
+    _applySyncDelta(delta) {
+        const goalChanges = delta.changes.goals;
+        if (delta.full_resync) this.goalsById.clear();
+        goalChanges.deleted.forEach(goalId => this.goalsById.delete(goalId));
+        goalChanges.upserted.forEach(goal => {
+            goal.progress = goal.target_amount > 0 ? (goal.current_amount / goal.target_amount * 100) : 0;
+            this.goalsById.set(goal.id, goal);
+        });
+        this.syncCursor = delta.cursor;
+    }
+
     async refresh() {
         try {
-            const data = await this.apiService.fetchAllGoals();
-            if (data && data.goals) {
-                this.populateScroller(data.goals);
+            if (this.syncCursor === null || typeof this.apiService.fetchChangesSince !== 'function') {
+                const data = await this.apiService.fetchAllGoals();
+                if (data && data.goals) {
+                    this.goalsById = new Map(data.goals.map(goal => [goal.id, goal]));
+                    this.populateScroller(data.goals);
+                }
+                return;
             }
+            let delta;
+            do {
+                delta = await this.apiService.fetchChangesSince(this.syncCursor, ['goals']);
+                this._applySyncDelta(delta);
+            } while (delta.has_more);
+            // Newest first, matching the server's created_at ordering
+            this.populateScroller([...this.goalsById.values()].sort((a, b) => b.id - a.id));
         } catch (error) {
             console.error("Error refreshing scroller goals:", error);
             if (this.scrollerContentEl) this.scrollerContentEl.innerHTML = '<div class="goal-scroller-item" style="border-right: none;"><span class="goal-name text-danger">Error refreshing.</span></div>';
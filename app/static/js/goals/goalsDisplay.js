@@ -52,6 +52,8 @@ class GoalsDisplay {
                         <div class="progress-bar ${goalData.is_completed ? 'bg-success' : 'bg-primary'} progress-bar-striped${!goalData.is_completed ? ' progress-bar-animated' : ''}" role="progressbar" style="width: ${progress.toFixed(2)}%;" aria-valuenow="${progress.toFixed(2)}" aria-valuemin="0" aria-valuemax="100">${progress.toFixed(1)}%</div>
                     </div>
                     ${goalData.target_date ? `<p class="card-text small text-muted mb-0"><strong>Target:</strong> ${goalData.target_date}</p>` : '<p class="card-text small text-muted mb-0">No target date</p>'}
+                    ${!goalData.is_completed && goalData.projected_completion_date ? `<p class="card-text small text-muted mb-0"><strong>Projected:</strong> ${goalData.projected_completion_date}</p>` : ''}
+                    ${!goalData.is_completed && goalData.required_monthly_contribution ? `<p class="card-text small text-muted mb-0"><strong>Needed:</strong> ${this._formatCurrency(goalData.required_monthly_contribution)}/mo</p>` : ''}
                     <p class="card-text small text-muted"><small>Created: ${new Date(goalData.created_at).toLocaleDateString()}</small></p>
                 </div>
                 <div class="card-footer bg-transparent border-top-0 text-center pt-0">
@@ -159,12 +159,22 @@ document.addEventListener('DOMContentLoaded', () => {
                     return;
                 }
 
-                const response = await fetch(window.flask_urls.log_paycheck, {
+                let response = await fetch(window.flask_urls.log_paycheck, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify(payload)
                 });
-                const result = await response.json();
+                let result = await response.json();
+
+                // The server refuses likely double-logged paychecks unless confirmed
+                if (response.status === 409 && result.duplicate && confirm(`${result.message} Log it anyway?`)) {
+                    response = await fetch(window.flask_urls.log_paycheck, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ ...payload, allow_duplicate: true })
+                    });
+                    result = await response.json();
+                }
 
                 if (response.ok && result.status === 'success') {
                     // Success message will be flashed by Flask on page reload
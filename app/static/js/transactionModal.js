@@ -12,6 +12,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const modalAmountInput = document.getElementById('modal_amount');
     const modalDateInput = document.getElementById('modal_date');
     const modalTypeSelect = document.getElementById('modal_type');
+    const modalDescriptionInput = document.getElementById('modal_description');
+    const modalCurrencyInput = document.getElementById('modal_currency');
+    const modalCategorySuggestion = document.getElementById('modal_category_suggestion');
     const mainCategorySelectForTransaction = document.getElementById('modal_main_category_select');
     const subCategorySelectForTransaction = document.getElementById('modal_sub_category_select');
     const subCategoryWrapperForTransaction = document.getElementById('modal_subcategory_wrapper');
@@ -34,6 +37,7 @@ document.addEventListener('DOMContentLoaded', () => {
     function resetTransactionForm() {
         if (transactionForm) transactionForm.reset(); 
         if (transactionIdEditInput) transactionIdEditInput.value = ''; 
+        if (modalAmountInput) modalAmountInput.readOnly = false;
         if (modalTransactionTitle) modalTransactionTitle.textContent = 'Add New Transaction';
         const saveBtnInFooter = document.querySelector('#addTransactionModal .modal-footer button[type="submit"]');
         if (saveBtnInFooter) saveBtnInFooter.textContent = 'Save Transaction';
@@ -65,6 +69,7 @@ document.addEventListener('DOMContentLoaded', () => {
             modalDateInput.value = today.getFullYear() + '-' + String(today.getMonth() + 1).padStart(2, '0') + '-' + String(today.getDate()).padStart(2, '0');
         }
         if(modalTypeSelect) modalTypeSelect.value = 'expense';
+        if (modalCategorySuggestion) modalCategorySuggestion.textContent = '';
     } 
 
     if (mainCategorySelectForTransaction && typeof hierarchicalDataFromFlask !== 'undefined') {
@@ -116,6 +121,42 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     } 
     
+    // Pre-selects the category chosen by the categorization rules, unless one was already picked
+    async function suggestCategoryForTransaction() {
+        if (!modalDescriptionInput || !window.flask_urls || !flask_urls.suggest_category) return;
+        if (transactionIdEditInput && transactionIdEditInput.value) return; // Don't override an edit
+        if (finalCategoryIdInputForTransaction && finalCategoryIdInputForTransaction.value) return;
+        const description = modalDescriptionInput.value.trim();
+        if (!description) return;
+        try {
+            const response = await fetch(flask_urls.suggest_category, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    description: description,
+                    amount: modalAmountInput ? modalAmountInput.value : null,
+                    type: modalTypeSelect ? modalTypeSelect.value : null
+                })
+            });
+            const result = await response.json();
+            if (result.status !== 'success' || !result.category_id) return;
+            const categoryId = String(result.category_id);
+            const subCategoriesMap = (typeof hierarchicalDataFromFlask !== 'undefined' && hierarchicalDataFromFlask.sub_categories_map) || {};
+            const mainId = Object.keys(subCategoriesMap).find(mainKey =>
+                (subCategoriesMap[mainKey] || []).some(subCat => String(subCat.id) === categoryId)) || categoryId;
+            if (mainCategorySelectForTransaction) mainCategorySelectForTransaction.value = mainId;
+            populateSubcategoriesForTransaction(mainId, mainId !== categoryId ? categoryId : null);
+            if (finalCategoryIdInputForTransaction) finalCategoryIdInputForTransaction.value = categoryId;
+            if (modalCategorySuggestion) modalCategorySuggestion.textContent = 'Category suggested by your categorization rules.';
+        } catch (error) {
+            console.error('Error fetching category suggestion:', error);
+        }
+    }
+
+    if (modalDescriptionInput) {
+        modalDescriptionInput.addEventListener('change', suggestCategoryForTransaction);
+    }
+
     document.getElementById('openAddTransactionModalBtn')?.addEventListener('click', function() { 
         if (transactionForm) { // Set data attribute for add action URL
             transactionForm.dataset.addActionUrl = this.dataset.addActionUrl; // Assuming button has this
@@ -155,8 +196,12 @@ document.addEventListener('DOMContentLoaded', () => {
 
             if (transactionIdEditInput) transactionIdEditInput.value = transactionId; 
             if (modalAmountInput) modalAmountInput.value = this.dataset.amount;
+            // Split transactions: the amount changes only through their split lines (see /transactions/api/<id>/splits)
+            if (modalAmountInput) modalAmountInput.readOnly = parseInt(this.dataset.splitCount || '0', 10) > 0;
             if (modalDateInput) modalDateInput.value = this.dataset.date;
             if (modalTypeSelect) modalTypeSelect.value = this.dataset.type;
+            if (modalDescriptionInput) modalDescriptionInput.value = this.dataset.description || '';
+            if (modalCurrencyInput) modalCurrencyInput.value = this.dataset.currency || ''; // Blank: reporting currency
             
             const categoryId = this.dataset.category_id; 
             const mainCategoryForEdit = this.dataset.main_category_for_edit; 
@@ -0,0 +1,230 @@
+# app/utils/analytics_cube.py
+# In-memory category x month x type cube of budgeted and actual amounts,
+# used for interactive what-if / drilldown queries without further SQL round trips.
+
+import threading
+import time
+import datetime
+import numpy as np
+from flask import current_app
+from app.database import get_db
+from app.utils import currency, splits
+
+# Third axis of the cube
+KINDS = ('budgeted', 'expense', 'income')
+KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+
+def month_index(year: int, month: int) -> int:
+    """Absolute month number used for the cube's month axis (year * 12 + month - 1)."""
+    return int(year) * 12 + int(month) - 1
+
+def month_label(index: int) -> str:
+    """Inverse of month_index, formatted as 'YYYY-MM'."""
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class AnalyticsCube:
+    """
+    Dense NumPy array of amounts indexed by [category, month, kind].
+    The last category row holds uncategorized transactions. Parent rollups are done
+    with a one-hot (main x category) matrix so every query is a handful of vectorized ops.
+    """
+
+    def __init__(self, categories, first_month, last_month):
+        self.category_ids = [c['id'] for c in categories]
+        self.category_names = [c['name'] for c in categories] + ['Uncategorized']
+        self.parent_ids = [c['parent_id'] for c in categories] + [None]
+        self.row_for_category = {cat_id: i for i, cat_id in enumerate(self.category_ids)}
+        self.uncategorized_row = len(self.category_ids)
+
+        # Main categories in name order, and each category row's main category position
+        self.main_ids = sorted((c['id'] for c in categories if c['parent_id'] is None),
+                               key=lambda cat_id: self.category_names[self.row_for_category[cat_id]])
+        main_position = {cat_id: i for i, cat_id in enumerate(self.main_ids)}
+        self.main_of_row = np.array(
+            [main_position.get(p if p is not None else cid, -1)
+             for cid, p in zip(self.category_ids, self.parent_ids[:-1])] + [-1], dtype=np.int64)
+        self.rollup_matrix = np.zeros((len(self.main_ids), len(self.category_names)))
+        has_main = self.main_of_row >= 0
+        self.rollup_matrix[self.main_of_row[has_main], np.nonzero(has_main)[0]] = 1.0
+
+        self.first_month = first_month
+        self.last_month = last_month
+        self.data = np.zeros((len(self.category_names), last_month - first_month + 1, len(KINDS)))
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, db):
+        """Builds a cube from the database with one grouped query per source table."""
+        categories = [dict(r) for r in db.execute("SELECT id, name, parent_id FROM categories ORDER BY id").fetchall()]
+        # Archived years come from their monthly summary, not the archive file
+        # Amounts are converted to the reporting currency, and split transactions spread
+        # over their lines' categories, in the same grouped queries
+        actual_rows = db.execute(f"""
+            SELECT category_id, year, month, type, SUM(amount) AS amount FROM (
+                SELECT l.category_id, CAST(strftime('%Y', l.date) AS INTEGER) AS year,
+                       CAST(strftime('%m', l.date) AS INTEGER) AS month, l.type, {currency.amount_sql('l')} AS amount
+                FROM ({splits.transaction_lines_sql()}) l WHERE strftime('%Y', l.date) IS NOT NULL
+                UNION ALL
+                SELECT category_id, year, month, type, amount FROM archive_monthly_summary
+            )
+            GROUP BY category_id, year, month, type
+        """).fetchall()
+        budget_rows = db.execute(f"""
+            SELECT b.category_id, b.year, b.month, SUM({currency.budget_amount_sql('b')}) AS amount
+            FROM budget_goals b GROUP BY b.category_id, b.year, b.month
+        """).fetchall()
+
+        today = datetime.date.today()
+        months = [month_index(r['year'], r['month']) for r in actual_rows] + \
+                 [month_index(r['year'], r['month']) for r in budget_rows]
+        # Always cover this year plus the next, so ordinary new writes land inside the cube
+        first_month = min(months + [month_index(today.year, 1)])
+        last_month = max(months + [month_index(today.year + 1, 12)])
+
+        cube = cls(categories, first_month, last_month)
+        for r in actual_rows:
+            cube._add(r['category_id'], month_index(r['year'], r['month']), r['type'], r['amount'])
+        for r in budget_rows:
+            cube._add(r['category_id'], month_index(r['year'], r['month']), 'budgeted', r['amount'])
+        return cube
+
+    def _row(self, category_id):
+        if category_id is None:
+            return self.uncategorized_row
+        return self.row_for_category.get(category_id)
+
+    def _add(self, category_id, month_idx, kind, amount):
+        """Adds amount to one cell. Returns False if the cell lies outside the cube."""
+        row = self._row(category_id)
+        kind_idx = KIND_INDEX.get(kind)
+        if row is None or kind_idx is None or not (self.first_month <= month_idx <= self.last_month):
+            return False
+        self.data[row, month_idx - self.first_month, kind_idx] += amount
+        return True
+
+    def _month_slice(self, start, end):
+        start = max(start, self.first_month)
+        end = min(end, self.last_month)
+        return slice(start - self.first_month, max(end - self.first_month + 1, start - self.first_month))
+
+    def query(self, start, end, level='main', focused_main_category_id=None, by_month=False, rolling=None):
+        """
+        Slices the cube and rolls it up.
+        Args:
+            start, end (int): Inclusive month indexes (see month_index).
+            level (str): 'main' rolls subcategories up into their main category;
+                         'category' returns every category row.
+            focused_main_category_id (int, optional): Restrict to one main category and its subcategories.
+            by_month (bool): Keep the month axis instead of summing over the span.
+            rolling (int, optional): With by_month, replace values by trailing sums over this many months.
+        Returns:
+            dict: Columnar result with labels, ids and one array per kind plus 'variance'
+                  (budgeted - expense). Arrays are [row] or [row][month].
+        """
+        months = self._month_slice(start, end)
+        # Rolling windows need the months just before the span as well
+        lead = 0
+        if by_month and rolling and rolling > 1:
+            lead = min(rolling - 1, months.start)
+        block = self.data[:, months.start - lead:months.stop, :] # (category, month, kind)
+
+        if focused_main_category_id is not None:
+            rows = [i for i, (cid, pid) in enumerate(zip(self.category_ids, self.parent_ids))
+                    if cid == focused_main_category_id or pid == focused_main_category_id]
+            block = block[rows]
+            ids = [self.category_ids[i] for i in rows]
+            labels = [self.category_names[i] for i in rows]
+        elif level == 'main':
+            block = np.tensordot(self.rollup_matrix, block, axes=1)
+            ids = list(self.main_ids)
+            labels = [self.category_names[self.row_for_category[i]] for i in ids]
+        else:
+            ids = self.category_ids + [None]
+            labels = list(self.category_names)
+
+        if by_month:
+            if rolling and rolling > 1:
+                csum = np.cumsum(block, axis=1)
+                shifted = np.zeros_like(csum)
+                shifted[:, rolling:, :] = csum[:, :-rolling, :]
+                block = csum - shifted
+            values = block[:, lead:, :]
+        else:
+            values = block.sum(axis=1)
+
+        result = {
+            'labels': labels,
+            'category_ids': ids,
+            'variance': (values[..., KIND_INDEX['budgeted']] - values[..., KIND_INDEX['expense']]).tolist()
+        }
+        for kind in KINDS:
+            result[kind] = values[..., KIND_INDEX[kind]].tolist()
+        if by_month:
+            result['months'] = [month_label(m) for m in range(months.start + self.first_month, months.stop + self.first_month)]
+        return result
+
+
+# --- Per-process cube cache ---
+
+_cube_lock = threading.Lock()
+
+def get_cube():
+    """Returns the current app's cube, (re)loading it if missing, invalidated or older than CUBE_MAX_AGE_SECONDS."""
+    state = current_app.extensions.setdefault('analytics_cube', {'cube': None})
+    cube = state['cube']
+    max_age = current_app.config.get('CUBE_MAX_AGE_SECONDS', 300)
+    if cube is None or time.time() - cube.loaded_at > max_age:
+        with _cube_lock:
+            cube = state['cube']
+            if cube is None or time.time() - cube.loaded_at > max_age:
+                started = time.perf_counter()
+                cube = AnalyticsCube.load(get_db())
+                state['cube'] = cube
+                current_app.logger.info(f"Analytics cube loaded {cube.data.shape} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return cube
+
+def invalidate_cube():
+    """Drops the cached cube; the next get_cube() reloads it. Use after structural category changes."""
+    state = current_app.extensions.get('analytics_cube')
+    if state is not None:
+        state['cube'] = None
+
+def cached_cube():
+    """
+    The cube cached right now, or None. Take it before committing a write and pass it to
+    record_amount_change, so the write is never applied to a cube loaded after the commit.
+    """
+    state = current_app.extensions.get('analytics_cube')
+    return state['cube'] if state else None
+
+def record_amount_change(category_id, date_or_year_month, kind, amount, *, cube):
+    """
+    Applies one committed write to the cached cube incrementally.
+    Args:
+        category_id (int or None): Category of the affected row.
+        date_or_year_month (str or tuple): 'YYYY-MM-DD' transaction date or (year, month) for budgets.
+        kind (str): 'budgeted', 'expense' or 'income'.
+        amount (float): Signed change (negative to remove an old value).
+        cube: cached_cube() as taken before the write was committed.
+    The change is skipped if the cube was reloaded (or dropped) since then: a reloaded cube
+    already contains the write. Cells outside the cube (new category, far-off month)
+    invalidate it instead.
+    """
+    state = current_app.extensions.get('analytics_cube')
+    if cube is None or state is None:
+        return
+    try:
+        if isinstance(date_or_year_month, str):
+            year, month = int(date_or_year_month[:4]), int(date_or_year_month[5:7])
+        else:
+            year, month = date_or_year_month
+        index = month_index(year, month)
+    except (ValueError, TypeError):
+        index = None
+    with _cube_lock:
+        if state['cube'] is not cube:
+            return
+        applied = index is not None and cube._add(category_id, index, kind, amount)
+        if not applied:
+            state['cube'] = None
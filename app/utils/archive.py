@@ -0,0 +1,300 @@
+# app/utils/archive.py
+# Moves transactions of closed years into a separate archive database (ATTACHed as
+# 'archive') so the live transactions table and its indexes stay small. Archived
+# amounts are kept in main.archive_monthly_summary, so totals, the NWS rollup and the
+# analytics cube never need the archive file; only reads of individual archived rows
+# (partial months, exports) attach it. Summaries hold reporting-currency amounts converted
+# at the rates loaded when the year was archived. Split lines move with their transaction.
+
+import datetime
+import os
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.database import get_db
+from app.utils import currency, splits
+
+ARCHIVE_SCHEMA = 'archive'
+TRANSACTION_COLUMNS = 'id, amount, category_id, date, type, description, currency'
+SPLIT_COLUMNS = 'id, transaction_id, category_id, amount, description'
+
+def get_archived_years(db=None):
+    """Years whose transactions are (being) moved to the archive, oldest first."""
+    db = db or get_db()
+    return [row[0] for row in db.execute("SELECT year FROM archived_years ORDER BY year").fetchall()]
+
+def is_attached(db):
+    return any(row[1] == ARCHIVE_SCHEMA for row in db.execute("PRAGMA database_list").fetchall())
+
+def attach_archive(db=None, create=False):
+    """
+    Attaches ARCHIVE_DATABASE to the connection (once) and defines the temporary views
+    all_transactions and all_transaction_splits (live UNION ALL archived rows) for
+    historical queries.
+    Must be called outside a transaction.
+    Args:
+        create (bool): Create the archive file and its schema if missing.
+    Returns:
+        bool: False if there is no archive file (and create is False).
+    """
+    db = db or get_db()
+    if not is_attached(db):
+        path = current_app.config['ARCHIVE_DATABASE']
+        if not create and not os.path.exists(path):
+            return False
+        db.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+        if create:
+            db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.transactions (
+                    id INTEGER PRIMARY KEY, -- Same id as in the live table
+                    amount REAL NOT NULL,
+                    category_id INTEGER,    -- main.categories(id); not enforced across files
+                    date TEXT NOT NULL,
+                    type TEXT NOT NULL CHECK(type IN ('income', 'expense')),
+                    description TEXT,
+                    currency TEXT           -- NULL means the reporting currency
+                )
+            """)
+            db.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transactions_date ON transactions (date)")
+            db.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transactions_category_date ON transactions (category_id, date)")
+        columns = [row[1] for row in db.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info(transactions)").fetchall()]
+        if columns and 'currency' not in columns: # Archive written before multi-currency support
+            db.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.transactions ADD COLUMN currency TEXT")
+        if columns: # Also added to archives written before split transactions
+            db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.transaction_splits (
+                    id INTEGER PRIMARY KEY,  -- Same id as in the live table
+                    transaction_id INTEGER NOT NULL, -- {ARCHIVE_SCHEMA}.transactions(id)
+                    category_id INTEGER,
+                    amount REAL NOT NULL,
+                    description TEXT
+                )
+            """)
+            db.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transaction_splits_transaction ON transaction_splits (transaction_id)")
+        db.execute(f"""
+            CREATE TEMP VIEW IF NOT EXISTS all_transactions AS
+            SELECT {TRANSACTION_COLUMNS} FROM main.transactions
+            UNION ALL
+            SELECT {TRANSACTION_COLUMNS} FROM {ARCHIVE_SCHEMA}.transactions
+        """)
+        db.execute(f"""
+            CREATE TEMP VIEW IF NOT EXISTS all_transaction_splits AS
+            SELECT {SPLIT_COLUMNS} FROM main.transaction_splits
+            UNION ALL
+            SELECT {SPLIT_COLUMNS} FROM {ARCHIVE_SCHEMA}.transaction_splits
+        """)
+    return True
+
+def transactions_source(db=None):
+    """Table name covering every transaction: the all_transactions view when an archive exists."""
+    db = db or get_db()
+    return 'all_transactions' if get_archived_years(db) and attach_archive(db) else 'transactions'
+
+def splits_source(db=None):
+    """Split lines matching transactions_source: the all_transaction_splits view when an archive exists."""
+    db = db or get_db()
+    return 'all_transaction_splits' if get_archived_years(db) and attach_archive(db) else 'transaction_splits'
+
+def _archive_lines_sql():
+    return splits.transaction_lines_sql(f"{ARCHIVE_SCHEMA}.transactions", f"{ARCHIVE_SCHEMA}.transaction_splits")
+
+def _month_floor(day):
+    return datetime.date(day.year, day.month, 1)
+
+def _month_ceil(day):
+    if day.day == 1:
+        return day
+    return datetime.date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+def get_archived_actuals(start, end, db=None):
+    """
+    Totals of archived transactions dated in [start, end).
+    Whole months come from archive_monthly_summary; only partial months at the edges
+    of the range are read from the attached archive.
+    Returns:
+        dict or None: 'expense_by_category' ({category_id: amount}), 'expense' and 'income';
+                      None when no archived year overlaps the range.
+    """
+    db = db or get_db()
+    years = [y for y in get_archived_years(db) if datetime.date(y, 1, 1) < end and start < datetime.date(y + 1, 1, 1)]
+    if not years:
+        return None
+    totals = {'expense_by_category': {}, 'expense': 0.0, 'income': 0.0}
+
+    def add(rows):
+        for row in rows:
+            totals[row['type']] += row['amount']
+            if row['type'] == 'expense':
+                by_category = totals['expense_by_category']
+                by_category[row['category_id']] = by_category.get(row['category_id'], 0.0) + row['amount']
+
+    # Archived years are contiguous in practice, but clip each one separately to be safe
+    for year in years:
+        clip_start = max(start, datetime.date(year, 1, 1))
+        clip_end = min(end, datetime.date(year + 1, 1, 1))
+        whole_start, whole_end = _month_ceil(clip_start), _month_floor(clip_end)
+        if whole_start < whole_end:
+            add(db.execute("""
+                SELECT category_id, type, SUM(amount) AS amount FROM archive_monthly_summary
+                WHERE year = ? AND month >= ? AND month < ?
+                GROUP BY category_id, type
+            """, (year, whole_start.month, whole_end.month if whole_end.year == year else 13)).fetchall())
+            edges = [(clip_start, whole_start), (whole_end, clip_end)]
+        else:
+            edges = [(clip_start, clip_end)]
+        for edge_start, edge_end in edges:
+            if edge_start < edge_end and attach_archive(db):
+                add(db.execute(f"""
+                    SELECT l.category_id, l.type, SUM({currency.amount_sql('l')}) AS amount FROM ({_archive_lines_sql()}) l
+                    WHERE l.date >= ? AND l.date < ? GROUP BY l.category_id, l.type
+                """, (edge_start.isoformat(), edge_end.isoformat())).fetchall())
+    return totals
+
+
+# --- Archiving ---
+
+# The delete triggers took the moved expenses out of nws_monthly_rollup; this adds them back
+_RESTORE_NWS_ROLLUP_SQL = f"""
+    INSERT INTO main.nws_monthly_rollup (year, month, goal_type, actual_amount, budgeted_amount)
+    SELECT CAST(strftime('%Y', l.date) AS INTEGER), CAST(strftime('%m', l.date) AS INTEGER),
+           COALESCE((SELECT financial_goal_type FROM main.categories WHERE id = l.category_id), 'Unclassified'),
+           SUM({currency.amount_sql('l')}), 0
+    FROM ({_archive_lines_sql()}) l
+    WHERE l.transaction_id IN (SELECT id FROM temp.archive_chunk)
+      AND l.type = 'expense' AND l.category_id IS NOT NULL AND strftime('%Y', l.date) IS NOT NULL
+    GROUP BY 1, 2, 3
+    ON CONFLICT (year, month, goal_type) DO UPDATE SET actual_amount = actual_amount + excluded.actual_amount
+"""
+
+def archive_year(year, chunk_size=5000, db=None):
+    """
+    Moves one year's transactions into the archive, chunk_size rows per transaction, so
+    the app is never locked out for long. Each chunk copies its rows (and split lines), adds them to
+    archive_monthly_summary, deletes them from the live table and restores their NWS
+    rollup amounts, all in one commit. Safe to re-run after an interruption.
+    Net pay transactions linked from paychecks stay live (paychecks reference them).
+    Returns:
+        int: Transactions moved.
+    """
+    db = db or get_db()
+    attach_archive(db, create=True)
+    db.execute("CREATE TEMP TABLE IF NOT EXISTS archive_chunk (id INTEGER PRIMARY KEY)")
+    db.execute("INSERT OR IGNORE INTO archived_years (year) VALUES (?)", (year,))
+    db.commit()
+    bounds = (f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+    moved = 0
+    while True:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM temp.archive_chunk")
+            count = db.execute("""
+                INSERT INTO temp.archive_chunk (id)
+                SELECT id FROM main.transactions
+                WHERE date >= ? AND date < ?
+                  AND id NOT IN (SELECT net_pay_transaction_id FROM main.paychecks WHERE net_pay_transaction_id IS NOT NULL)
+                ORDER BY date, id LIMIT ?
+            """, bounds + (chunk_size,)).rowcount
+            if count == 0:
+                db.execute("""
+                    UPDATE archived_years SET completed_at = CURRENT_TIMESTAMP,
+                        transaction_count = (SELECT COALESCE(SUM(transaction_count), 0) FROM archive_monthly_summary WHERE year = ?)
+                    WHERE year = ?
+                """, (year, year))
+                db.commit()
+                break
+
+            chunk_filter = "id IN (SELECT id FROM temp.archive_chunk)"
+            # OR REPLACE: a row copied by a run interrupted before its delete committed is simply rewritten
+            db.execute(f"""
+                INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.transactions ({TRANSACTION_COLUMNS})
+                SELECT {TRANSACTION_COLUMNS} FROM main.transactions WHERE {chunk_filter}
+            """)
+            db.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.transaction_splits WHERE transaction_id IN (SELECT id FROM temp.archive_chunk)")
+            db.execute(f"""
+                INSERT INTO {ARCHIVE_SCHEMA}.transaction_splits ({SPLIT_COLUMNS})
+                SELECT {SPLIT_COLUMNS} FROM main.transaction_splits WHERE transaction_id IN (SELECT id FROM temp.archive_chunk)
+            """)
+            # Amounts follow the split lines; each transaction is counted once, under its own category
+            summary = {}
+            for row in db.execute(f"""
+                SELECT CAST(strftime('%m', l.date) AS INTEGER) AS month, l.category_id, l.type, SUM({currency.amount_sql('l')}) AS amount
+                FROM ({splits.transaction_lines_sql('main.transactions', 'main.transaction_splits')}) l
+                WHERE l.transaction_id IN (SELECT id FROM temp.archive_chunk) GROUP BY 1, 2, 3
+            """).fetchall():
+                summary[(row['month'], row['category_id'], row['type'])] = [row['amount'], 0]
+            for row in db.execute(f"""
+                SELECT CAST(strftime('%m', date) AS INTEGER) AS month, category_id, type, COUNT(*) AS transaction_count
+                FROM main.transactions WHERE {chunk_filter} GROUP BY 1, 2, 3
+            """).fetchall():
+                summary.setdefault((row['month'], row['category_id'], row['type']), [0.0, 0])[1] = row['transaction_count']
+            for (month, category_id, kind), (amount, transaction_count) in summary.items():
+                params = (amount, transaction_count, year, month, category_id, kind)
+                updated = db.execute("""
+                    UPDATE archive_monthly_summary SET amount = amount + ?, transaction_count = transaction_count + ?
+                    WHERE year = ? AND month = ? AND category_id IS ? AND type = ?
+                """, params).rowcount
+                if not updated:
+                    db.execute("""
+                        INSERT INTO archive_monthly_summary (amount, transaction_count, year, month, category_id, type)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, params)
+            db.execute(f"DELETE FROM main.transactions WHERE {chunk_filter}")
+            db.execute(_RESTORE_NWS_ROLLUP_SQL)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        moved += count
+    return moved
+
+def archive_closed_years(before_year, chunk_size=5000, vacuum=False, db=None, log=None):
+    """
+    Archives every year before before_year that still has live transactions.
+    Args:
+        vacuum (bool): VACUUM the live database afterwards to return the freed pages,
+                       so the working set is packed into as few pages as possible.
+    Returns:
+        dict: year -> transactions moved.
+    """
+    db = db or get_db()
+    if before_year > datetime.date.today().year:
+        raise ValueError("Only closed years (before the current year) can be archived.")
+    years = [row[0] for row in db.execute("""
+        SELECT DISTINCT CAST(strftime('%Y', date) AS INTEGER) FROM transactions
+        WHERE date < ? AND strftime('%Y', date) IS NOT NULL
+          AND id NOT IN (SELECT net_pay_transaction_id FROM paychecks WHERE net_pay_transaction_id IS NOT NULL)
+        ORDER BY 1
+    """, (f"{before_year:04d}-01-01",)).fetchall()]
+    # Resume years whose archiving was interrupted even if nothing is left to move
+    years = sorted(set(years) | {row[0] for row in db.execute(
+        "SELECT year FROM archived_years WHERE completed_at IS NULL AND year < ?", (before_year,)).fetchall()})
+    moved = {}
+    for year in years:
+        started = time.perf_counter()
+        moved[year] = archive_year(year, chunk_size, db)
+        if log:
+            log(f"Archived {moved[year]} transactions from {year} ({time.perf_counter() - started:.1f} s).")
+    if vacuum and moved:
+        db.execute("VACUUM main")
+        db.execute("ANALYZE main")
+    return moved
+
+@click.command('archive-years')
+@click.option('--before', 'before_year', type=int, default=None,
+              help='Archive years before this one (default: current year - ARCHIVE_KEEP_YEARS).')
+@click.option('--chunk-size', type=int, default=5000, help='Transactions moved per database transaction.')
+@click.option('--vacuum', is_flag=True, help='VACUUM the live database afterwards to shrink it.')
+@with_appcontext
+def archive_years_command(before_year, chunk_size, vacuum):
+    """Moves transactions of closed years into ARCHIVE_DATABASE, keeping their totals."""
+    if before_year is None:
+        before_year = datetime.date.today().year - current_app.config['ARCHIVE_KEEP_YEARS']
+    try:
+        moved = archive_closed_years(before_year, chunk_size=chunk_size, vacuum=vacuum, log=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if not moved:
+        click.echo(f"Nothing to archive before {before_year}.")
+    else:
+        click.echo(f"Archived {sum(moved.values())} transactions into {current_app.config['ARCHIVE_DATABASE']}.")
@@ -0,0 +1,191 @@
+# app/utils/backups.py
+# Online backups of the live database (and the archive database of closed years, when
+# there is one) with the SQLite backup API, copied in small steps so writers are never
+# blocked for long, plus verification and rotation. The copies taken by one run share a
+# timestamp and are verified, kept and rotated together as one backup set.
+
+import datetime
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+BACKUP_PREFIX = 'budget-'
+BACKUP_SUFFIX = '.db'
+ARCHIVE_BACKUP_SUFFIX = '-archive.db' # Archive copy of the same set: budget-YYYYMMDD-HHMMSS-archive.db
+_BACKUP_NAME = re.compile(r'^' + re.escape(BACKUP_PREFIX) + r'(\d{8}-\d{6})(?:-archive)?\.db$')
+
+class _BackupRestarted(Exception):
+    """Raised from the progress callback when the stepped copy keeps being restarted by writers."""
+
+
+def create_backup(database, backup_dir, pages_per_step=256, step_sleep=0.05, max_restarts=3,
+                  stamp=None, suffix=BACKUP_SUFFIX):
+    """
+    Copies a database to backup_dir/budget-<stamp><suffix> (stamp: YYYYMMDD-HHMMSS, default now).
+    Pages are copied pages_per_step at a time with a step_sleep pause between steps;
+    the source is only read-locked during each step, so the app keeps writing.
+    A write from another connection makes SQLite restart the copy from the first page;
+    after max_restarts restarts the copy is finished in a single step instead (one short
+    read lock for the whole file) so a busy app can't starve the backup.
+    The copy is written under a '.partial' name and renamed once complete.
+    Returns:
+        str: Path of the new backup file.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = stamp or datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    final_path = os.path.join(backup_dir, f"{BACKUP_PREFIX}{stamp}{suffix}")
+    partial_path = final_path + '.partial'
+    restarts = 0
+    last_remaining = None
+
+    def pause_between_steps(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _BackupRestarted()
+        last_remaining = remaining
+        if remaining:
+            time.sleep(step_sleep)
+
+    source = sqlite3.connect(database, timeout=30)
+    target = sqlite3.connect(partial_path)
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=pause_between_steps)
+        except _BackupRestarted:
+            source.backup(target, pages=-1)
+    except Exception:
+        target.close()
+        os.remove(partial_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+    os.replace(partial_path, final_path)
+    return final_path
+
+def verify_backup(path):
+    """
+    Opens a backup read-only and runs PRAGMA integrity_check.
+    Returns:
+        tuple: (ok, message)
+    """
+    try:
+        conn = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+        try:
+            results = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall()]
+            conn.execute("SELECT COUNT(*) FROM transactions").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return False, str(e)
+    if results != ['ok']:
+        return False, '; '.join(results[:10])
+    return True, 'ok'
+
+def rotate_backups(backup_dir, keep):
+    """
+    Deletes all but the newest `keep` backup sets (a live copy and, if taken, its archive
+    copy) and any leftover .partial files. Returns deleted paths.
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+    names = os.listdir(backup_dir)
+    sets = {}
+    for name in names:
+        match = _BACKUP_NAME.match(name)
+        if match:
+            sets.setdefault(match.group(1), []).append(name)
+    stamps = sorted(sets)
+    stale_stamps = stamps[:-keep] if keep > 0 else stamps
+    stale = [name for stamp in stale_stamps for name in sets[stamp]]
+    stale += [n for n in names if n.startswith(BACKUP_PREFIX) and n.endswith('.partial')]
+    deleted = []
+    for name in stale:
+        path = os.path.join(backup_dir, name)
+        os.remove(path)
+        deleted.append(path)
+    return deleted
+
+def run_backup(config, verify=True, logger=None):
+    """
+    Backup, verify and rotate using the BACKUP_* settings in config.
+    ARCHIVE_DATABASE, when it exists, is copied right after the live database into the
+    same set. In that order a chunk archived in between is in both copies, never in
+    neither; re-running 'flask archive-years' on a restored set finishes the move.
+    A set with a copy that fails verification is deleted and never counts towards retention.
+    Returns:
+        tuple: (path of the live copy, ok, message)
+    """
+    started = time.perf_counter()
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    step_args = (config['BACKUP_PAGES_PER_STEP'], config['BACKUP_STEP_SLEEP_SECONDS'])
+    paths = [create_backup(config['DATABASE'], config['BACKUP_DIR'], *step_args, stamp=stamp)]
+    archive_database = config.get('ARCHIVE_DATABASE')
+    if archive_database and os.path.exists(archive_database):
+        try:
+            paths.append(create_backup(archive_database, config['BACKUP_DIR'], *step_args,
+                                       stamp=stamp, suffix=ARCHIVE_BACKUP_SUFFIX))
+        except Exception:
+            os.remove(paths[0])
+            raise
+    ok, message = True, 'not verified'
+    if verify:
+        for path in paths:
+            ok, message = verify_backup(path)
+            if not ok:
+                message = f"{os.path.basename(path)}: {message}"
+                break
+    if ok and len(paths) > 1:
+        message += ', with archive copy'
+    if not ok:
+        for path in paths:
+            os.remove(path)
+    else:
+        rotate_backups(config['BACKUP_DIR'], config['BACKUP_KEEP'])
+    if logger is not None:
+        log = logger.info if ok else logger.error
+        log(f"Backup {', '.join(paths)}: {message} ({time.perf_counter() - started:.1f} s)")
+    return paths[0], ok, message
+
+@click.command('backup-db')
+@click.option('--keep', type=int, default=None, help='Backups to keep (default: BACKUP_KEEP).')
+@click.option('--no-verify', is_flag=True, help='Skip the integrity check of the new copies.')
+@with_appcontext
+def backup_db_command(keep, no_verify):
+    """Copies the live (and archive) database to BACKUP_DIR without blocking the app, then verifies and rotates."""
+    config = dict(current_app.config)
+    if keep is not None:
+        config['BACKUP_KEEP'] = keep
+    path, ok, message = run_backup(config, verify=not no_verify)
+    if not ok:
+        raise click.ClickException(f"Backup failed verification ({message}); the backup set was removed.")
+    click.echo(f"Backup written to {path} ({message}).")
+
+
+def _scheduler_loop(app, stop_event):
+    interval = app.config['BACKUP_INTERVAL_HOURS'] * 3600
+    while not stop_event.wait(interval):
+        try:
+            run_backup(app.config, logger=app.logger)
+        except Exception as e:
+            app.logger.error(f"Scheduled backup failed: {e}", exc_info=True)
+
+def init_app(app):
+    """Starts the periodic backup thread when BACKUP_INTERVAL_HOURS is set."""
+    if not app.config.get('BACKUP_INTERVAL_HOURS'):
+        return
+    # Under the debug reloader only the child process (the one serving requests) schedules backups
+    if app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    stop_event = threading.Event()
+    thread = threading.Thread(target=_scheduler_loop, args=(app, stop_event), name='backup-scheduler', daemon=True)
+    thread.start()
+    app.extensions['backup_scheduler'] = {'thread': thread, 'stop': stop_event}
@@ -0,0 +1,107 @@
+# app/utils/cash_flow.py
+# Day-by-day cash flow and running balance for a date range. Opening balances come from
+# monthly_cash_flow (kept in step with transactions by triggers, see init_db.py) and
+# archive_monthly_summary, plus the days of the first month before the range, so a range
+# query reads only its own days and at most one partial month through
+# idx_transactions_date. The running balance is a window sum over the days.
+
+import datetime
+from flask import current_app
+from app.database import get_db
+from app.utils import archive, currency
+from app.utils.sql_fragments import CASH_FLOW_REBUILD_SQL # Shared with init_db.py
+
+def rebuild_cash_flow_rollup():
+    """
+    Recomputes monthly_cash_flow from the live transactions (e.g. after exchange rates change).
+    Returns:
+        int: Number of rollup rows written.
+    """
+    db = get_db()
+    try:
+        db.execute("DELETE FROM monthly_cash_flow")
+        cursor = db.execute(CASH_FLOW_REBUILD_SQL)
+        db.commit()
+        current_app.logger.info(f"Rebuilt monthly_cash_flow with {cursor.rowcount} rows.")
+        return cursor.rowcount
+    except Exception:
+        db.rollback()
+        raise
+
+def get_totals_before(year, month, db=None):
+    """
+    Income and expenses of every month before (year, month), live and archived.
+    Returns:
+        dict: {'income': x, 'expense': y} in the reporting currency.
+    """
+    db = db or get_db()
+    row = db.execute("""
+        SELECT COALESCE(SUM(income), 0.0) AS income, COALESCE(SUM(expense), 0.0) AS expense FROM (
+            SELECT income, expense FROM monthly_cash_flow WHERE (year, month) < (?, ?)
+            UNION ALL
+            SELECT CASE WHEN type = 'income' THEN amount ELSE 0 END, CASE WHEN type = 'expense' THEN amount ELSE 0 END
+            FROM archive_monthly_summary WHERE (year, month) < (?, ?)
+        )
+    """, (year, month, year, month)).fetchone()
+    return {'income': row['income'], 'expense': row['expense']}
+
+def get_all_time_totals(db=None):
+    """Income and expenses of every transaction, live and archived (see get_totals_before)."""
+    return get_totals_before(10000, 1, db)
+
+def get_opening_balance(start, db=None):
+    """All-time income minus expenses before the date start, in the reporting currency."""
+    db = db or get_db()
+    totals = get_totals_before(start.year, start.month, db)
+    balance = totals['income'] - totals['expense']
+    month_start = start.replace(day=1)
+    if month_start < start:
+        amount = currency.amount_sql('t')
+        row = db.execute(f"""
+            SELECT COALESCE(SUM(CASE WHEN t.type = 'income' THEN {amount} ELSE -{amount} END), 0.0)
+            FROM transactions t WHERE t.date >= ? AND t.date < ?
+        """, (month_start.isoformat(), start.isoformat())).fetchone()
+        balance += row[0]
+        archived = archive.get_archived_actuals(month_start, start, db)
+        if archived:
+            balance += archived['income'] - archived['expense']
+    return balance
+
+def get_daily_cash_flow(start, end, db=None):
+    """
+    Income, expenses and closing balance for every day in [start, end] (inclusive dates).
+    Returns:
+        dict: Columnar arrays 'dates', 'income', 'expense', 'net' and 'balance' (one entry
+              per day, days without transactions included), plus 'opening_balance'.
+    """
+    db = db or get_db()
+    opening_balance = get_opening_balance(start, db)
+    end_exclusive = (end + datetime.timedelta(days=1)).isoformat()
+    # Archived rows are read from the archive file only when the range reaches into an archived year
+    overlaps_archive = any(datetime.date(year, 1, 1) <= end for year in archive.get_archived_years(db))
+    source = archive.transactions_source(db) if overlaps_archive else 'transactions'
+    amount = currency.amount_sql('t')
+    rows = db.execute(f"""
+        WITH RECURSIVE days(day) AS (
+            SELECT ? UNION ALL SELECT date(day, '+1 day') FROM days WHERE day < ?
+        ),
+        flows AS (
+            SELECT t.date AS day,
+                   SUM(CASE WHEN t.type = 'income' THEN {amount} ELSE 0.0 END) AS income,
+                   SUM(CASE WHEN t.type = 'expense' THEN {amount} ELSE 0.0 END) AS expense
+            FROM {source} t WHERE t.date >= ? AND t.date < ?
+            GROUP BY t.date
+        )
+        SELECT days.day, COALESCE(f.income, 0.0) AS income, COALESCE(f.expense, 0.0) AS expense,
+               SUM(COALESCE(f.income, 0.0) - COALESCE(f.expense, 0.0)) OVER (ORDER BY days.day ROWS UNBOUNDED PRECEDING) AS running_net
+        FROM days LEFT JOIN flows f ON f.day = days.day
+        ORDER BY days.day
+    """, (start.isoformat(), end.isoformat(), start.isoformat(), end_exclusive)).fetchall()
+    return {
+        'opening_balance': opening_balance,
+        'dates': [row['day'] for row in rows],
+        'income': [row['income'] for row in rows],
+        'expense': [row['expense'] for row in rows],
+        'net': [row['income'] - row['expense'] for row in rows],
+        'balance': [opening_balance + row['running_net'] for row in rows],
+    }
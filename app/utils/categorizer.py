@@ -0,0 +1,309 @@
+# app/utils/categorizer.py
+# Rule-based auto-categorization. All active rules are compiled into one matcher
+# (an Aho-Corasick automaton over the description substrings plus a single regex
+# alternation), cached per process and rebuilt when categorization_rules changes.
+
+import re
+import threading
+from flask import current_app
+import click
+from flask.cli import with_appcontext
+from app.database import get_db
+from app.utils import analytics_cube, forecasting
+from app.utils.fragment_cache import get_table_versions
+
+try: # pyahocorasick is optional; the pure-Python automaton below is used without it
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_cache_lock = threading.Lock()
+
+RULE_COLUMNS = ('id', 'category_id', 'priority', 'description_contains', 'description_regex',
+                'min_amount', 'max_amount', 'type', 'is_active')
+
+
+class _SubstringAutomaton:
+    """
+    Aho-Corasick automaton over lowercase patterns. find(text) returns the payloads of
+    every pattern occurring in text in one pass, however many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        """patterns: {pattern: tuple of payloads}."""
+        self._automaton = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for pattern, payloads in patterns.items():
+                self._automaton.add_word(pattern, payloads)
+            if patterns:
+                self._automaton.make_automaton()
+            return
+
+        # Trie as one dict of transitions per state, then failure links breadth-first
+        self._goto = [{}]
+        self._out = [()]
+        for pattern, payloads in patterns.items():
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._out.append(())
+                state = next_state
+            self._out[state] += payloads
+        self._fail = [0] * len(self._goto)
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+                queue.append(next_state)
+
+    def find(self, text):
+        found = set()
+        if self._automaton is not None:
+            if len(self._automaton):
+                for _, payloads in self._automaton.iter(text):
+                    found.update(payloads)
+            return found
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+def _combinable(compiled):
+    """
+    True if a rule's regex can be wrapped in (?:...) and joined into the combined
+    alternation unchanged: no groups (so no renumbered backreferences or clashing group
+    names) and no inline global flags such as (?i), which must start the whole pattern.
+    """
+    return compiled.groups == 0 and not _GLOBAL_FLAGS.search(compiled.pattern)
+
+
+class RuleMatcher:
+    """
+    All active rules compiled for matching. Rules are ranked by (priority, id); the
+    lowest-ranked rule whose every condition holds wins.
+    Text conditions are resolved in bulk (automaton hits, then the combined regex as a
+    prefilter for the individual ones); only the resulting candidates check amount and type.
+    Regexes that cannot share the combined alternation (see _combinable) are matched one by
+    one, and a regex that does not compile disables only its own rule.
+    """
+
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda r: (r['priority'], r['id']))
+        patterns = {}
+        regex_ranks = []
+        self._always = [] # Rules without a text condition, or with a standalone regex, are candidates for every row
+        self._regexes = {}
+        for rank, rule in enumerate(self.rules):
+            if rule['description_regex']:
+                try:
+                    self._regexes[rank] = re.compile(rule['description_regex'], re.IGNORECASE)
+                except re.error as e:
+                    current_app.logger.warning(f"Skipping categorization rule {rule['id']}: invalid regex ({e}).")
+                    continue
+            if rule['description_contains']:
+                patterns.setdefault(rule['description_contains'].lower(), ())
+                patterns[rule['description_contains'].lower()] += (rank,)
+            elif rank in self._regexes and _combinable(self._regexes[rank]):
+                regex_ranks.append(rank)
+            else:
+                self._always.append(rank)
+        self._automaton = _SubstringAutomaton(patterns)
+        self._regex_only = regex_ranks
+        self._combined_regex = None
+        if regex_ranks:
+            try:
+                self._combined_regex = re.compile('|'.join(f"(?:{self.rules[rank]['description_regex']})" for rank in regex_ranks),
+                                                  re.IGNORECASE)
+            except re.error as e:
+                current_app.logger.warning(f"Categorization regexes could not be combined ({e}); matching them one by one.")
+                self._always = sorted(self._always + regex_ranks)
+                self._regex_only = []
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, description, amount, transaction_type):
+        """Returns the winning rule (a dict), or None if no rule matches."""
+        description = description or ''
+        candidates = self._automaton.find(description.lower()) if description else set()
+        if self._combined_regex is not None and self._combined_regex.search(description):
+            candidates.update(self._regex_only)
+        candidates.update(self._always)
+        for rank in sorted(candidates):
+            rule = self.rules[rank]
+            if rule['type'] is not None and rule['type'] != transaction_type:
+                continue
+            if rule['min_amount'] is not None and (amount is None or amount < rule['min_amount']):
+                continue
+            if rule['max_amount'] is not None and (amount is None or amount > rule['max_amount']):
+                continue
+            regex = self._regexes.get(rank)
+            if regex is not None and not regex.search(description):
+                continue
+            return rule
+        return None
+
+    def categorize(self, description, amount, transaction_type):
+        """Returns the category_id chosen by the rules, or None."""
+        rule = self.match(description, amount, transaction_type)
+        return rule['category_id'] if rule else None
+
+
+def validate_rule(rule):
+    """
+    Checks a rule dict before it is saved. Returns an error message, or None if valid.
+    """
+    if not rule.get('description_contains') and not rule.get('description_regex') \
+            and rule.get('min_amount') is None and rule.get('max_amount') is None and not rule.get('type'):
+        return 'A rule needs at least one condition (description, regex, amount range or type).'
+    if rule.get('description_regex'):
+        try:
+            re.compile(rule['description_regex'], re.IGNORECASE)
+        except re.error as e:
+            return f"Invalid regex: {e}"
+    if rule.get('type') not in (None, '', 'income', 'expense'):
+        return 'Type must be income, expense or empty.'
+    if rule.get('min_amount') is not None and rule.get('max_amount') is not None \
+            and rule['min_amount'] > rule['max_amount']:
+        return 'Minimum amount cannot be greater than maximum amount.'
+    return None
+
+def load_rules(db=None, include_inactive=False):
+    """Returns rule dicts in match order (priority, then id)."""
+    db = db or get_db()
+    where = "" if include_inactive else "WHERE is_active = 1"
+    rows = db.execute(f"SELECT {', '.join(RULE_COLUMNS)} FROM categorization_rules {where} ORDER BY priority, id").fetchall()
+    return [dict(row) for row in rows]
+
+def get_matcher():
+    """
+    Returns the compiled RuleMatcher for the current rules, rebuilding it only when
+    the categorization_rules version (see init_db.create_table_versions) has moved.
+    """
+    version = get_table_versions(('categorization_rules',)).get('categorization_rules')
+    state = current_app.extensions.setdefault('categorizer', {'version': None, 'matcher': None})
+    matcher = state['matcher']
+    if matcher is not None and state['version'] == version:
+        return matcher
+    with _cache_lock:
+        if state['matcher'] is None or state['version'] != version:
+            state['matcher'] = RuleMatcher(load_rules())
+            state['version'] = version
+        return state['matcher']
+
+def categorize(description, amount, transaction_type):
+    """Category for one transaction from the current rules, or None."""
+    return get_matcher().categorize(description, amount, transaction_type)
+
+def categorize_many(rows):
+    """
+    Categorizes an iterable of (description, amount, type) tuples with one matcher
+    lookup. Returns a list of category_ids (None where no rule matches).
+    """
+    categorize_row = get_matcher().categorize
+    return [categorize_row(description, amount, transaction_type) for description, amount, transaction_type in rows]
+
+# Rows the app itself keeps categorized, which bulk re-categorization must not move:
+# goal funding (goal_projections counts it only under its System category), paycheck net
+# pay, anything in a System category, and split parents (category of their largest line)
+MANAGED_TRANSACTION_FILTER = """
+    goal_id IS NULL
+    AND NOT EXISTS (SELECT 1 FROM paychecks pc WHERE pc.net_pay_transaction_id = transactions.id)
+    AND NOT EXISTS (SELECT 1 FROM transaction_splits s WHERE s.transaction_id = transactions.id)
+    AND (category_id IS NULL OR category_id NOT IN (
+        SELECT c.id FROM categories c JOIN categories sys ON sys.id = c.id OR sys.id = c.parent_id
+        WHERE sys.name = 'System' AND sys.parent_id IS NULL))
+"""
+
+def recategorize_transactions(only_uncategorized=False, start_date=None, end_date=None, dry_run=False, chunk_size=5000):
+    """
+    Re-applies the current rules to existing transactions (archived years are not touched).
+    Rows no rule matches keep their category, and app-managed rows (see
+    MANAGED_TRANSACTION_FILTER) are never changed. Pages through the table by id so each
+    chunk is read fully before its updates are written.
+    Args:
+        only_uncategorized (bool): Only fill in transactions with no category.
+        start_date, end_date (str): Optional inclusive 'YYYY-MM-DD' bounds.
+        dry_run (bool): Count the changes without writing them.
+        chunk_size (int): Rows read (and updates written) per batch.
+    Returns:
+        dict: {'scanned', 'matched', 'changed'}.
+    """
+    db = get_db()
+    matcher = get_matcher()
+    conditions, params = [MANAGED_TRANSACTION_FILTER], []
+    if only_uncategorized:
+        conditions.append("category_id IS NULL")
+    if start_date:
+        conditions.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("date <= ?")
+        params.append(end_date)
+    where = ''.join(f" AND {c}" for c in conditions)
+
+    stats = {'scanned': 0, 'matched': 0, 'changed': 0}
+    earliest_changed = None
+    last_id = 0
+    while True:
+        rows = db.execute(f"""
+            SELECT id, description, amount, type, category_id, date FROM transactions
+            WHERE id > ?{where} ORDER BY id LIMIT ?
+        """, [last_id] + params + [chunk_size]).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        updates = []
+        for row in rows:
+            category_id = matcher.categorize(row['description'], row['amount'], row['type'])
+            if category_id is None:
+                continue
+            stats['matched'] += 1
+            if category_id != row['category_id']:
+                updates.append((category_id, row['id']))
+                if earliest_changed is None or row['date'] < earliest_changed:
+                    earliest_changed = row['date']
+        stats['scanned'] += len(rows)
+        stats['changed'] += len(updates)
+        if updates and not dry_run:
+            db.executemany("UPDATE transactions SET category_id = ? WHERE id = ?", updates)
+            db.commit()
+
+    if stats['changed'] and not dry_run:
+        analytics_cube.invalidate_cube()
+        forecasting.record_transaction_change(earliest_changed)
+    return stats
+
+
+@click.command('recategorize')
+@click.option('--only-uncategorized', is_flag=True, help='Only fill in transactions without a category.')
+@click.option('--start', 'start_date', help='Earliest transaction date (YYYY-MM-DD).')
+@click.option('--end', 'end_date', help='Latest transaction date (YYYY-MM-DD).')
+@click.option('--dry-run', is_flag=True, help='Report how many rows would change without writing.')
+@with_appcontext
+def recategorize_command(only_uncategorized, start_date, end_date, dry_run):
+    """CLI command to re-apply categorization rules to existing transactions."""
+    matcher = get_matcher()
+    if not len(matcher):
+        raise click.ClickException('No active categorization rules.')
+    stats = recategorize_transactions(only_uncategorized, start_date, end_date, dry_run)
+    verb = 'Would change' if dry_run else 'Changed'
+    click.echo(f"Scanned {stats['scanned']} transaction(s), {stats['matched']} matched a rule. "
+               f"{verb} {stats['changed']} categor{'y' if stats['changed'] == 1 else 'ies'}.")
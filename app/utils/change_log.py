@@ -0,0 +1,163 @@
+# app/utils/change_log.py
+# Consumer API for the trigger-maintained change_log (change data capture) table.
+# Consumers remember the last seq they processed and ask for everything after it.
+
+import click
+from flask.cli import with_appcontext
+from app.database import get_db
+
+OPS = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+def get_latest_seq(db=None):
+    """Highest sequence number written so far (0 if the log has never been written)."""
+    db = db or get_db()
+    row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def get_truncated_through(db=None):
+    """Highest seq removed by compaction; consumers behind it must resync in full."""
+    db = db or get_db()
+    row = db.execute("SELECT value FROM change_log_meta WHERE key = 'truncated_through'").fetchone()
+    return row[0] if row else 0
+
+def get_changes(since_seq=0, tables=None, limit=1000, db=None):
+    """
+    Returns changes with seq > since_seq, oldest first.
+    Args:
+        since_seq (int): Last sequence number the consumer has processed.
+        tables (iterable, optional): Only return changes to these tables.
+        limit (int): Maximum changes per call; page with the returned next_seq.
+    Returns:
+        dict: 'changes' ([{'seq', 'table', 'row_id', 'op', 'changed_at'}]), 'next_seq' (pass as
+              since_seq next time), 'has_more', and 'resync_required' (True when changes after
+              since_seq were compacted away, so the consumer must reload its state).
+    Compaction keeps only the latest change per row, so consumers should treat 'insert' and
+    'update' alike as "re-read this row" and 'delete' as "drop this row".
+    """
+    db = db or get_db()
+    # Bound the read by the latest seq first, so a change committed in between is never skipped
+    latest_seq = get_latest_seq(db)
+    query = "SELECT seq, table_name, row_id, op, changed_at FROM change_log WHERE seq > ? AND seq <= ?"
+    params = [since_seq, latest_seq]
+    if tables:
+        tables = list(tables)
+        query += f" AND table_name IN ({','.join('?' for _ in tables)})"
+        params += tables
+    query += " ORDER BY seq LIMIT ?"
+    params.append(limit + 1)
+    rows = db.execute(query, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [{'seq': r['seq'], 'table': r['table_name'], 'row_id': r['row_id'],
+                'op': OPS[r['op']], 'changed_at': r['changed_at']} for r in rows]
+    if has_more:
+        next_seq = rows[-1]['seq']
+    else:
+        # Nothing further matches; skip ahead past changes to tables the consumer didn't ask for
+        next_seq = max(latest_seq, since_seq)
+    return {
+        'changes': changes,
+        'next_seq': next_seq,
+        'has_more': has_more,
+        'resync_required': since_seq < get_truncated_through(db)
+    }
+
+def compact_change_log(before_seq=None, older_than_days=None, db=None):
+    """
+    Compacts the change log in one transaction.
+      1. Collapses the history of each row to its latest change.
+      2. Drops changes with seq <= before_seq and/or older than older_than_days, recording
+         the highest dropped seq so lagging consumers are told to resync.
+    Returns:
+        dict: 'collapsed' and 'truncated' row counts and 'truncated_through'.
+    """
+    db = db or get_db()
+    if not db.in_transaction:
+        db.execute("BEGIN IMMEDIATE")
+    try:
+        collapsed = db.execute("""
+            DELETE FROM change_log WHERE seq NOT IN (
+                SELECT MAX(seq) FROM change_log GROUP BY table_name, row_id
+            )
+        """).rowcount
+
+        cutoff_seq = before_seq or 0
+        if older_than_days is not None:
+            row = db.execute("SELECT MAX(seq) FROM change_log WHERE changed_at < datetime('now', ?)",
+                             (f"-{int(older_than_days)} days",)).fetchone()
+            cutoff_seq = max(cutoff_seq, row[0] or 0)
+        truncated = 0
+        if cutoff_seq:
+            truncated = db.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff_seq,)).rowcount
+            db.execute("UPDATE change_log_meta SET value = MAX(value, ?) WHERE key = 'truncated_through'", (cutoff_seq,))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {'collapsed': collapsed, 'truncated': truncated, 'truncated_through': get_truncated_through(db)}
+
+@click.command('compact-change-log')
+@click.option('--before-seq', type=int, default=None, help='Also drop changes with seq <= this value.')
+@click.option('--older-than-days', type=int, default=None, help='Also drop changes older than this many days.')
+@with_appcontext
+def compact_change_log_command(before_seq, older_than_days):
+    """Collapses the change log to the latest change per row and optionally truncates old entries."""
+    result = compact_change_log(before_seq=before_seq, older_than_days=older_than_days)
+    click.echo(f"Collapsed {result['collapsed']} and truncated {result['truncated']} change log entries "
+               f"(truncated through seq {result['truncated_through']}).")
+
+# Tables clients can mirror through the delta sync API, with the columns they receive
+SYNC_TABLES = {
+    'transactions': 'id, amount, category_id, date, type, description, currency, goal_id',
+    'budget_goals': 'id, category_id, year, month, budgeted_amount, currency',
+    'categories': 'id, name, parent_id, financial_goal_type',
+    'goals': 'id, name, target_amount, current_amount, target_date, is_completed, created_at',
+    'transaction_splits': 'id, transaction_id, category_id, amount, description', # Category lines of split transactions
+}
+
+def _fetch_rows(db, table, ids):
+    """Current rows of `table` for the given ids, in chunks that stay under SQLite's variable limit."""
+    rows = []
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows += [dict(r) for r in db.execute(
+            f"SELECT {SYNC_TABLES[table]} FROM {table} WHERE id IN ({','.join('?' for _ in chunk)}) ORDER BY id", chunk
+        ).fetchall()]
+    return rows
+
+def get_sync_delta(cursor=None, tables=None, limit=1000, db=None):
+    """
+    Returns what a client mirroring `tables` must apply to catch up from `cursor`.
+    With no cursor, or one older than the compacted part of the log, returns a full
+    snapshot instead (full_resync=True: the client should replace its copy).
+    Returns:
+        dict: 'cursor' (pass back next time), 'has_more', 'full_resync' and
+              'changes' ({table: {'upserted': [row, ...], 'deleted': [id, ...]}}).
+    """
+    db = db or get_db()
+    tables = [t for t in (tables or SYNC_TABLES) if t in SYNC_TABLES]
+    if cursor is None or cursor < get_truncated_through(db):
+        # Take the cursor before the snapshot: changes racing with it are re-sent, never lost
+        latest_seq = get_latest_seq(db)
+        changes = {table: {'upserted': [dict(r) for r in db.execute(
+                               f"SELECT {SYNC_TABLES[table]} FROM {table} ORDER BY id").fetchall()],
+                           'deleted': []}
+                   for table in tables}
+        return {'cursor': latest_seq, 'has_more': False, 'full_resync': True, 'changes': changes}
+
+    log = get_changes(cursor, tables=tables, limit=limit, db=db)
+    latest_op = {} # (table, row_id) -> op of the newest change in this page
+    for change in log['changes']:
+        latest_op[(change['table'], change['row_id'])] = change['op']
+
+    changes = {}
+    for table in tables:
+        upsert_ids = {row_id for (t, row_id), op in latest_op.items() if t == table and op != 'delete'}
+        deleted = {row_id for (t, row_id), op in latest_op.items() if t == table and op == 'delete'}
+        upserted = _fetch_rows(db, table, upsert_ids) if upsert_ids else []
+        # Rows changed and then deleted after this page was bounded are gone now; report them as deleted
+        deleted |= upsert_ids - {row['id'] for row in upserted}
+        changes[table] = {'upserted': upserted, 'deleted': sorted(deleted)}
+    return {'cursor': log['next_seq'], 'has_more': log['has_more'], 'full_resync': False, 'changes': changes}
@@ -0,0 +1,87 @@
+# app/utils/chart_payloads.py
+# Compact columnar payload for the dashboard analytics charts and breakdown table,
+# shared by the initial page render and the /analytics/api/charts endpoint.
+
+import json
+import numpy as np
+
+try: # orjson is optional; the stdlib encoder is the fallback
+    import orjson
+except ImportError:
+    orjson = None
+
+PAYLOAD_VERSION = 1
+CHART_PRECISION = 2 # Decimal places kept for every amount
+
+# Shared label dictionaries; rows refer to them by index
+TYPE_LABELS = ['Main', 'Need', 'Want', 'Saving', None]
+NWS_LABELS = ['Needs', 'Wants', 'Savings/Investments', 'Unclassified']
+_TYPE_CODE = {label: i for i, label in enumerate(TYPE_LABELS)}
+
+def _fixed(values):
+    """Rounds a sequence of amounts to CHART_PRECISION as plain floats."""
+    return np.round(np.asarray(values, dtype=float), CHART_PRECISION).tolist()
+
+def build_chart_payload(summary):
+    """
+    Converts a get_financial_summary() result into the compact chart format:
+        v           payload format version
+        dict        shared label dictionaries ('type', 'nws')
+        labels      one label per row (chart bar / table row)
+        ids         drilldown main category ID per row, or null
+        types       index into dict.type per row
+        budgeted, actual, variance   amounts per row
+        projected   amounts per row, or null when the period is not in progress
+        carry       budget carried in per row (rollover categories), or null when none is
+        nws         {'budgeted': [...], 'actual': [...]} indexed like dict.nws
+        title, focus, focus_name, totals
+        currency    reporting currency code of every amount
+        period      {'label', 'start', 'end'} (dates inclusive, YYYY-MM-DD)
+    """
+    rows = summary['summary_table_data']
+    chart = summary['expected_vs_actual_chart']
+    has_projection = summary.get('period_projected_expenses') is not None
+    has_carry = summary.get('period_total_carry_forward') is not None
+    return {
+        'v': PAYLOAD_VERSION,
+        'dict': {'type': TYPE_LABELS, 'nws': NWS_LABELS},
+        'labels': chart['labels'],
+        'ids': chart['category_ids_for_drilldown'],
+        'types': [_TYPE_CODE.get(row['type'], len(TYPE_LABELS) - 1) for row in rows],
+        'budgeted': _fixed(chart['budgeted_data']),
+        'actual': _fixed(chart['actual_data']),
+        'variance': _fixed([row['variance'] for row in rows]),
+        'projected': _fixed(chart['projected_data']) if has_projection else None,
+        'carry': _fixed([row['carry_forward'] for row in rows]) if has_carry else None,
+        'nws': {
+            'budgeted': _fixed(summary['nws_budgeted_chart']['data']),
+            'actual': _fixed(summary['nws_actual_chart']['data'])
+        },
+        'title': summary['current_chart_title_suffix'],
+        'focus': summary['focused_main_category_id'],
+        'focus_name': summary['focused_main_category_name'],
+        'period': {'label': summary['period_label'], 'start': summary['period_start'], 'end': summary['period_end']},
+        'currency': summary.get('currency', 'USD'),
+        'totals': {
+            'expenses': round(summary.get('period_total_expenses', 0.0), CHART_PRECISION),
+            'income': round(summary.get('period_total_income', 0.0), CHART_PRECISION),
+            'budgeted': round(summary.get('period_total_budgeted', 0.0), CHART_PRECISION),
+            'projected': round(summary['period_projected_expenses'], CHART_PRECISION) if has_projection else None,
+            'carry': round(summary['period_total_carry_forward'], CHART_PRECISION) if has_carry else None
+        }
+    }
+
+def serialize_chart_payload(payload, html_safe=False):
+    """
+    Serializes a chart payload to compact JSON text.
+    Args:
+        html_safe (bool): Escape <, >, & and ' so the text can be embedded in a <script> block.
+    """
+    if orjson is not None:
+        text = orjson.dumps(payload).decode('utf-8')
+    else:
+        text = json.dumps(payload, separators=(',', ':'), check_circular=False, ensure_ascii=False)
+    if html_safe:
+        text = (text.replace('<', '\\u003c').replace('>', '\\u003e')
+                    .replace('&', '\\u0026').replace("'", '\\u0027'))
+    return text
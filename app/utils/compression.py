@@ -0,0 +1,91 @@
+# app/utils/compression.py
+# Content-negotiated gzip/brotli compression for HTML and JSON responses,
+# with compressed bytes cached by ETag.
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request
+
+try: # Brotli is optional; gzip is always available
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/css', 'text/javascript', 'application/javascript'}
+
+
+class CompressedBodyCache:
+    """Small thread-safe LRU of compressed bodies keyed by (etag, encoding)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def choose_encoding(accept_encodings):
+    """Picks 'br' or 'gzip' from the request's Accept-Encoding (honouring q=0), or None."""
+    if brotli is not None and accept_encodings['br'] > 0:
+        return 'br'
+    if accept_encodings['gzip'] > 0:
+        return 'gzip'
+    return None
+
+def compress_body(body, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+def init_app(app):
+    """Registers the compression after_request hook with the Flask app (settings: COMPRESS_* config)."""
+    body_cache = CompressedBodyCache(app.config['COMPRESS_CACHE_ENTRIES'])
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if (not config['COMPRESS_ENABLED']
+                or response.status_code != 200
+                or response.direct_passthrough # Streamed/static files
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        body = response.get_data()
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings) if len(body) >= config['COMPRESS_MIN_SIZE'] else None
+
+        # ETag identifies the uncompressed content; each encoding is its own representation
+        base_etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        etag = f"{base_etag}-{encoding}" if encoding else base_etag
+        response.set_etag(etag)
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            response.set_data(b'')
+            response.headers.pop('Content-Length', None)
+            return response
+        if encoding is None:
+            return response
+
+        compressed = body_cache.get((base_etag, encoding))
+        if compressed is None:
+            compressed = compress_body(body, encoding, config)
+            body_cache.put((base_etag, encoding), compressed)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
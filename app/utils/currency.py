@@ -0,0 +1,149 @@
+# app/utils/currency.py
+# Multi-currency support. Transactions and budgets carry an optional ISO 4217 currency
+# code; NULL means the reporting currency (REPORTING_CURRENCY), so existing rows need no
+# rewrite and the common case needs no rate lookup. Exchange rates live in the local
+# fx_rates table, loaded from CSV files ('flask load-fx-rates'); nothing is fetched
+# over the network. Summaries convert inside SQL with amount_sql(), never row by row in Python.
+
+import csv
+import datetime
+import re
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app.database import get_db
+# SQL conversion builders (shared with init_db.py); callers use them as currency.amount_sql etc.
+from app.utils.sql_fragments import rate_lookup_sql, convert_sql, amount_sql, budget_amount_sql
+
+_CODE = re.compile(r'^[A-Z]{3}$')
+
+# Display prefixes for common codes; others are shown as 'CODE '
+CURRENCY_SYMBOLS = {'USD': '$', 'EUR': '€', 'GBP': '£', 'JPY': '¥', 'CAD': 'CA$', 'AUD': 'A$', 'CHF': 'CHF ', 'INR': '₹'}
+
+def get_reporting_currency():
+    return current_app.config.get('REPORTING_CURRENCY', 'USD')
+
+def is_valid_currency(code):
+    """True for an empty value (the reporting currency) or a three-letter code."""
+    code = (code or '').strip().upper()
+    return not code or bool(_CODE.match(code))
+
+def normalize_currency(code):
+    """
+    Validates a currency code for storage. Returns None for empty input or the reporting
+    currency (stored as NULL), else the upper-cased code.
+    Raises:
+        ValueError: If code is not a three-letter code.
+    """
+    code = (code or '').strip().upper()
+    if not code or code == get_reporting_currency():
+        return None
+    if not _CODE.match(code):
+        raise ValueError(f"Invalid currency code '{code}'. Use a three-letter ISO code such as EUR.")
+    return code
+
+def convert_amount(amount, currency, date, db=None):
+    """Converts one amount (e.g. a just-written row, for incremental cache updates)."""
+    if currency is None or amount is None:
+        return amount
+    db = db or get_db()
+    return amount * db.execute(f"SELECT {rate_lookup_sql('?', '?')}", (currency, date, currency)).fetchone()[0]
+
+def get_currencies_without_rates(db=None):
+    """Currency codes used by transactions or budgets that have no rate at all (counted at rate 1)."""
+    db = db or get_db()
+    rows = db.execute("""
+        SELECT currency FROM (SELECT DISTINCT currency FROM transactions WHERE currency IS NOT NULL
+                              UNION SELECT DISTINCT currency FROM budget_goals WHERE currency IS NOT NULL)
+        WHERE currency NOT IN (SELECT DISTINCT currency FROM fx_rates)
+        ORDER BY currency
+    """).fetchall()
+    return [row[0] for row in rows]
+
+def format_money(value, currency=None):
+    """Jinja filter: '$1234.50', '€12.00', 'SEK 99.00' (currency defaults to the reporting currency)."""
+    code = currency or get_reporting_currency()
+    symbol = CURRENCY_SYMBOLS.get(code, f"{code} ")
+    amount = value or 0.0
+    return f"{'-' if amount < 0 else ''}{symbol}{abs(amount):.2f}"
+
+
+# --- Loading rates ---
+
+def load_fx_rates(rows, db=None):
+    """
+    Upserts exchange rates. Each row is a dict with date (YYYY-MM-DD), currency and rate,
+    where rate is units of the reporting currency per unit of currency. An optional base
+    column names the currency the rate is quoted in; rows quoted the other way round
+    (currency = reporting currency) are inverted, other bases are rejected.
+    Returns:
+        dict: {'loaded', 'errors': [(row_number, message)]}.
+    """
+    db = db or get_db()
+    reporting = get_reporting_currency()
+    records, errors = [], []
+    for number, row in enumerate(rows, start=1):
+        try:
+            rate_date = (row.get('date') or '').strip()
+            datetime.date.fromisoformat(rate_date)
+            currency = (row.get('currency') or '').strip().upper()
+            base = (row.get('base') or reporting).strip().upper()
+            rate = float(row.get('rate') or '')
+        except ValueError:
+            errors.append((number, 'Invalid date (YYYY-MM-DD) or rate.'))
+            continue
+        if base != reporting and currency == reporting:
+            currency, base, rate = base, reporting, (1 / rate if rate else rate)
+        if not _CODE.match(currency) or currency == reporting:
+            errors.append((number, f"Invalid currency '{currency}'."))
+        elif base != reporting:
+            errors.append((number, f"Rate quoted in {base}; rates must be quoted in the reporting currency {reporting}."))
+        elif rate <= 0:
+            errors.append((number, 'Rate must be positive.'))
+        else:
+            records.append((currency, rate_date, rate))
+    if records:
+        try:
+            db.executemany("""
+                INSERT INTO fx_rates (currency, rate_date, rate) VALUES (?, ?, ?)
+                ON CONFLICT (currency, rate_date) DO UPDATE SET rate = excluded.rate, loaded_at = CURRENT_TIMESTAMP
+            """, records)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    return {'loaded': len(records), 'errors': errors}
+
+def refresh_converted_totals():
+    """
+    Re-derives everything that stores converted amounts after rates change: the NWS and
+    cash flow rollups (maintained by triggers at write time) and the in-memory cube and
+    forecast profiles.
+    Archived monthly summaries keep the rates in effect when their year was archived.
+    """
+    from app.utils import analytics_cube, cash_flow, db_helpers, forecasting
+    db_helpers.rebuild_nws_rollup()
+    cash_flow.rebuild_cash_flow_rollup()
+    analytics_cube.invalidate_cube()
+    forecasting.record_transaction_change(None)
+
+@click.command('load-fx-rates')
+@click.argument('csv_files', nargs=-1, required=True, type=click.File('r', encoding='utf-8-sig'))
+@with_appcontext
+def load_fx_rates_command(csv_files):
+    """CLI command to load exchange rates from CSV files (date, currency, rate[, base])."""
+    loaded = 0
+    for csv_file in csv_files:
+        reader = csv.DictReader(csv_file)
+        if not reader.fieldnames or not {'date', 'currency', 'rate'} <= {name.strip().lower() for name in reader.fieldnames}:
+            raise click.ClickException(f"{csv_file.name}: expected a header row with date, currency and rate columns.")
+        result = load_fx_rates([{(key or '').strip().lower(): value for key, value in row.items()} for row in reader])
+        for number, message in result['errors']:
+            click.echo(f"{csv_file.name} row {number}: {message}", err=True)
+        loaded += result['loaded']
+    if loaded:
+        refresh_converted_totals()
+    click.echo(f"Loaded {loaded} exchange rate(s) quoted in {get_reporting_currency()}.")
+    missing = get_currencies_without_rates()
+    if missing:
+        click.echo(f"No rates yet for: {', '.join(missing)} (amounts in these currencies are counted at rate 1).", err=True)
@@ -3,9 +3,21 @@
 
 from flask import current_app # For logging
 from app.database import get_db # Import get_db from the database module
+from app.utils import analytics_cube # Kept in step with committed writes
+from app.utils import forecasting
+from app.utils import goal_projections
+from app.utils import helpers
+from app.utils import archive
+from app.utils import duplicates
+from app.utils import currency
+from app.utils import splits
+from app.utils import rollover
+from app.utils.sql_fragments import NWS_ROLLUP_REBUILD_SQL # Shared with init_db.py
+from app.utils.single_flight import coalesced # Concurrent identical loads share one execution
 import sqlite3 # For specific error handling like IntegrityError
 import datetime # For date validation if needed
 
+@coalesced(tables=('categories',))
 def get_categories_for_management():
     """
     Retrieves all main categories and their subcategories for management UI.
@@ -31,6 +43,7 @@ def get_categories_for_management():
         })
     return managed_categories
 
+@coalesced(tables=('categories',))
 def get_hierarchical_categories_for_js():
     """
     Retrieves categories in a hierarchical structure suitable for JavaScript dropdowns.
@@ -56,63 +69,151 @@ def get_hierarchical_categories_for_js():
         sub_categories_map[str(mc["id"])] = sub_list # Use string ID as key for JS
     return {"main_categories": main_categories_list, "sub_categories_map": sub_categories_map}
 
-def get_financial_summary(year, month=None, period_type='monthly', focused_main_category_id=None):
+# Position of each financial_goal_type in the NWS chart data arrays
+NWS_GOAL_TYPE_INDEX = {'Need': 0, 'Want': 1, 'Saving': 2, 'Unclassified': 3}
+
+def get_period_range(period_type, year, month=None, quarter=None, start_date=None, end_date=None, pay_date=None):
+    """
+    Resolves an analytics period to a half-open date range and a display label.
+    Args:
+        period_type (str): One of helpers.PERIOD_TYPES.
+        year, month, quarter: For the calendar periods (see helpers.get_calendar_period_range);
+            year is the fiscal year for 'fiscal_year' (start month: FISCAL_YEAR_START_MONTH).
+        start_date, end_date (date): Inclusive bounds for 'custom'.
+        pay_date (date): For 'pay_period', any date in the wanted pay period (default: today).
+            A pay period runs from one paycheck's pay_date up to the next one's.
+    Returns:
+        tuple: (start_date, end_date, label) with end_date exclusive.
+    Raises:
+        ValueError: If the period can't be resolved from the given arguments.
+    """
+    today = datetime.date.today()
+    if period_type == 'custom':
+        if start_date is None or end_date is None:
+            raise ValueError("A custom period needs both a start and an end date.")
+        if end_date < start_date:
+            raise ValueError("The end date of a custom period can't be before its start date.")
+        if end_date >= datetime.date.max: # Its exclusive end would not be a valid date
+            raise ValueError(f"The end date of a custom period must be before {datetime.date.max.isoformat()}.")
+        return start_date, end_date + datetime.timedelta(days=1), f"{_format_day(start_date)} – {_format_day(end_date)}"
+
+    if period_type == 'pay_period':
+        return _get_pay_period_range(pay_date or today)
+
+    fiscal_start_month = current_app.config.get('FISCAL_YEAR_START_MONTH', 1)
+    if period_type == 'quarterly' and quarter is None:
+        quarter = (today.month - 1) // 3 + 1 if year == today.year else 1
+    start, end = helpers.get_calendar_period_range(period_type, year, month, quarter, fiscal_start_month)
+    last_day = end - datetime.timedelta(days=1)
+    if period_type == 'monthly':
+        label = f"{helpers.format_month_name(month)} {year}"
+    elif period_type == 'yearly':
+        label = str(year)
+    elif period_type == 'quarterly':
+        label = f"Q{quarter} {year}"
+    elif fiscal_start_month == 1:
+        label = f"FY{year}"
+    else:
+        label = f"FY{year} ({start:%b} {start.year} – {last_day:%b} {last_day.year})"
+    return start, end, label
+
+def _format_day(day):
+    return f"{day:%b} {day.day}, {day.year}"
+
+def _get_pay_period_range(day):
+    """The pay period containing `day`, bounded by consecutive paychecks.pay_date values."""
+    db = get_db()
+    day_str = day.isoformat()
+    current = db.execute("SELECT MAX(pay_date) FROM paychecks WHERE pay_date <= ?", (day_str,)).fetchone()[0]
+    if current is None:
+        # Before the first paycheck: use the first pay period instead
+        current = db.execute("SELECT MIN(pay_date) FROM paychecks").fetchone()[0]
+        if current is None:
+            raise ValueError("No paychecks have been logged yet, so there are no pay periods.")
+    start = datetime.date.fromisoformat(current[:10])
+    following = db.execute("SELECT MIN(pay_date) FROM paychecks WHERE pay_date > ?", (current,)).fetchone()[0]
+    if following is not None:
+        end = datetime.date.fromisoformat(following[:10])
+    else:
+        # Latest paycheck: assume the next one comes after the same interval as the last one
+        previous = db.execute("SELECT MAX(pay_date) FROM paychecks WHERE pay_date < ?", (current,)).fetchone()[0]
+        interval = (start - datetime.date.fromisoformat(previous[:10])).days if previous else 14
+        if (datetime.date.max - start).days < interval:
+            raise ValueError("The pay period would end after the last supported date.")
+        end = start + datetime.timedelta(days=interval)
+    return start, end, f"Pay period {_format_day(start)} – {_format_day(end - datetime.timedelta(days=1))}"
+
+def get_prorated_budgets(start, end):
+    """
+    Budgeted amounts per category for the half-open range [start, end).
+    Budgets are monthly; a partially covered month contributes in proportion to the
+    days of it inside the range.
+    Returns:
+        dict: category_id -> budgeted amount.
+    """
+    db = get_db()
+    weights = {} # (year, month) -> fraction of the month inside the range
+    year, month = start.year, start.month
+    while datetime.date(year, month, 1) < end:
+        month_start = datetime.date(year, month, 1)
+        next_year, next_month = helpers.add_months(year, month, 1)
+        month_end = datetime.date(next_year, next_month, 1)
+        weights[(year, month)] = (min(end, month_end) - max(start, month_start)).days / (month_end - month_start).days
+        year, month = next_year, next_month
+
+    last_year, last_month = max(weights)
+    rows = db.execute(f"""
+        SELECT b.category_id, b.year, b.month, {currency.budget_amount_sql('b')} AS budgeted_amount FROM budget_goals b
+        WHERE (b.year, b.month) >= (?, ?) AND (b.year, b.month) <= (?, ?)
+    """, (start.year, start.month, last_year, last_month)).fetchall()
+    budgets = {}
+    for row in rows:
+        budgets[row['category_id']] = budgets.get(row['category_id'], 0.0) + row['budgeted_amount'] * weights[(row['year'], row['month'])]
+    return budgets
+
+@coalesced(tables=('transactions', 'transaction_splits', 'categories', 'budget_goals', 'paychecks', 'fx_rates'))
+def get_financial_summary(year, month=None, period_type='monthly', focused_main_category_id=None,
+                          quarter=None, start_date=None, end_date=None, pay_date=None):
     """
     Calculates financial summary including budgeted vs. actual amounts for categories.
+    All amounts are in the reporting currency (converted in SQL, see app.utils.currency);
+    split transactions count towards each of their lines' categories. In the monthly view,
+    rollover categories add the budget carried in from earlier months (see app.utils.rollover)
+    to what is available, and their variance is measured against it.
     Args:
         year (int): The year for the summary.
         month (int, optional): The month for the summary (1-12). Required if period_type is 'monthly'.
-        period_type (str): 'monthly' or 'yearly'.
+        period_type (str): One of helpers.PERIOD_TYPES; see get_period_range for the
+            quarter, start_date, end_date and pay_date arguments of the other periods.
         focused_main_category_id (int, optional): If provided, summary focuses on this main category and its subs.
     Returns:
-        dict: Contains summary table data, chart data, and period totals.
+        dict: Contains summary table data, chart data, period totals and the resolved period.
+    Raises:
+        ValueError: If the period can't be resolved (see get_period_range).
     """
     db = get_db()
-    
-    # Base conditions for SQL queries
-    actuals_subquery_conditions_expense = "strftime('%Y', date) = ? AND type = 'expense'"
-    actuals_subquery_conditions_income = "strftime('%Y', date) = ? AND type = 'income'"
-    budget_subquery_conditions = "year = ?"
-    
-    query_params_actuals_expense = [str(year)]
-    query_params_actuals_income = [str(year)]
-    query_params_budget = [year]
-
-    if period_type == 'monthly':
-        if month is None:
-            current_app.logger.error("Month is None for monthly period_type in get_financial_summary. This should be handled by the caller.")
-            # Defaulting or raising an error might be options, but caller should ensure month is provided.
-            # For now, proceed assuming month will be valid if period_type is 'monthly'.
-            # If this path is reached with month=None, queries might fail or return unexpected results.
-            # Consider raising ValueError("Month must be provided for monthly summary.")
-            pass # Assuming month will be valid based on route logic
-
-        actuals_subquery_conditions_expense += " AND strftime('%m', date) = ?"
-        actuals_subquery_conditions_income += " AND strftime('%m', date) = ?"
-        budget_subquery_conditions += " AND month = ?"
-        
-        query_params_actuals_expense.append(f"{month:02d}") # Format month to two digits
-        query_params_actuals_income.append(f"{month:02d}")
-        query_params_budget.append(month)
+    period_start, period_end, period_label = get_period_range(
+        period_type, year, month, quarter=quarter, start_date=start_date, end_date=end_date, pay_date=pay_date
+    )
+    # Half-open date range: lets SQLite search idx_transactions_date instead of scanning
+    range_params = [period_start.isoformat(), period_end.isoformat()]
 
     # Calculate period totals
-    period_total_expenses_row = db.execute(
-        f"SELECT SUM(amount) FROM transactions WHERE {actuals_subquery_conditions_expense}", 
-        query_params_actuals_expense
-    ).fetchone()
-    period_total_expenses = period_total_expenses_row[0] if period_total_expenses_row and period_total_expenses_row[0] is not None else 0.0
-
-    period_total_income_row = db.execute(
-        f"SELECT SUM(amount) FROM transactions WHERE {actuals_subquery_conditions_income}",
-        query_params_actuals_income
-    ).fetchone()
-    period_total_income = period_total_income_row[0] if period_total_income_row and period_total_income_row[0] is not None else 0.0
-
-    period_total_budgeted_row = db.execute(
-        f"SELECT SUM(budgeted_amount) FROM budget_goals WHERE {budget_subquery_conditions}",
-        query_params_budget
-    ).fetchone()
-    period_total_budgeted = period_total_budgeted_row[0] if period_total_budgeted_row and period_total_budgeted_row[0] is not None else 0.0
+    amount = currency.amount_sql('t')
+    totals_row = db.execute(f"""
+        SELECT SUM(CASE WHEN t.type = 'expense' THEN {amount} END), SUM(CASE WHEN t.type = 'income' THEN {amount} END)
+        FROM transactions t WHERE t.date >= ? AND t.date < ?
+    """, range_params).fetchone()
+    period_total_expenses = totals_row[0] if totals_row[0] is not None else 0.0
+    period_total_income = totals_row[1] if totals_row[1] is not None else 0.0
+    # Ranges reaching into archived years add the archived amounts
+    archived = archive.get_archived_actuals(period_start, period_end, db)
+    if archived:
+        period_total_expenses += archived['expense']
+        period_total_income += archived['income']
+
+    budgets = get_prorated_budgets(period_start, period_end)
+    period_total_budgeted = sum(budgets.values())
 
     # Query for detailed category data
     category_details_query = f"""
@@ -122,32 +223,42 @@ def get_financial_summary(year, month=None, period_type='monthly', focused_main_
             c.parent_id,
             p.name as parent_category_name, 
             c.financial_goal_type,
-            COALESCE(b.total_budgeted_amount, 0) as budgeted_amount,
             COALESCE(a.total_actual_amount, 0) as actual_amount
         FROM categories c
         LEFT JOIN categories p ON c.parent_id = p.id
         LEFT JOIN (
-            SELECT category_id, SUM(amount) as total_actual_amount 
-            FROM transactions
-            WHERE {actuals_subquery_conditions_expense} 
-            GROUP BY category_id
+            SELECT l.category_id, SUM({currency.amount_sql('l')}) as total_actual_amount 
+            FROM ({splits.transaction_lines_sql()}) l
+            WHERE l.date >= ? AND l.date < ? AND l.type = 'expense'
+            GROUP BY l.category_id
         ) a ON c.id = a.category_id
-        LEFT JOIN (
-            SELECT category_id, SUM(budgeted_amount) as total_budgeted_amount 
-            FROM budget_goals 
-            WHERE {budget_subquery_conditions}
-            GROUP BY category_id
-        ) b ON c.id = b.category_id
         ORDER BY COALESCE(p.name, c.name), c.name; 
     """
+    current_app.logger.debug(f"Financial Summary Query Params - Details Query: {range_params}")
+    all_category_data = [dict(row, budgeted_amount=budgets.get(row['category_id'], 0.0))
+                         for row in db.execute(category_details_query, range_params).fetchall()]
+    if archived:
+        for cat_data in all_category_data:
+            cat_data['actual_amount'] += archived['expense_by_category'].get(cat_data['category_id'], 0.0)
+    carried = rollover.get_carry_forward(year, month, db) if period_type == 'monthly' else {}
+    for cat_data in all_category_data:
+        cat_data['carry_forward'] = carried.get(cat_data['category_id'], 0.0)
     
-    combined_query_params_for_details = query_params_actuals_expense + query_params_budget
-    current_app.logger.debug(f"Financial Summary Query Params - Details Query: {combined_query_params_for_details}")
-    all_category_data = db.execute(category_details_query, combined_query_params_for_details).fetchall()
-    
+    # Projected actuals are only meaningful while the viewed period is still in progress
+    today = datetime.date.today()
+    projection_key = None
+    if period_type == 'monthly' and (year, month) == (today.year, today.month):
+        projection_key = 'projected_month_end'
+    elif period_type == 'yearly' and year == today.year:
+        projection_key = 'projected_year_end'
+    forecasts = forecasting.get_category_forecasts(today) if projection_key else {}
+
+    def projected_for(cat_data):
+        forecast = forecasts.get(cat_data['category_id'])
+        return forecast[projection_key] if forecast else cat_data['actual_amount']
+
     # Initialize structures for summary and chart data
     summary_table_data = []
-    expected_vs_actual_chart = {'labels': [], 'budgeted_data': [], 'actual_data': [], 'category_ids_for_drilldown': []}
     nws_actual_chart = {'labels': ['Needs', 'Wants', 'Savings/Investments', 'Unclassified'], 'data': [0.0, 0.0, 0.0, 0.0]}
     nws_budgeted_chart = {'labels': ['Needs', 'Wants', 'Savings/Investments', 'Unclassified'], 'data': [0.0, 0.0, 0.0, 0.0]}
     
@@ -167,7 +278,7 @@ def get_financial_summary(year, month=None, period_type='monthly', focused_main_
             is_sub_of_focused = cat_data['parent_id'] == focused_main_category_id
 
             if is_focused_main or is_sub_of_focused:
-                if cat_data['budgeted_amount'] > 0 or cat_data['actual_amount'] > 0: # Only include if there's data
+                if cat_data['budgeted_amount'] > 0 or cat_data['actual_amount'] > 0 or cat_data['carry_forward']: # Only include if there's data
                     full_name = cat_data['category_name']
                     # If it's the main category itself and it has subcategories, label it as "(Direct)" expenses/budget
                     if is_focused_main and not is_sub_of_focused: 
@@ -175,20 +286,19 @@ def get_financial_summary(year, month=None, period_type='monthly', focused_main_
                         if has_subs_check: 
                              full_name = f"{cat_data['category_name']} (Direct)" 
                         
+                    projected = projected_for(cat_data) if projection_key else None
                     summary_table_data.append({
                         "name": full_name, "type": cat_data['financial_goal_type'], 
                         "budgeted": cat_data['budgeted_amount'], "actual": cat_data['actual_amount'], 
-                        "variance": cat_data['budgeted_amount'] - cat_data['actual_amount']
+                        "carry_forward": cat_data['carry_forward'],
+                        "variance": cat_data['budgeted_amount'] + cat_data['carry_forward'] - cat_data['actual_amount'],
+                        "projected": projected,
+                        "drilldown_id": None # No further drilldown from subcategory view
                     })
-                    expected_vs_actual_chart['labels'].append(full_name)
-                    expected_vs_actual_chart['budgeted_data'].append(cat_data['budgeted_amount'])
-                    expected_vs_actual_chart['actual_data'].append(cat_data['actual_amount'])
-                    # No further drilldown from subcategory view in this chart
-                    expected_vs_actual_chart['category_ids_for_drilldown'].append(None) 
                     
                     # Aggregate for NWS charts based on financial_goal_type
                     goal_type = cat_data['financial_goal_type']
-                    idx = {'Need': 0, 'Want': 1, 'Saving': 2}.get(goal_type, 3) # 3 for 'Unclassified'
+                    idx = NWS_GOAL_TYPE_INDEX.get(goal_type, 3) # 3 for 'Unclassified'
                     nws_actual_chart['data'][idx] += cat_data['actual_amount']
                     nws_budgeted_chart['data'][idx] += cat_data['budgeted_amount']
     else: # Main categories overview
@@ -211,42 +321,52 @@ def get_financial_summary(year, month=None, period_type='monthly', focused_main_
                      main_cat_name_for_summary = main_cat_name_row['name'] if main_cat_name_row else "Unknown Main Category"
 
                 main_category_summary[main_id_to_aggregate] = {
-                    'name': main_cat_name_for_summary, 'budgeted': 0.0, 'actual': 0.0, 
-                    'id': main_id_to_aggregate, 
-                    'nws_budgeted': [0.0,0.0,0.0,0.0], # Needs, Wants, Savings, Unclassified
-                    'nws_actual': [0.0,0.0,0.0,0.0]
+                    'name': main_cat_name_for_summary, 'budgeted': 0.0, 'actual': 0.0, 'projected': 0.0, 'carry_forward': 0.0,
+                    'id': main_id_to_aggregate
                 }
             
-            # Aggregate budgeted and actual amounts
+            # Aggregate budgeted, actual and projected amounts
             main_category_summary[main_id_to_aggregate]['budgeted'] += cat_data['budgeted_amount']
             main_category_summary[main_id_to_aggregate]['actual'] += cat_data['actual_amount']
-            
-            # Aggregate for NWS charts based on financial_goal_type of the specific category (main or sub)
-            goal_type = cat_data['financial_goal_type']
-            idx = {'Need': 0, 'Want': 1, 'Saving': 2}.get(goal_type, 3)
-            main_category_summary[main_id_to_aggregate]['nws_actual'][idx] += cat_data['actual_amount']
-            main_category_summary[main_id_to_aggregate]['nws_budgeted'][idx] += cat_data['budgeted_amount']
+            main_category_summary[main_id_to_aggregate]['carry_forward'] += cat_data['carry_forward']
+            if projection_key:
+                main_category_summary[main_id_to_aggregate]['projected'] += projected_for(cat_data)
 
         # Prepare data for charts and table from aggregated main category summaries
         sorted_main_cat_ids = sorted(main_category_summary.keys(), key=lambda x: main_category_summary[x]['name'])
         for main_id in sorted_main_cat_ids:
             summary = main_category_summary[main_id]
-            if summary['budgeted'] > 0 or summary['actual'] > 0: # Only include if there's data
+            if summary['budgeted'] > 0 or summary['actual'] > 0 or summary['carry_forward']: # Only include if there's data
                 summary_table_data.append({
                     "name": summary['name'], "type": "Main", # Type for display in table
                     "budgeted": summary['budgeted'], "actual": summary['actual'], 
-                    "variance": summary['budgeted'] - summary['actual']
+                    "carry_forward": summary['carry_forward'],
+                    "variance": summary['budgeted'] + summary['carry_forward'] - summary['actual'],
+                    "projected": summary['projected'] if projection_key else None,
+                    "drilldown_id": summary['id'] # Allow drilldown for main categories
                 })
-                expected_vs_actual_chart['labels'].append(summary['name'])
-                expected_vs_actual_chart['budgeted_data'].append(summary['budgeted'])
-                expected_vs_actual_chart['actual_data'].append(summary['actual'])
-                # Allow drilldown for main categories in this chart
-                expected_vs_actual_chart['category_ids_for_drilldown'].append(summary['id']) 
-                
-                # Sum up NWS data from each main category's aggregated NWS values
-                for i in range(4): # 0:Needs, 1:Wants, 2:Savings, 3:Unclassified
-                    nws_budgeted_chart['data'][i] += summary['nws_budgeted'][i]
-                    nws_actual_chart['data'][i] += summary['nws_actual'][i]
+
+        if period_start.day == 1 and period_end.day == 1:
+            # Whole months: NWS charts come straight from the precomputed monthly rollup
+            last_month = helpers.add_months(period_end.year, period_end.month, -1)
+            for row in get_nws_rollup((period_start.year, period_start.month), last_month, group_by_month=False):
+                idx = NWS_GOAL_TYPE_INDEX.get(row['goal_type'], 3)
+                nws_actual_chart['data'][idx] += row['actual_amount']
+                nws_budgeted_chart['data'][idx] += row['budgeted_amount']
+        else:
+            for cat_data in all_category_data:
+                idx = NWS_GOAL_TYPE_INDEX.get(cat_data['financial_goal_type'], 3)
+                nws_actual_chart['data'][idx] += cat_data['actual_amount']
+                nws_budgeted_chart['data'][idx] += cat_data['budgeted_amount']
+
+    # Chart columns are the table rows, transposed
+    expected_vs_actual_chart = {
+        'labels': [row['name'] for row in summary_table_data],
+        'budgeted_data': [row['budgeted'] for row in summary_table_data],
+        'actual_data': [row['actual'] for row in summary_table_data],
+        'projected_data': [row['projected'] for row in summary_table_data] if projection_key else [],
+        'category_ids_for_drilldown': [row['drilldown_id'] for row in summary_table_data]
+    }
                     
     return {
         "summary_table_data": summary_table_data, 
@@ -258,9 +378,19 @@ def get_financial_summary(year, month=None, period_type='monthly', focused_main_
         "focused_main_category_name": focused_main_category_name,
         "period_total_expenses": period_total_expenses,
         "period_total_income": period_total_income,
-        "period_total_budgeted": period_total_budgeted
+        "period_total_budgeted": period_total_budgeted,
+        # Budget carried into the month by rollover categories (None unless a monthly view has any)
+        "period_total_carry_forward": sum(carried.values()) if carried else None,
+        "period_type": period_type,
+        "period_label": period_label,
+        "period_start": period_start.isoformat(),
+        "period_end": (period_end - datetime.timedelta(days=1)).isoformat(), # Inclusive
+        "currency": currency.get_reporting_currency(), # Every amount above is in this currency
+        # Projected period expenses (None unless the period is still in progress)
+        "period_projected_expenses": sum(projected_for(cat_data) for cat_data in all_category_data) if projection_key else None
     }
 
+@coalesced(tables=('categories', 'budget_goals'))
 def get_budget_goals_for_planning_ui(year, month):
     """
     Retrieves budget goals for a specific year and month, structured for UI planning.
@@ -427,7 +557,8 @@ def get_all_goals() -> list:
     Retrieves all financial goals from the database.
     Returns:
         list: A list of dictionaries, where each dictionary represents a goal,
-              including a calculated 'progress' percentage.
+              including a calculated 'progress' percentage and projection fields
+              (see goal_projections.add_goal_projections).
     """
     db = get_db()
     rows = db.execute(
@@ -441,7 +572,7 @@ def get_all_goals() -> list:
         goal = dict(row)
         goal['progress'] = (goal['current_amount'] / goal['target_amount'] * 100) if goal['target_amount'] > 0 else 0
         goals_list.append(goal)
-    return goals_list
+    return goal_projections.add_goal_projections(goals_list)
 
 def update_goal_details(goal_id: int, name: str = None, target_amount: float = None, target_date: str = None, is_completed: bool = None) -> bool:
     """
@@ -541,6 +672,7 @@ def delete_goal(goal_id: int) -> bool:
 
         cursor = db.execute("DELETE FROM goals WHERE id = ?", (goal_id,))
         db.commit()
+        goal_projections.invalidate_goal_projection(goal_id)
         if cursor.rowcount > 0:
             current_app.logger.info(f"Deleted goal ID: {goal_id}")
             return True
@@ -600,8 +732,9 @@ def record_goal_funding_transaction(goal_id: int, amount_for_goal: float, transa
         # 1. Insert the transaction
         full_description = f"{description} (Goal: {goal['name']})" if description else f"{category_name} for Goal: {goal['name']}"
         db.execute(
-            "INSERT INTO transactions (amount, category_id, date, type, description) VALUES (?, ?, ?, ?, ?)",
-            (amount_for_goal, category_id, transaction_date, transaction_type, full_description)
+            "INSERT INTO transactions (amount, category_id, date, type, description, fingerprint, goal_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (amount_for_goal, category_id, transaction_date, transaction_type, full_description,
+             duplicates.transaction_fingerprint(amount_for_goal, transaction_type, full_description), goal_id)
         )
         current_app.logger.info(f"Inserted funding transaction: Type={transaction_type}, Amount={amount_for_goal}, CatID={category_id} for GoalID={goal_id}")
 
@@ -621,10 +754,144 @@ def record_goal_funding_transaction(goal_id: int, amount_for_goal: float, transa
         )
         current_app.logger.info(f"Updated goal ID {goal_id} current_amount to {new_current_amount}")
         
+        cube = analytics_cube.cached_cube() # Taken before the commit; see record_amount_change
         db.commit() # Commit both operations
+        analytics_cube.record_amount_change(category_id, transaction_date, transaction_type, amount_for_goal, cube=cube)
+        forecasting.record_transaction_change(transaction_date)
+        goal_projections.invalidate_goal_projection(goal_id)
         return True
     except Exception as e:
         db.rollback() # Rollback if any operation failed
         current_app.logger.error(f"Error recording goal funding for Goal ID {goal_id}: {e}")
         return False
 
+# --- Payroll Analytics Helper Functions ---
+
+# Allowed grouping expressions for payroll totals (whitelisted, never user-supplied SQL)
+PAYROLL_GROUP_EXPRESSIONS = {
+    'total': "'total'",
+    'year': "substr(pc.pay_date, 1, 4)",
+    'month': "substr(pc.pay_date, 1, 7)",
+    'employer': "COALESCE(NULLIF(pc.employer_name, ''), 'Unspecified')",
+}
+
+def get_payroll_totals(start_date: str, end_date: str, group_by: str = 'total') -> list:
+    """
+    Aggregates paychecks in [start_date, end_date) with one grouped query.
+    Deductions are summed per paycheck first (via the paycheck_id index) so gross pay
+    is never double counted, then rolled up by the requested grouping.
+    Args:
+        start_date (str): Inclusive start date ('YYYY-MM-DD').
+        end_date (str): Exclusive end date ('YYYY-MM-DD').
+        group_by (str): One of 'total', 'year', 'month' or 'employer'.
+    Returns:
+        list: One dict per group with gross, net, tax, pre-tax and post-tax totals
+              and the effective tax rate (tax / gross).
+    """
+    group_expr = PAYROLL_GROUP_EXPRESSIONS.get(group_by)
+    if group_expr is None:
+        raise ValueError(f"Unsupported payroll grouping: {group_by}")
+
+    db = get_db()
+    rows = db.execute(f"""
+        WITH pc AS (
+            SELECT id, pay_date, employer_name, gross_pay FROM paychecks
+            WHERE pay_date >= ? AND pay_date < ?
+        ),
+        ded AS (
+            SELECT d.paycheck_id,
+                   SUM(d.amount) AS total_deductions,
+                   SUM(CASE WHEN d.type LIKE 'TAX%' THEN d.amount ELSE 0.0 END) AS tax,
+                   SUM(CASE WHEN d.type LIKE 'PRETAX%' THEN d.amount ELSE 0.0 END) AS pretax,
+                   SUM(CASE WHEN d.type LIKE 'POSTTAX%' THEN d.amount ELSE 0.0 END) AS posttax
+            FROM pc JOIN paycheck_deductions d ON d.paycheck_id = pc.id
+            GROUP BY d.paycheck_id
+        )
+        SELECT {group_expr} AS grp,
+               COUNT(*) AS paycheck_count,
+               SUM(pc.gross_pay) AS gross,
+               SUM(COALESCE(ded.total_deductions, 0.0)) AS deductions,
+               SUM(COALESCE(ded.tax, 0.0)) AS tax,
+               SUM(COALESCE(ded.pretax, 0.0)) AS pretax,
+               SUM(COALESCE(ded.posttax, 0.0)) AS posttax
+        FROM pc LEFT JOIN ded ON ded.paycheck_id = pc.id
+        GROUP BY grp ORDER BY grp
+    """, (start_date, end_date)).fetchall()
+
+    totals = []
+    for row in rows:
+        gross = row['gross'] or 0.0
+        totals.append({
+            group_by: row['grp'],
+            'paycheck_count': row['paycheck_count'],
+            'gross': gross,
+            'net': gross - row['deductions'],
+            'deductions': row['deductions'],
+            'tax': row['tax'],
+            'pretax': row['pretax'],
+            'posttax': row['posttax'],
+            'effective_tax_rate': (row['tax'] / gross) if gross > 0 else None
+        })
+    return totals
+
+def get_payroll_deductions_by_type(start_date: str, end_date: str) -> list:
+    """
+    Sums paycheck deductions by their 'type' for paychecks in [start_date, end_date).
+    Returns:
+        list: Dicts with 'type', 'amount' and 'count', largest amount first.
+    """
+    db = get_db()
+    rows = db.execute("""
+        SELECT d.type, SUM(d.amount) AS amount, COUNT(*) AS count
+        FROM paychecks pc JOIN paycheck_deductions d ON d.paycheck_id = pc.id
+        WHERE pc.pay_date >= ? AND pc.pay_date < ?
+        GROUP BY d.type ORDER BY amount DESC
+    """, (start_date, end_date)).fetchall()
+    return [dict(row) for row in rows]
+
+# --- Needs/Wants/Savings Rollup Helper Functions ---
+
+def get_nws_rollup(start: tuple, end: tuple, group_by_month: bool = True) -> list:
+    """
+    Reads Needs/Wants/Savings totals from nws_monthly_rollup for an inclusive month span.
+    Args:
+        start (tuple): (year, month) of the first month.
+        end (tuple): (year, month) of the last month.
+        group_by_month (bool): If False, totals are summed across the whole span.
+    Returns:
+        list: Dicts with 'goal_type', 'actual_amount', 'budgeted_amount'
+              (and 'year'/'month' when grouped by month).
+    """
+    db = get_db()
+    if group_by_month:
+        query = """
+            SELECT year, month, goal_type, actual_amount, budgeted_amount FROM nws_monthly_rollup
+            WHERE (year, month) >= (?, ?) AND (year, month) <= (?, ?)
+            ORDER BY year, month, goal_type
+        """
+    else:
+        query = """
+            SELECT goal_type, SUM(actual_amount) AS actual_amount, SUM(budgeted_amount) AS budgeted_amount
+            FROM nws_monthly_rollup
+            WHERE (year, month) >= (?, ?) AND (year, month) <= (?, ?)
+            GROUP BY goal_type
+        """
+    return [dict(row) for row in db.execute(query, (start[0], start[1], end[0], end[1])).fetchall()]
+
+def rebuild_nws_rollup() -> int:
+    """
+    Recomputes nws_monthly_rollup from transactions (live and archived) and budget_goals.
+    Only needed to repair drift (e.g. after manual edits with triggers disabled).
+    Returns:
+        int: Number of rollup rows written.
+    """
+    db = get_db()
+    try:
+        db.execute("DELETE FROM nws_monthly_rollup")
+        cursor = db.execute(NWS_ROLLUP_REBUILD_SQL)
+        db.commit()
+        current_app.logger.info(f"Rebuilt nws_monthly_rollup with {cursor.rowcount} rows.")
+        return cursor.rowcount
+    except Exception:
+        db.rollback()
+        raise
@@ -0,0 +1,134 @@
+# app/utils/duplicates.py
+# Duplicate-transaction detection. Each transaction stores a fingerprint of its type,
+# amount and normalized description; rows with the same fingerprint dated within a few
+# days of each other are likely duplicates (an overlapping statement re-imported, a
+# paycheck logged twice). The (fingerprint, date) index turns every check into a range seek.
+# Rows from before the fingerprint column existed are filled in by init_db.py.
+
+import re
+import json
+import datetime
+from flask import current_app
+
+_NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+def normalize_description(description):
+    """Lowercases and reduces punctuation and whitespace runs to single spaces."""
+    return _NON_ALPHANUMERIC.sub(' ', (description or '').lower()).strip()
+
+def transaction_fingerprint(amount, transaction_type, description, currency=None):
+    """
+    Fingerprint stored in transactions.fingerprint: 'type|amount in cents|normalized description',
+    with the currency code after the cents for amounts not in the reporting currency.
+    """
+    amount_key = f"{round(float(amount) * 100)}{' ' + currency if currency else ''}"
+    return f"{transaction_type}|{amount_key}|{normalize_description(description)}"
+
+def get_window_days(window_days=None):
+    """Date tolerance in days, defaulting to the DUPLICATE_DATE_WINDOW_DAYS setting."""
+    if window_days is None:
+        window_days = current_app.config.get('DUPLICATE_DATE_WINDOW_DAYS', 3)
+    return max(0, int(window_days))
+
+def _shift(date_str, days):
+    return (datetime.date.fromisoformat(date_str) + datetime.timedelta(days=days)).isoformat()
+
+def find_duplicate(db, fingerprint, date, window_days=None, exclude_id=None):
+    """
+    Returns the closest-dated existing transaction (a Row with id, date, amount, type,
+    description, currency) with the same fingerprint within window_days of date, or None.
+    """
+    window_days = get_window_days(window_days)
+    return db.execute("""
+        SELECT id, date, amount, type, description, currency FROM transactions
+        WHERE fingerprint = ? AND date BETWEEN ? AND ? AND id IS NOT ?
+        ORDER BY ABS(julianday(date) - julianday(?)), id LIMIT 1
+    """, (fingerprint, _shift(date, -window_days), _shift(date, window_days), exclude_id, date)).fetchone()
+
+def match_existing(db, candidates, window_days=None, chunk_size=500):
+    """
+    Batch duplicate check for an import. Each existing transaction can absorb at most one
+    candidate, so importing a statement that overlaps one already imported skips exactly
+    the overlapping rows, while repeated identical rows inside one file are kept.
+    Args:
+        candidates (list): (fingerprint, 'YYYY-MM-DD') pairs.
+    Returns:
+        list: Matched existing transaction id (or None) per candidate, in input order.
+    """
+    window_days = get_window_days(window_days)
+    if not candidates:
+        return []
+    low = _shift(min(date for _, date in candidates), -window_days)
+    high = _shift(max(date for _, date in candidates), window_days)
+    existing = {} # fingerprint -> [(date, id), ...]
+    fingerprints = sorted({fingerprint for fingerprint, _ in candidates})
+    for start in range(0, len(fingerprints), chunk_size):
+        chunk = fingerprints[start:start + chunk_size]
+        rows = db.execute(f"""
+            SELECT fingerprint, date, id FROM transactions
+            WHERE fingerprint IN ({','.join('?' for _ in chunk)}) AND date BETWEEN ? AND ?
+        """, chunk + [low, high]).fetchall()
+        for row in rows:
+            existing.setdefault(row['fingerprint'], []).append((row['date'], row['id']))
+
+    matches = [None] * len(candidates)
+    used = set()
+    for index in sorted(range(len(candidates)), key=lambda i: candidates[i][1]):
+        fingerprint, date = candidates[index]
+        options = existing.get(fingerprint)
+        if not options:
+            continue
+        day = datetime.date.fromisoformat(date)
+        best = None
+        for other_date, other_id in options:
+            gap = abs((datetime.date.fromisoformat(other_date) - day).days)
+            if other_id not in used and gap <= window_days and (best is None or gap < best[0]):
+                best = (gap, other_id)
+        if best is not None:
+            used.add(best[1])
+            matches[index] = best[1]
+    return matches
+
+def find_duplicate_groups(db, window_days=None, start_date=None, end_date=None):
+    """
+    Finds groups of existing transactions that look like duplicates, in one grouped query:
+    rows are ordered by date within each fingerprint, a new cluster starts wherever the gap
+    to the previous row exceeds window_days, and clusters with more than one row are returned.
+    Returns:
+        list: {'fingerprint', 'first_date', 'last_date', 'count', 'amount', 'type',
+               'transactions': [{'id', 'date', 'amount', 'currency', 'type', 'description', 'category_id'}]}
+              ordered by first_date (newest first).
+    """
+    window_days = get_window_days(window_days)
+    conditions, params = ["fingerprint IS NOT NULL"], []
+    if start_date:
+        conditions.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("date <= ?")
+        params.append(end_date)
+    rows = db.execute(f"""
+        WITH ordered AS (
+            SELECT id, date, amount, currency, type, description, category_id, fingerprint,
+                   CASE WHEN julianday(date) - julianday(LAG(date) OVER w) <= ? THEN 0 ELSE 1 END AS starts_cluster
+            FROM transactions WHERE {' AND '.join(conditions)}
+            WINDOW w AS (PARTITION BY fingerprint ORDER BY date, id)
+        ), clustered AS (
+            SELECT *, SUM(starts_cluster) OVER (PARTITION BY fingerprint ORDER BY date, id) AS cluster
+            FROM ordered
+        )
+        SELECT fingerprint, MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS count,
+               MIN(amount) AS amount, MIN(type) AS type,
+               json_group_array(json_object('id', id, 'date', date, 'amount', amount, 'currency', currency, 'type', type,
+                                            'description', description, 'category_id', category_id)) AS transactions
+        FROM clustered
+        GROUP BY fingerprint, cluster
+        HAVING COUNT(*) > 1
+        ORDER BY first_date DESC, fingerprint
+    """, [window_days] + params).fetchall()
+    groups = []
+    for row in rows:
+        group = dict(row)
+        group['transactions'] = sorted(json.loads(row['transactions']), key=lambda t: (t['date'], t['id']))
+        groups.append(group)
+    return groups
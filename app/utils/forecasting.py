@@ -0,0 +1,158 @@
+# app/utils/forecasting.py
+# Month-end and year-end expense projections per category, based on each
+# category's historical daily spend curve.
+
+import calendar
+import datetime
+import threading
+import numpy as np
+from flask import current_app
+from app.database import get_db
+from app.utils import currency, splits
+
+_cache_lock = threading.Lock()
+
+def _shift_month(year: int, month: int, delta: int) -> tuple:
+    """Returns (year, month) moved by delta months."""
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+def build_spend_curves(db, year: int, month: int, history_months: int) -> dict:
+    """
+    Builds the historical spend profile used to forecast (year, month).
+    One grouped query over the history window, then vectorized over all categories:
+        curve[c, d]  average share of a month's spend in category c made by day d+1
+        baseline[c]  average monthly spend of category c since it first appeared in the window
+    Returns:
+        dict: 'category_ids', 'row_for_category', 'curve' (n x 31), 'baseline' (n), 'has_history' (n bool).
+    """
+    start_year, start_month = _shift_month(year, month, -history_months)
+    rows = db.execute(f"""
+        SELECT l.category_id,
+               (CAST(strftime('%Y', l.date) AS INTEGER) * 12 + CAST(strftime('%m', l.date) AS INTEGER) - 1) AS month_idx,
+               CAST(strftime('%d', l.date) AS INTEGER) AS day, SUM({currency.amount_sql('l')}) AS amount
+        FROM ({splits.transaction_lines_sql()}) l
+        WHERE l.type = 'expense' AND l.category_id IS NOT NULL AND l.date >= ? AND l.date < ?
+        GROUP BY l.category_id, month_idx, day
+    """, (f"{start_year:04d}-{start_month:02d}-01", f"{year:04d}-{month:02d}-01")).fetchall()
+
+    category_ids = sorted({r['category_id'] for r in rows})
+    row_for_category = {cat_id: i for i, cat_id in enumerate(category_ids)}
+    first_idx = start_year * 12 + start_month - 1
+    daily = np.zeros((len(category_ids), history_months, 31))
+    if rows:
+        cats = np.array([row_for_category[r['category_id']] for r in rows])
+        months = np.array([r['month_idx'] - first_idx for r in rows])
+        days = np.clip(np.array([r['day'] for r in rows]) - 1, 0, 30)
+        np.add.at(daily, (cats, months, days), np.array([r['amount'] for r in rows], dtype=float))
+
+    cumulative = np.cumsum(daily, axis=2)
+    monthly_totals = cumulative[:, :, -1]
+    active = monthly_totals > 0
+    # Per-month cumulative shares, averaged over the months that had any spend
+    shares = np.divide(cumulative, monthly_totals[:, :, None], out=np.zeros_like(cumulative), where=active[:, :, None])
+    active_counts = active.sum(axis=1)
+    curve = np.divide(shares.sum(axis=1), active_counts[:, None],
+                      out=np.zeros((len(category_ids), 31)), where=active_counts[:, None] > 0)
+
+    # Average monthly spend counted from the first month each category had spend
+    first_active = np.where(active.any(axis=1), active.argmax(axis=1), history_months)
+    months_observed = np.maximum(history_months - first_active, 1)
+    baseline = monthly_totals.sum(axis=1) / months_observed
+
+    return {
+        'category_ids': category_ids,
+        'row_for_category': row_for_category,
+        'curve': curve,
+        'baseline': baseline,
+        'has_history': active_counts > 0
+    }
+
+def get_spend_curves(year: int, month: int) -> dict:
+    """Returns the cached spend profile for (year, month), building it on first use."""
+    cache = current_app.extensions.setdefault('forecast_cache', {})
+    key = (year, month)
+    curves = cache.get(key)
+    if curves is None:
+        with _cache_lock:
+            curves = cache.get(key)
+            if curves is None:
+                history_months = current_app.config.get('FORECAST_HISTORY_MONTHS', 12)
+                curves = build_spend_curves(get_db(), year, month, history_months)
+                cache[key] = curves
+    return curves
+
+def record_transaction_change(transaction_date: str):
+    """
+    Invalidates cached spend profiles affected by a committed expense write.
+    Profiles only read months before the one they forecast, so a write dated in
+    month M invalidates profiles for months after M.
+    """
+    cache = current_app.extensions.get('forecast_cache')
+    if not cache:
+        return
+    try:
+        changed = (int(transaction_date[:4]), int(transaction_date[5:7]))
+    except (TypeError, ValueError):
+        changed = None
+    with _cache_lock:
+        for key in list(cache):
+            if changed is None or key > changed:
+                del cache[key]
+
+def get_category_forecasts(as_of: datetime.date = None) -> dict:
+    """
+    Projects month-end and year-end expense actuals for every category, as of a date.
+    month_end = month_to_date + baseline * (1 - curve[day]); categories with no history
+    fall back to linear extrapolation of month_to_date. year_end adds the projected rest
+    of this month plus baseline spend for each remaining month of the year.
+    Returns:
+        dict: category_id -> {'month_to_date', 'projected_month_end', 'year_to_date', 'projected_year_end'}
+    """
+    as_of = as_of or datetime.date.today()
+    year, month, day = as_of.year, as_of.month, as_of.day
+    days_in_month = calendar.monthrange(year, month)[1]
+    curves = get_spend_curves(year, month)
+
+    db = get_db()
+    next_year, next_month = _shift_month(year, month, 1)
+    amount = currency.amount_sql('l')
+    actual_rows = db.execute(f"""
+        SELECT l.category_id,
+               SUM(CASE WHEN l.date >= ? THEN {amount} ELSE 0.0 END) AS month_to_date,
+               SUM({amount}) AS year_to_date
+        FROM ({splits.transaction_lines_sql()}) l
+        WHERE l.type = 'expense' AND l.category_id IS NOT NULL AND l.date >= ? AND l.date < ?
+        GROUP BY l.category_id
+    """, (f"{year:04d}-{month:02d}-01", f"{year:04d}-01-01", f"{next_year:04d}-{next_month:02d}-01")).fetchall()
+
+    category_ids = list(dict.fromkeys(curves['category_ids'] + [r['category_id'] for r in actual_rows]))
+    n = len(category_ids)
+    mtd = np.zeros(n)
+    ytd = np.zeros(n)
+    position = {cat_id: i for i, cat_id in enumerate(category_ids)}
+    for r in actual_rows:
+        mtd[position[r['category_id']]] = r['month_to_date']
+        ytd[position[r['category_id']]] = r['year_to_date']
+
+    history_rows = len(curves['category_ids']) # history categories come first in category_ids
+    curve_today = np.ones(n)
+    baseline = np.zeros(n)
+    has_history = np.zeros(n, dtype=bool)
+    curve_today[:history_rows] = curves['curve'][:, min(day, days_in_month) - 1]
+    baseline[:history_rows] = curves['baseline']
+    has_history[:history_rows] = curves['has_history']
+
+    remaining_share = np.clip(1.0 - curve_today, 0.0, 1.0)
+    month_end = np.where(has_history, mtd + baseline * remaining_share, mtd * days_in_month / day)
+    year_end = ytd + (month_end - mtd) + baseline * (12 - month)
+
+    return {
+        cat_id: {
+            'month_to_date': float(mtd[i]),
+            'projected_month_end': float(month_end[i]),
+            'year_to_date': float(ytd[i]),
+            'projected_year_end': float(year_end[i])
+        }
+        for i, cat_id in enumerate(category_ids)
+    }
@@ -0,0 +1,64 @@
+# app/utils/fragment_cache.py
+# Caches rendered template fragments, one entry per fragment and view, valid for the data
+# versions of the tables they read. Bounded by entry count and by total size.
+
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template
+from markupsafe import Markup
+from app.database import get_db
+
+_cache_lock = threading.Lock()
+
+def get_table_versions(tables):
+    """
+    Returns {table_name: version} for the given tables from table_versions
+    (maintained by triggers; see init_db.create_table_versions).
+    """
+    placeholders = ','.join('?' for _ in tables)
+    rows = get_db().execute(
+        f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})", list(tables)
+    ).fetchall()
+    return {row['table_name']: row['version'] for row in rows}
+
+def render_fragment(template_name, tables, load_context, key_args=()):
+    """
+    Renders a partial template through the fragment cache.
+    Args:
+        template_name (str): Partial template to render.
+        tables (tuple): Tables the fragment's data comes from.
+        load_context (callable): Returns the template context; only called on a cache miss,
+                                 so the queries behind the fragment are skipped on a hit.
+        key_args (tuple): Any other values the rendered output depends on (e.g. view parameters).
+    Returns:
+        Markup: The rendered fragment.
+    """
+    if not current_app.config.get('FRAGMENT_CACHE_ENABLED', True):
+        return Markup(render_template(template_name, **load_context()))
+
+    versions = tuple(get_table_versions(tables).get(t) for t in tables)
+    # One entry per fragment and view: a newer data version replaces the entry instead of
+    # leaving the superseded HTML behind until the LRU pushes it out
+    key = (template_name, tuple(key_args))
+    state = current_app.extensions.setdefault('fragment_cache', {'entries': OrderedDict(), 'size': 0})
+    entries = state['entries']
+    with _cache_lock:
+        entry = entries.get(key)
+        if entry is not None and entry[0] == versions:
+            entries.move_to_end(key)
+            return entry[1]
+
+    html = Markup(render_template(template_name, **load_context()))
+    max_entries = current_app.config.get('FRAGMENT_CACHE_ENTRIES', 32)
+    max_size = current_app.config.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    with _cache_lock:
+        old = entries.pop(key, None)
+        if old is not None:
+            state['size'] -= len(old[1])
+        if len(html) <= max_size: # A fragment larger than the whole budget is never cached
+            entries[key] = (versions, html)
+            state['size'] += len(html)
+        while entries and (len(entries) > max_entries or state['size'] > max_size):
+            _, (_, evicted) = entries.popitem(last=False)
+            state['size'] -= len(evicted)
+    return html
@@ -0,0 +1,133 @@
+# app/utils/goal_projections.py
+# Completion ETA and required monthly contribution for financial goals, derived
+# from their contribution/withdrawal history.
+
+import datetime
+import threading
+import numpy as np
+from flask import current_app
+from app.database import get_db
+
+AVERAGE_DAYS_PER_MONTH = 30.436875
+_cache_lock = threading.Lock()
+
+def _month_index(date: datetime.date) -> int:
+    return date.year * 12 + date.month - 1
+
+def compute_contribution_rates(goal_ids: list, as_of: datetime.date) -> dict:
+    """
+    Estimates each goal's net monthly contribution rate in one grouped query.
+    Funding transactions are the Goal Contributions / Goal Withdrawals transactions
+    linked to a goal through transactions.goal_id (set by record_goal_funding_transaction).
+    The rate is the least-squares slope of cumulative net funding against month,
+    fitted for all goals at once over LOOKBACK months starting at each goal's first funding.
+    Returns:
+        dict: goal_id -> {'monthly_rate': float, 'months_of_history': int, 'net_funded': float}
+    """
+    db = get_db()
+    if not goal_ids:
+        return {}
+    lookback = current_app.config.get('GOAL_PROJECTION_LOOKBACK_MONTHS', 24)
+    current_month = _month_index(as_of)
+    first_month = current_month - lookback + 1
+    placeholders = ','.join('?' for _ in goal_ids)
+    rows = db.execute(f"""
+        SELECT t.goal_id,
+               CAST(strftime('%Y', t.date) AS INTEGER) * 12 + CAST(strftime('%m', t.date) AS INTEGER) - 1 AS month_idx,
+               SUM(CASE WHEN c.name = 'Goal Contributions' THEN t.amount ELSE -t.amount END) AS net_amount
+        FROM transactions t
+        JOIN categories c ON c.id = t.category_id AND c.name IN ('Goal Contributions', 'Goal Withdrawals')
+        JOIN categories sys ON sys.id = c.parent_id AND sys.name = 'System' AND sys.parent_id IS NULL
+        WHERE t.goal_id IN ({placeholders}) AND t.date >= ? AND t.date < ?
+        GROUP BY t.goal_id, month_idx
+    """, list(goal_ids) + [f"{first_month // 12:04d}-{first_month % 12 + 1:02d}-01",
+                           (as_of + datetime.timedelta(days=1)).isoformat()]).fetchall()
+
+    position = {goal_id: i for i, goal_id in enumerate(goal_ids)}
+    net = np.zeros((len(goal_ids), lookback))
+    for r in rows:
+        net[position[r['goal_id']], r['month_idx'] - first_month] += r['net_amount']
+
+    cumulative = np.cumsum(net, axis=1)
+    months = np.arange(lookback, dtype=float)
+    has_funding = (net != 0).any(axis=1)
+    first_funded = np.where(has_funding, (net != 0).argmax(axis=1), lookback)
+    mask = months[None, :] >= first_funded[:, None]
+    n = mask.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+    t_mean = (mask * months).sum(axis=1) / safe_n
+    y_mean = (mask * cumulative).sum(axis=1) / safe_n
+    t_dev = (months[None, :] - t_mean[:, None]) * mask
+    covariance = (t_dev * (cumulative - y_mean[:, None])).sum(axis=1)
+    variance = (t_dev ** 2).sum(axis=1)
+    # A single month of history has no slope; treat that month's funding as the rate
+    slope = np.divide(covariance, variance, out=cumulative[:, -1] / safe_n, where=variance > 0)
+
+    return {
+        goal_id: {
+            'monthly_rate': float(slope[i]) if has_funding[i] else 0.0,
+            'months_of_history': int(n[i]),
+            'net_funded': float(cumulative[i, -1])
+        }
+        for goal_id, i in position.items()
+    }
+
+def get_contribution_rates(goal_ids: list, as_of: datetime.date) -> dict:
+    """Returns cached contribution rates, computing the missing goals in one batch."""
+    cache = current_app.extensions.setdefault('goal_projection_cache', {})
+    cache_month = _month_index(as_of)
+    with _cache_lock:
+        missing = [goal_id for goal_id in goal_ids
+                   if goal_id not in cache or cache[goal_id][0] != cache_month]
+    if missing:
+        rates = compute_contribution_rates(missing, as_of)
+        with _cache_lock:
+            for goal_id, rate in rates.items():
+                cache[goal_id] = (cache_month, rate)
+    with _cache_lock:
+        return {goal_id: cache[goal_id][1] for goal_id in goal_ids if goal_id in cache}
+
+def invalidate_goal_projection(goal_id: int = None):
+    """Drops the cached rate for one goal (or all goals when goal_id is None)."""
+    cache = current_app.extensions.get('goal_projection_cache')
+    if cache is None:
+        return
+    with _cache_lock:
+        if goal_id is None:
+            cache.clear()
+        else:
+            cache.pop(goal_id, None)
+
+def add_goal_projections(goals: list, as_of: datetime.date = None) -> list:
+    """
+    Adds projection fields to goal dicts (as returned by get_all_goals):
+        monthly_rate                  net monthly funding trend
+        projected_completion_date     'YYYY-MM-DD' at the current rate, or None if not on track
+        required_monthly_contribution amount per month needed to reach target by target_date
+    """
+    as_of = as_of or datetime.date.today()
+    rates = get_contribution_rates([g['id'] for g in goals], as_of)
+    for goal in goals:
+        rate = rates.get(goal['id'], {}).get('monthly_rate', 0.0)
+        remaining = max(goal['target_amount'] - goal['current_amount'], 0.0)
+        goal['monthly_rate'] = rate
+        if remaining <= 0:
+            goal['projected_completion_date'] = as_of.isoformat()
+        elif rate > 0:
+            days_needed = remaining / rate * AVERAGE_DAYS_PER_MONTH
+            goal['projected_completion_date'] = (as_of + datetime.timedelta(days=int(np.ceil(days_needed)))).isoformat()
+        else:
+            goal['projected_completion_date'] = None
+
+        goal['required_monthly_contribution'] = None
+        if goal.get('target_date') and remaining > 0:
+            try:
+                target = datetime.datetime.strptime(goal['target_date'], '%Y-%m-%d').date()
+                months_left = (target - as_of).days / AVERAGE_DAYS_PER_MONTH
+                # At or past the target date the whole remainder is due now
+                goal['required_monthly_contribution'] = remaining / months_left if months_left >= 1 else remaining
+            except ValueError:
+                pass
+        elif goal.get('target_date'):
+            goal['required_monthly_contribution'] = 0.0
+    return goals
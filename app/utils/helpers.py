@@ -15,3 +15,79 @@ def format_month_name(month_number):
     except ValueError:
         pass # If month_number is not a valid integer
     return str(month_number) # Fallback to returning the number as string if invalid
+
+def parse_analytics_view_args(args, current_year, current_month):
+    """
+    Reads the analytics view (period_type, year, month) from request args,
+    defaulting to the current month. month is None for yearly views.
+    """
+    period_type = args.get('period_type', default='monthly')
+    year_str = args.get('year')
+    year = int(year_str) if year_str and year_str.isdigit() else current_year
+
+    month_str = args.get('month')
+    if period_type == 'yearly':
+        month = None
+    elif month_str and month_str.isdigit():
+        month = int(month_str)
+        if not (1 <= month <= 12):
+            month = current_month
+    else:
+        month = current_month if period_type == 'monthly' else None
+    return period_type, year, month
+
+# Analytics periods. Every period is a half-open date range [start, end) so queries can
+# use indexed `date >= ? AND date < ?` predicates.
+PERIOD_TYPES = ('monthly', 'yearly', 'quarterly', 'fiscal_year', 'pay_period', 'custom')
+
+def add_months(year, month, count):
+    """(year, month) shifted by count months."""
+    index = year * 12 + (month - 1) + count
+    return index // 12, index % 12 + 1
+
+def parse_iso_date(value):
+    """Parses 'YYYY-MM-DD' into a date, or returns None."""
+    try:
+        return datetime.date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+def get_calendar_period_range(period_type, year, month=None, quarter=None, fiscal_start_month=1):
+    """
+    Half-open date range for a calendar-based period.
+        monthly      the given month
+        yearly       January to December of year
+        quarterly    calendar quarter 1-4 of year
+        fiscal_year  twelve months starting in fiscal_start_month; named after the
+                     calendar year it ends in (start month 10: FY2026 = Oct 2025 - Sep 2026)
+    Returns:
+        tuple: (start_date, end_date) with end_date exclusive.
+    """
+    if period_type == 'monthly':
+        first, months = (year, month), 1
+    elif period_type == 'yearly':
+        first, months = (year, 1), 12
+    elif period_type == 'quarterly':
+        if quarter not in (1, 2, 3, 4):
+            raise ValueError("Quarter must be 1-4.")
+        first, months = (year, 3 * (quarter - 1) + 1), 3
+    elif period_type == 'fiscal_year':
+        first = (year, 1) if fiscal_start_month == 1 else (year - 1, fiscal_start_month)
+        months = 12
+    else:
+        raise ValueError(f"'{period_type}' is not a calendar period type.")
+    end = add_months(first[0], first[1], months)
+    return datetime.date(first[0], first[1], 1), datetime.date(end[0], end[1], 1)
+
+def parse_analytics_range_args(args):
+    """
+    Reads the extra analytics period args (quarter, start_date, end_date, pay_date) from
+    request args, as keyword arguments for db_helpers.get_financial_summary. Bad values become None.
+    """
+    quarter = args.get('quarter', type=int)
+    return {
+        'quarter': quarter if quarter in (1, 2, 3, 4) else None,
+        'start_date': parse_iso_date(args.get('start_date')),
+        'end_date': parse_iso_date(args.get('end_date')),
+        'pay_date': parse_iso_date(args.get('pay_date')),
+    }
@@ -0,0 +1,295 @@
+# app/utils/report_jobs.py
+# Background report jobs: long-running summaries and exports run on a bounded
+# thread pool with their own read-only connection, tracked in the 'jobs' table.
+
+import csv
+import datetime
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g
+from app.database import get_db
+from app.utils import db_helpers
+from app.utils import archive
+from app.utils import currency
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+PROGRESS_WRITE_INTERVAL = 0.5 # Seconds between progress writes to the jobs table
+
+
+class JobQueueFull(Exception):
+    """Raised when REPORT_JOB_MAX_PENDING jobs are already queued or running in this process."""
+
+
+# --- Reports ---
+# Each report has validate(params) -> (clean_params, error) and run(params, writer, progress) -> None,
+# where writer is a csv.writer on the result file and progress(fraction) reports completion.
+
+def _validate_year(params, key='year'):
+    value = params.get(key, datetime.date.today().year)
+    try:
+        year = int(value)
+    except (TypeError, ValueError):
+        return None, f"'{key}' must be a year."
+    if not 1900 <= year <= 9999:
+        return None, f"'{key}' must be a year."
+    return year, None
+
+def validate_yearly_summary(params):
+    year, error = _validate_year(params)
+    return ({'year': year}, None) if error is None else (None, error)
+
+def run_yearly_summary(params, writer, progress):
+    """Month-by-month budget vs. actual per main category, followed by the yearly totals."""
+    year = params['year']
+    writer.writerow(['period', 'category', 'budgeted', 'actual', 'variance'])
+    for month in range(1, 13):
+        summary = db_helpers.get_financial_summary(year=year, month=month, period_type='monthly')
+        for row in summary['summary_table_data']:
+            writer.writerow([f"{year:04d}-{month:02d}", row['name'], f"{row['budgeted']:.2f}",
+                             f"{row['actual']:.2f}", f"{row['variance']:.2f}"])
+        progress(month / 13)
+    summary = db_helpers.get_financial_summary(year=year, period_type='yearly')
+    for row in summary['summary_table_data']:
+        writer.writerow([f"{year:04d}", row['name'], f"{row['budgeted']:.2f}",
+                         f"{row['actual']:.2f}", f"{row['variance']:.2f}"])
+
+def validate_multi_year_comparison(params):
+    start_year, error = _validate_year(params, 'start_year')
+    if error is None:
+        end_year, error = _validate_year(params, 'end_year')
+    if error is not None:
+        return None, error
+    if start_year > end_year or end_year - start_year >= 30:
+        return None, "'start_year' must be <= 'end_year' and span at most 30 years."
+    return {'start_year': start_year, 'end_year': end_year}, None
+
+def run_multi_year_comparison(params, writer, progress):
+    """One row per main category with budgeted and actual columns for each year."""
+    years = list(range(params['start_year'], params['end_year'] + 1))
+    by_category = {}
+    for i, year in enumerate(years):
+        summary = db_helpers.get_financial_summary(year=year, period_type='yearly')
+        for row in summary['summary_table_data']:
+            by_category.setdefault(row['name'], {})[year] = (row['budgeted'], row['actual'])
+        progress((i + 1) / (len(years) + 1))
+    writer.writerow(['category'] + [f"{year} {column}" for year in years for column in ('budgeted', 'actual')])
+    for name in sorted(by_category):
+        amounts = by_category[name]
+        writer.writerow([name] + [f"{value:.2f}" for year in years for value in amounts.get(year, (0.0, 0.0))])
+
+def validate_transactions_export(params):
+    clean = {}
+    for key in ('start_date', 'end_date'):
+        if params.get(key):
+            try:
+                clean[key] = datetime.datetime.strptime(params[key], '%Y-%m-%d').date().isoformat()
+            except (TypeError, ValueError):
+                return None, f"'{key}' must be YYYY-MM-DD."
+    return clean, None
+
+def run_transactions_export(params, writer, progress):
+    """
+    All transactions (optionally within [start_date, end_date]) with full category names, archived ones included.
+    Each row has its own amount and currency plus the amount converted to the reporting currency;
+    split transactions list their lines ('Food 12.00; Household 8.00') as the category.
+    """
+    db = get_db()
+    source = archive.transactions_source(db)
+    splits_source = archive.splits_source(db)
+    conditions, args = [], []
+    if params.get('start_date'):
+        conditions.append("t.date >= ?")
+        args.append(params['start_date'])
+    if params.get('end_date'):
+        conditions.append("t.date <= ?")
+        args.append(params['end_date'])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    total = db.execute(f"SELECT COUNT(*) FROM {source} t {where}", args).fetchone()[0] or 1
+    reporting = currency.get_reporting_currency()
+    writer.writerow(['id', 'date', 'type', 'amount', 'currency', f'amount_{reporting.lower()}', 'category', 'description'])
+    # Keyset pages, each fully fetched: an open cursor would keep the database read-locked
+    # and block the progress writes (and every other writer) until the export finished
+    page_conditions = conditions + ["(t.date, t.id) > (?, ?)"]
+    last_key = ('', 0)
+    written = 0
+    while True:
+        batch = db.execute(f"""
+            SELECT t.id, t.date, t.type, t.amount, t.currency, {currency.amount_sql('t')} AS reporting_amount,
+                   p.name AS parent_name, c.name AS category_name, t.description,
+                   (SELECT group_concat(COALESCE(sc.name, 'Uncategorized') || ' ' || printf('%.2f', s.amount), '; ')
+                    FROM {splits_source} s LEFT JOIN categories sc ON sc.id = s.category_id
+                    WHERE s.transaction_id = t.id) AS split_lines
+            FROM {source} t LEFT JOIN categories c ON t.category_id = c.id
+            LEFT JOIN categories p ON c.parent_id = p.id
+            WHERE {' AND '.join(page_conditions)} ORDER BY t.date, t.id LIMIT 1000
+        """, args + list(last_key)).fetchall()
+        if not batch:
+            break
+        for r in batch:
+            category = f"{r['parent_name']} → {r['category_name']}" if r['parent_name'] else (r['category_name'] or 'Uncategorized')
+            if r['split_lines']:
+                category = r['split_lines']
+            writer.writerow([r['id'], r['date'], r['type'], f"{r['amount']:.2f}", r['currency'] or reporting,
+                             f"{r['reporting_amount']:.2f}", category, r['description'] or ''])
+        last_key = (batch[-1]['date'], batch[-1]['id'])
+        written += len(batch)
+        progress(written / total)
+
+REPORTS = {
+    'yearly_summary': (validate_yearly_summary, run_yearly_summary),
+    'multi_year_comparison': (validate_multi_year_comparison, run_multi_year_comparison),
+    'transactions_export': (validate_transactions_export, run_transactions_export),
+}
+
+
+# --- Job bookkeeping ---
+
+def _connect(database, read_only=False):
+    """Opens a connection for a worker thread (the request-scoped get_db() connection can't be shared)."""
+    if read_only:
+        conn = sqlite3.connect(pathlib.Path(database).resolve().as_uri() + '?mode=ro', uri=True,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+    else:
+        conn = sqlite3.connect(database, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _utc_now():
+    """Timestamp in the same format and zone as SQLite's CURRENT_TIMESTAMP."""
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _update_job(database, job_id, **fields):
+    """Writes job fields in a short transaction of its own, refreshing the updated_at heartbeat."""
+    assignments = ', '.join(f"{name} = ?" for name in fields)
+    conn = _connect(database)
+    try:
+        with conn:
+            conn.execute(f"UPDATE jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         list(fields.values()) + [job_id])
+    finally:
+        conn.close()
+
+def _run_job(app, job_id, kind, params):
+    """Worker-thread entry point: runs one report inside an app context with a read-only get_db()."""
+    state = app.extensions['report_jobs']
+    database = app.config['DATABASE']
+    result_path = os.path.join(app.config['REPORT_OUTPUT_DIR'], f"{job_id}.csv")
+    last_write = [0.0]
+
+    def progress(fraction):
+        now = time.monotonic()
+        if now - last_write[0] >= PROGRESS_WRITE_INTERVAL:
+            last_write[0] = now
+            _update_job(database, job_id, progress=round(min(max(fraction, 0.0), 1.0), 4))
+
+    try:
+        _update_job(database, job_id, status='running', started_at=_utc_now())
+        with app.app_context():
+            # get_db() inside report code returns this connection; the app context teardown closes it
+            g.db = _connect(database, read_only=True)
+            _, run_report = REPORTS[kind]
+            with open(result_path, 'w', newline='', encoding='utf-8') as result_file:
+                run_report(params, csv.writer(result_file), progress)
+        _update_job(database, job_id, status='succeeded', progress=1.0, result_path=result_path,
+                    result_name=f"{kind}_{job_id[:8]}.csv", message=None,
+                    finished_at=_utc_now())
+    except Exception as e:
+        app.logger.error(f"Report job {job_id} ({kind}) failed: {e}", exc_info=True)
+        if os.path.exists(result_path):
+            os.remove(result_path)
+        _update_job(database, job_id, status='failed', message=str(e),
+                    finished_at=_utc_now())
+    finally:
+        with state['lock']:
+            state['pending'] -= 1
+
+def submit_job(kind, params):
+    """
+    Validates and queues a report job.
+    Returns:
+        tuple: (job_id, None) on success, or (None, error_message) for bad input.
+    Raises:
+        JobQueueFull: If REPORT_JOB_MAX_PENDING jobs are already queued or running.
+    """
+    if kind not in REPORTS:
+        return None, f"Unknown report '{kind}'. Available: {', '.join(sorted(REPORTS))}."
+    validate, _ = REPORTS[kind]
+    clean_params, error = validate(params or {})
+    if error:
+        return None, error
+
+    state = current_app.extensions['report_jobs']
+    with state['lock']:
+        if state['pending'] >= current_app.config['REPORT_JOB_MAX_PENDING']:
+            raise JobQueueFull("Too many report jobs are already running; try again shortly.")
+        state['pending'] += 1
+
+    try:
+        prune_old_jobs()
+        job_id = uuid.uuid4().hex
+        db = get_db()
+        db.execute("INSERT INTO jobs (id, kind, params, status) VALUES (?, ?, ?, 'queued')",
+                   (job_id, kind, json.dumps(clean_params)))
+        db.commit()
+        state['executor'].submit(_run_job, current_app._get_current_object(), job_id, kind, clean_params)
+    except Exception:
+        with state['lock']:
+            state['pending'] -= 1
+        raise
+    return job_id, None
+
+def get_job(job_id):
+    """Returns a job as a dict (None if unknown). Queued/running jobs past REPORT_JOB_STALE_SECONDS are marked failed."""
+    db = get_db()
+    row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    if job['status'] in ('queued', 'running'):
+        stale = db.execute("SELECT updated_at < datetime('now', ?) FROM jobs WHERE id = ?",
+                           (f"-{int(current_app.config['REPORT_JOB_STALE_SECONDS'])} seconds", job_id)).fetchone()[0]
+        if stale:
+            db.execute("UPDATE jobs SET status = 'failed', message = 'Interrupted (worker stopped or restarted).', "
+                       "finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status IN ('queued', 'running')", (job_id,))
+            db.commit()
+            job.update(status='failed', message='Interrupted (worker stopped or restarted).')
+    job['params'] = json.loads(job['params'] or '{}')
+    return job
+
+def list_jobs(limit=20):
+    """Most recent jobs first."""
+    rows = get_db().execute(
+        "SELECT id, kind, status, progress, created_at, finished_at FROM jobs ORDER BY created_at DESC, rowid DESC LIMIT ?",
+        (limit,)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+def prune_old_jobs():
+    """Deletes finished jobs (and their result files) older than REPORT_JOB_RETENTION_DAYS."""
+    db = get_db()
+    cutoff = f"-{int(current_app.config['REPORT_JOB_RETENTION_DAYS'])} days"
+    old_jobs = db.execute(
+        "SELECT id, result_path FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < datetime('now', ?)",
+        (cutoff,)
+    ).fetchall()
+    for job in old_jobs:
+        if job['result_path'] and os.path.exists(job['result_path']):
+            os.remove(job['result_path'])
+    if old_jobs:
+        db.executemany("DELETE FROM jobs WHERE id = ?", [(job['id'],) for job in old_jobs])
+        db.commit()
+
+def init_app(app):
+    """Creates this process's report worker pool (settings: REPORT_* config)."""
+    os.makedirs(app.config['REPORT_OUTPUT_DIR'], exist_ok=True)
+    app.extensions['report_jobs'] = {
+        'executor': ThreadPoolExecutor(max_workers=app.config['REPORT_JOB_WORKERS'], thread_name_prefix='report-job'),
+        'lock': threading.Lock(),
+        'pending': 0
+    }
@@ -0,0 +1,120 @@
+# app/utils/rollover.py
+# Envelope-style budgeting. A category with rollover enabled carries its unspent budget
+# (or its overspending) into later months: a month's available amount is its budget plus
+# the running total of (budget - actual) over the months before it, counted from the
+# category's rollover_since month. Nothing is stored: one grouped query builds the
+# monthly series and a window running sum derives the carry, so an edit to any month
+# changes only what later months read, and viewing December reads one result row per
+# envelope instead of replaying the year in Python.
+
+import datetime
+from app.database import get_db
+from app.utils import currency, splits
+
+def _month_index(year, month):
+    return year * 12 + month - 1
+
+def parse_rollover_since(value):
+    """
+    Validates a rollover start month ('YYYY-MM' or 'YYYY-MM-DD').
+    Returns:
+        str: The first day of that month, as stored in categories.rollover_since.
+    Raises:
+        ValueError: If value is not a valid month.
+    """
+    value = (value or '').strip()
+    try:
+        day = datetime.datetime.strptime(value[:7], '%Y-%m').date()
+    except ValueError:
+        raise ValueError(f"Invalid rollover start month '{value}'. Use YYYY-MM.")
+    return day.isoformat()
+
+def set_rollover(category_id, since, db=None):
+    """
+    Enables rollover for a category from the month `since` (see parse_rollover_since),
+    or disables it when since is None. Commits.
+    Returns:
+        bool: False if the category does not exist.
+    """
+    db = db or get_db()
+    cursor = db.execute("UPDATE categories SET rollover_since = ? WHERE id = ?", (since, category_id))
+    db.commit()
+    return cursor.rowcount > 0
+
+def get_envelopes(first_month, last_month, db=None):
+    """
+    Monthly envelope balances of every rollover category for months in [first_month, last_month].
+    Args:
+        first_month, last_month (tuple): (year, month), inclusive.
+    Returns:
+        dict: category_id -> list of dicts (year, month, budgeted, actual, carry_in, available)
+              in month order, amounts in the reporting currency. Months before a category's
+              rollover_since are left out.
+    """
+    db = db or get_db()
+    start = db.execute("SELECT MIN(rollover_since) FROM categories WHERE rollover_since IS NOT NULL").fetchone()[0]
+    if start is None:
+        return {}
+    first_index, last_index = _month_index(*first_month), _month_index(*last_month)
+    start_index = _month_index(int(start[:4]), int(start[5:7]))
+    if last_index < start_index:
+        return {}
+    end_year, end_month = divmod(last_index + 1, 12)
+    # Half-open date range of every month that feeds a carry, for idx_transactions_date
+    date_range = (start, datetime.date(end_year, end_month + 1, 1).isoformat())
+    rows = db.execute(f"""
+        WITH RECURSIVE months(m) AS (
+            SELECT ? UNION ALL SELECT m + 1 FROM months WHERE m < ?
+        ),
+        envelopes AS (
+            SELECT id AS category_id,
+                   CAST(substr(rollover_since, 1, 4) AS INTEGER) * 12 + CAST(substr(rollover_since, 6, 2) AS INTEGER) - 1 AS since_m
+            FROM categories WHERE rollover_since IS NOT NULL
+        ),
+        budgeted AS (
+            SELECT b.category_id, b.year * 12 + b.month - 1 AS m, SUM({currency.budget_amount_sql('b')}) AS amount
+            FROM budget_goals b JOIN envelopes e ON e.category_id = b.category_id
+            WHERE b.year * 12 + b.month - 1 BETWEEN e.since_m AND ?
+            GROUP BY 1, 2
+        ),
+        spent AS (
+            SELECT category_id, m, SUM(amount) AS amount FROM (
+                SELECT l.category_id,
+                       CAST(strftime('%Y', l.date) AS INTEGER) * 12 + CAST(strftime('%m', l.date) AS INTEGER) - 1 AS m,
+                       {currency.amount_sql('l')} AS amount
+                FROM ({splits.transaction_lines_sql()}) l
+                WHERE l.type = 'expense' AND l.date >= ? AND l.date < ?
+                UNION ALL
+                SELECT a.category_id, a.year * 12 + a.month - 1, a.amount FROM archive_monthly_summary a
+                WHERE a.type = 'expense' AND a.year * 12 + a.month - 1 BETWEEN ? AND ?
+            ) WHERE category_id IN (SELECT category_id FROM envelopes)
+            GROUP BY 1, 2
+        ),
+        series AS (
+            SELECT e.category_id, months.m, COALESCE(b.amount, 0.0) AS budgeted, COALESCE(s.amount, 0.0) AS actual
+            FROM envelopes e JOIN months ON months.m >= e.since_m
+            LEFT JOIN budgeted b ON b.category_id = e.category_id AND b.m = months.m
+            LEFT JOIN spent s ON s.category_id = e.category_id AND s.m = months.m
+        ),
+        running AS (
+            SELECT category_id, m, budgeted, actual,
+                   COALESCE(SUM(budgeted - actual) OVER (PARTITION BY category_id ORDER BY m
+                                                         ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0.0) AS carry_in
+            FROM series
+        )
+        SELECT category_id, m / 12 AS year, m % 12 + 1 AS month, budgeted, actual, carry_in
+        FROM running WHERE m >= ?
+        ORDER BY category_id, m
+    """, (start_index, last_index, last_index) + date_range + (start_index, last_index, first_index)).fetchall()
+    envelopes = {}
+    for row in rows:
+        envelopes.setdefault(row['category_id'], []).append({
+            'year': row['year'], 'month': row['month'], 'budgeted': row['budgeted'], 'actual': row['actual'],
+            'carry_in': row['carry_in'], 'available': row['budgeted'] + row['carry_in']
+        })
+    return envelopes
+
+def get_carry_forward(year, month, db=None):
+    """Amount carried into (year, month) per rollover category: {category_id: carry_in}."""
+    return {category_id: months[-1]['carry_in']
+            for category_id, months in get_envelopes((year, month), (year, month), db).items() if months}
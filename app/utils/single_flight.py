@@ -0,0 +1,107 @@
+# app/utils/single_flight.py
+# Request coalescing ("single flight") for expensive read-only computations.
+# Concurrent callers of the same function with the same arguments, against the same
+# data version, wait for one in-flight execution and share its result instead of
+# each running the same queries. Nothing is kept once the execution finishes;
+# this is not a cache.
+
+import copy
+import functools
+import threading
+from flask import current_app
+from app.utils.fragment_cache import get_table_versions
+
+_lock = threading.Lock()
+
+
+class _InFlightCall:
+    """One running execution that other callers can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.shared_result = None
+        self.error = None
+
+
+def _get_state():
+    return current_app.extensions.setdefault('single_flight', {'calls': {}, 'metrics': {}})
+
+def _run(name, key, compute):
+    """Runs compute() as the leader for key, or waits for the leader already running it."""
+    state = _get_state()
+    with _lock:
+        metrics = state['metrics'].setdefault(name, {'calls': 0, 'executions': 0, 'coalesced': 0, 'timeouts': 0})
+        metrics['calls'] += 1
+        call = state['calls'].get(key)
+        is_leader = call is None
+        if is_leader:
+            call = state['calls'][key] = _InFlightCall()
+            metrics['executions'] += 1
+        else:
+            call.waiters += 1
+            metrics['coalesced'] += 1
+
+    if is_leader:
+        result = None
+        try:
+            result = compute()
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with _lock:
+                del state['calls'][key] # Later callers start a new execution
+            if call.waiters and call.error is None:
+                # Callers may mutate what they get back, so waiters share a snapshot taken before the leader returns
+                call.shared_result = copy.deepcopy(result)
+            call.done.set()
+
+    if not call.done.wait(current_app.config.get('SINGLE_FLIGHT_WAIT_SECONDS', 30)):
+        with _lock:
+            metrics['timeouts'] += 1
+        return compute()
+    if call.error is not None:
+        raise call.error
+    return copy.deepcopy(call.shared_result)
+
+def coalesced(tables):
+    """
+    Decorator: coalesces concurrent identical calls of a function whose result depends
+    only on its arguments and the data in `tables` (keyed by their table_versions).
+    Calls with unhashable arguments, or with SINGLE_FLIGHT_ENABLED off, run directly.
+    """
+    tables = tuple(tables)
+
+    def decorator(func):
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('SINGLE_FLIGHT_ENABLED', True):
+                return func(*args, **kwargs)
+            versions = get_table_versions(tables)
+            key = (name, args, tuple(sorted(kwargs.items())), tuple(versions.get(t) for t in tables))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            return _run(name, key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
+
+def get_metrics():
+    """
+    Per-process coalescing counters, per function and in total. hit_rate is the share of
+    calls that were served by another caller's execution.
+    """
+    with _lock:
+        per_function = {name: dict(m) for name, m in _get_state()['metrics'].items()}
+    totals = {'calls': 0, 'executions': 0, 'coalesced': 0, 'timeouts': 0}
+    for metrics in per_function.values():
+        for field in totals:
+            totals[field] += metrics[field]
+        metrics['hit_rate'] = metrics['coalesced'] / metrics['calls'] if metrics['calls'] else 0.0
+    totals['hit_rate'] = totals['coalesced'] / totals['calls'] if totals['calls'] else 0.0
+    return {'totals': totals, 'functions': per_function}
@@ -0,0 +1,87 @@
+# app/utils/splits.py
+# Split transactions. The transactions row stays the ledger entry (amount, date, type,
+# currency); transaction_splits lines spread its amount over several categories.
+# Per-category aggregates read "transaction lines" (the split lines of a split
+# transaction, the whole row of any other) from one LEFT JOIN, so splits are summed in
+# the same grouped query as unsplit transactions.
+
+from app.database import get_db
+from app.utils.sql_fragments import transaction_lines_sql # Shared with init_db.py; used as splits.transaction_lines_sql
+
+SPLIT_TOLERANCE = 0.005 # Lines must add up to the parent amount to within half a cent
+
+def get_splits(transaction_id, db=None):
+    """A transaction's split lines (largest first) with category names; empty if it is not split."""
+    db = db or get_db()
+    rows = db.execute("""
+        SELECT s.id, s.category_id, s.amount, s.description, c.name AS category_name, p.name AS parent_category_name
+        FROM transaction_splits s LEFT JOIN categories c ON c.id = s.category_id
+        LEFT JOIN categories p ON p.id = c.parent_id
+        WHERE s.transaction_id = ? ORDER BY s.amount DESC, s.id
+    """, (transaction_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+def validate_splits(lines, parent_amount, db=None):
+    """
+    Checks split lines before they replace a transaction's current ones.
+    Args:
+        lines (list): Dicts with category_id, amount and optional description.
+        parent_amount (float): The transaction's amount, which the lines must add up to.
+    Returns:
+        tuple: (cleaned lines, error message or None). An empty list un-splits the transaction.
+    """
+    if not lines:
+        return [], None
+    if len(lines) < 2:
+        return None, 'A split needs at least two lines (send no lines to remove the split).'
+    db = db or get_db()
+    valid_category_ids = {row['id'] for row in db.execute("SELECT id FROM categories").fetchall()}
+    cleaned = []
+    for number, line in enumerate(lines, start=1):
+        try:
+            category_id = int(line.get('category_id'))
+            amount = round(float(line.get('amount')), 2)
+        except (TypeError, ValueError):
+            return None, f"Line {number}: category_id and amount must be numbers."
+        if category_id not in valid_category_ids:
+            return None, f"Line {number}: category {category_id} does not exist."
+        if amount <= 0:
+            return None, f"Line {number}: amount must be positive."
+        cleaned.append({'category_id': category_id, 'amount': amount,
+                        'description': (line.get('description') or '').strip() or None})
+    total = sum(line['amount'] for line in cleaned)
+    if abs(total - parent_amount) > SPLIT_TOLERANCE:
+        return None, f"Split lines add up to {total:.2f}, but the transaction amount is {parent_amount:.2f}."
+    return cleaned, None
+
+def set_splits(transaction_id, lines, db=None):
+    """
+    Replaces a transaction's split lines with validated lines (see validate_splits) and
+    commits. The parent's category becomes the largest line's, so single-category views
+    still show something sensible. The NWS rollup follows through its triggers.
+    Returns:
+        bool: False if the transaction does not exist.
+    """
+    from app.utils import analytics_cube, forecasting # Both aggregate through transaction_lines_sql
+    db = db or get_db()
+    parent = db.execute("SELECT date FROM transactions WHERE id = ?", (transaction_id,)).fetchone()
+    if parent is None:
+        return False
+    try:
+        db.execute("DELETE FROM transaction_splits WHERE transaction_id = ?", (transaction_id,))
+        if lines:
+            db.executemany("INSERT INTO transaction_splits (transaction_id, category_id, amount, description) VALUES (?, ?, ?, ?)",
+                           [(transaction_id, line['category_id'], line['amount'], line['description']) for line in lines])
+            primary = max(lines, key=lambda line: line['amount'])
+            db.execute("UPDATE transactions SET category_id = ? WHERE id = ?", (primary['category_id'], transaction_id))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    analytics_cube.invalidate_cube()
+    forecasting.record_transaction_change(parent['date'])
+    return True
+
+def is_split(transaction_id, db=None):
+    db = db or get_db()
+    return db.execute("SELECT 1 FROM transaction_splits WHERE transaction_id = ? LIMIT 1", (transaction_id,)).fetchone() is not None
@@ -0,0 +1,76 @@
+# app/utils/sql_fragments.py
+# SQL builders shared by init_db.py (schema, triggers, first population of the rollups)
+# and the app modules that query or rebuild the same tables. Plain strings only: no Flask
+# or database imports, so init_db.py can use it without an application context.
+
+def rate_lookup_sql(currency_expr, date_expr):
+    """
+    SQL expression for the rate of currency_expr on date_expr: the latest rate on or before
+    the date, else the earliest one after it, else 1. Both lookups are searches of the
+    fx_rates primary key. Expressions must be qualified (e.g. 't.currency'), since an
+    unqualified column would resolve to fx_rates inside the subqueries.
+    """
+    return (f"COALESCE((SELECT fx.rate FROM fx_rates fx WHERE fx.currency = {currency_expr} AND fx.rate_date <= {date_expr} "
+            f"ORDER BY fx.rate_date DESC LIMIT 1), "
+            f"(SELECT fx.rate FROM fx_rates fx WHERE fx.currency = {currency_expr} ORDER BY fx.rate_date LIMIT 1), 1.0)")
+
+def convert_sql(amount_expr, currency_expr, date_expr):
+    """SQL expression converting amount_expr, in currency_expr, to the reporting currency (NULL means it already is)."""
+    return (f"(CASE WHEN {currency_expr} IS NULL THEN {amount_expr} "
+            f"ELSE {amount_expr} * {rate_lookup_sql(currency_expr, date_expr)} END)")
+
+def amount_sql(row='t', amount_column='amount', date_expr=None):
+    """
+    SQL expression for a row's amount in the reporting currency.
+    Args:
+        row (str): Table name or alias of the transactions / budget_goals row.
+        amount_column (str): 'amount' for transactions, 'budgeted_amount' for budgets.
+        date_expr (str): Date the rate applies to (default: the row's date column).
+    """
+    return convert_sql(f"{row}.{amount_column}", f"{row}.currency", date_expr or f"{row}.date")
+
+def budget_amount_sql(row='b'):
+    """amount_sql for budget_goals rows; the rate is taken on the first day of the budget month."""
+    return amount_sql(row, 'budgeted_amount', f"printf('%04d-%02d-01', {row}.year, {row}.month)")
+
+def transaction_lines_sql(transactions='transactions', splits='transaction_splits'):
+    """
+    Subquery yielding one row per category line: transaction_id, date, type, currency,
+    category_id and amount (in the transaction's currency, so amount_sql applies).
+    A split transaction yields its split lines, any other its whole row.
+    """
+    return f"""
+        SELECT t.id AS transaction_id, t.date, t.type, t.currency,
+               CASE WHEN s.id IS NULL THEN t.category_id ELSE s.category_id END AS category_id,
+               CASE WHEN s.id IS NULL THEN t.amount ELSE s.amount END AS amount
+        FROM {transactions} t LEFT JOIN {splits} s ON s.transaction_id = t.id
+    """
+
+# Recomputes every nws_monthly_rollup row from scratch (live and archived transactions, budget_goals)
+NWS_ROLLUP_REBUILD_SQL = f"""
+    INSERT INTO nws_monthly_rollup (year, month, goal_type, actual_amount, budgeted_amount)
+    SELECT year, month, goal_type, SUM(actual_amount), SUM(budgeted_amount) FROM (
+        SELECT CAST(strftime('%Y', l.date) AS INTEGER) AS year, CAST(strftime('%m', l.date) AS INTEGER) AS month,
+               COALESCE(c.financial_goal_type, 'Unclassified') AS goal_type, {amount_sql('l')} AS actual_amount, 0 AS budgeted_amount
+        FROM ({transaction_lines_sql()}) l JOIN categories c ON c.id = l.category_id
+        WHERE l.type = 'expense' AND strftime('%Y', l.date) IS NOT NULL
+        UNION ALL
+        SELECT b.year, b.month, COALESCE(c.financial_goal_type, 'Unclassified'), 0, {budget_amount_sql('b')}
+        FROM budget_goals b JOIN categories c ON c.id = b.category_id
+        UNION ALL
+        SELECT a.year, a.month, COALESCE(c.financial_goal_type, 'Unclassified'), a.amount, 0
+        FROM archive_monthly_summary a JOIN categories c ON c.id = a.category_id
+        WHERE a.type = 'expense'
+    )
+    GROUP BY year, month, goal_type
+"""
+
+# Recomputes every monthly_cash_flow row from scratch (live transactions only)
+CASH_FLOW_REBUILD_SQL = f"""
+    INSERT INTO monthly_cash_flow (year, month, income, expense)
+    SELECT CAST(strftime('%Y', t.date) AS INTEGER), CAST(strftime('%m', t.date) AS INTEGER),
+           SUM(CASE WHEN t.type = 'income' THEN {amount_sql('t')} ELSE 0 END),
+           SUM(CASE WHEN t.type = 'expense' THEN {amount_sql('t')} ELSE 0 END)
+    FROM transactions t WHERE strftime('%Y', t.date) IS NOT NULL
+    GROUP BY 1, 2
+"""
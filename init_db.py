@@ -1,5 +1,43 @@
 import sqlite3
 import os
+from app.utils.sql_fragments import (NWS_ROLLUP_REBUILD_SQL, CASH_FLOW_REBUILD_SQL, convert_sql,
+                                     amount_sql, budget_amount_sql)
+from app.utils.duplicates import transaction_fingerprint
+
+# Default category hierarchy (indentation marks subcategories)
+DEFAULT_CATEGORY_LIST = """
+Housing
+    Rent/Mortgage
+    Property Taxes
+Food
+    Groceries
+    Dining out
+Transportation
+    Gas
+    Car Insurance
+Savings
+    Emergency Fund
+    401k
+    HSA
+Utilities
+    Electricity
+    Internet
+Personal Care
+    Haircut
+    Toiletries
+Entertainment
+    Movies
+    Concerts
+Debt Payments
+    Student Loan
+    Credit Card
+Miscellaneous
+    Gifts
+    Donations
+System
+    Goal Contributions
+    Goal Withdrawals
+    """
 
 def parse_categories(category_list_str):
     """
@@ -34,22 +72,301 @@ def parse_categories(category_list_str):
                 main_category_indent = indentation
     return parsed
 
-def initialize_database(custom_categories_str=None):
+def _nws_upsert_sql(year_expr, month_expr, goal_type_expr, actual_expr, budgeted_expr, condition, from_clause=""):
+    """Builds an upsert that adds amounts to one nws_monthly_rollup bucket."""
+    return f"""
+        INSERT INTO nws_monthly_rollup (year, month, goal_type, actual_amount, budgeted_amount)
+        SELECT {year_expr}, {month_expr}, COALESCE({goal_type_expr}, 'Unclassified'), {actual_expr}, {budgeted_expr}
+        {from_clause}
+        WHERE {condition}
+        ON CONFLICT (year, month, goal_type) DO UPDATE SET
+            actual_amount = actual_amount + excluded.actual_amount,
+            budgeted_amount = budgeted_amount + excluded.budgeted_amount;
+    """
+
+NWS_TRIGGERS = ('trg_nws_transactions_insert', 'trg_nws_transactions_delete', 'trg_nws_transactions_update',
+                'trg_nws_budget_goals_insert', 'trg_nws_budget_goals_delete', 'trg_nws_budget_goals_update',
+                'trg_nws_categories_goal_type', 'trg_nws_transaction_splits_insert', 'trg_nws_transaction_splits_delete',
+                'trg_nws_transaction_splits_update')
+
+def create_nws_rollup(cursor):
+    """
+    Creates the nws_monthly_rollup table (expense actuals and budgets per month and
+    financial_goal_type) plus the triggers that keep it in step with transactions, their
+    split lines, budget_goals and categories. A split transaction counts through its lines,
+    any other through its own category. Populates it from existing data when first created.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS nws_monthly_rollup (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            goal_type TEXT NOT NULL,       -- 'Need', 'Want', 'Saving' or 'Unclassified'
+            actual_amount REAL NOT NULL DEFAULT 0,
+            budgeted_amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month, goal_type)
+        )
+    ''')
+    print("'nws_monthly_rollup' table checked/created.")
+
+    txn_year = "CAST(strftime('%Y', {row}.date) AS INTEGER)"
+    txn_month = "CAST(strftime('%m', {row}.date) AS INTEGER)"
+    txn_goal_type = "(SELECT financial_goal_type FROM categories WHERE id = {row}.category_id)"
+    txn_condition = "{row}.type = 'expense' AND {row}.category_id IS NOT NULL AND strftime('%Y', {row}.date) IS NOT NULL"
+
+    not_split = "NOT EXISTS (SELECT 1 FROM transaction_splits s WHERE s.transaction_id = {row}.id)"
+
+    def txn_upsert(row, sign):
+        """The whole transaction, unless it is split."""
+        return _nws_upsert_sql(txn_year.format(row=row), txn_month.format(row=row), txn_goal_type.format(row=row),
+                               f"{sign}{amount_sql(row)}", "0",
+                               f"{txn_condition.format(row=row)} AND {not_split.format(row=row)}")
+
+    def txn_split_lines_upsert(row, sign):
+        """All split lines of a transaction (none for an unsplit one)."""
+        return _nws_upsert_sql(txn_year.format(row=row), txn_month.format(row=row), "c.financial_goal_type",
+                               f"{sign}SUM({convert_sql('s.amount', f'{row}.currency', f'{row}.date')})", "0",
+                               f"s.transaction_id = {row}.id AND {row}.type = 'expense' AND strftime('%Y', {row}.date) IS NOT NULL GROUP BY 3",
+                               "FROM transaction_splits s JOIN categories c ON c.id = s.category_id")
+
+    def split_line_upsert(row, sign):
+        """One split line, dated and typed by its parent transaction."""
+        return _nws_upsert_sql(txn_year.format(row='t'), txn_month.format(row='t'),
+                               f"(SELECT financial_goal_type FROM categories WHERE id = {row}.category_id)",
+                               f"{sign}{convert_sql(f'{row}.amount', 't.currency', 't.date')}", "0",
+                               f"t.id = {row}.transaction_id AND t.type = 'expense' AND {row}.category_id IS NOT NULL AND strftime('%Y', t.date) IS NOT NULL",
+                               "FROM transactions t")
+
+    def parent_upsert(row, sign, remaining_splits):
+        """The split line's whole parent transaction, when the line is its first (or last) one."""
+        return _nws_upsert_sql(txn_year.format(row='t'), txn_month.format(row='t'), txn_goal_type.format(row='t'),
+                               f"{sign}{amount_sql('t')}", "0",
+                               f"t.id = {row}.transaction_id AND {txn_condition.format(row='t')} "
+                               f"AND (SELECT COUNT(*) FROM transaction_splits WHERE transaction_id = {row}.transaction_id) = {remaining_splits}",
+                               "FROM transactions t")
+
+    def budget_upsert(row, sign):
+        return _nws_upsert_sql(f"{row}.year", f"{row}.month",
+                               f"(SELECT financial_goal_type FROM categories WHERE id = {row}.category_id)",
+                               "0", f"{sign}{budget_amount_sql(row)}", "1")
+
+    triggers = {
+        'trg_nws_transactions_insert': f"AFTER INSERT ON transactions BEGIN {txn_upsert('NEW', '')} END",
+        # Split lines are already gone here (trg_transactions_delete_splits runs before the delete)
+        'trg_nws_transactions_delete': f"AFTER DELETE ON transactions BEGIN {txn_upsert('OLD', '-')} END",
+        'trg_nws_transactions_update': f"""AFTER UPDATE OF amount, category_id, date, type, currency ON transactions BEGIN
+            {txn_upsert('OLD', '-')} {txn_split_lines_upsert('OLD', '-')} {txn_upsert('NEW', '')} {txn_split_lines_upsert('NEW', '')} END""",
+        # The first split line replaces the whole transaction; removing the last one restores it
+        'trg_nws_transaction_splits_insert': f"AFTER INSERT ON transaction_splits BEGIN {parent_upsert('NEW', '-', 1)} {split_line_upsert('NEW', '')} END",
+        'trg_nws_transaction_splits_delete': f"AFTER DELETE ON transaction_splits BEGIN {split_line_upsert('OLD', '-')} {parent_upsert('OLD', '', 0)} END",
+        'trg_nws_transaction_splits_update': f"AFTER UPDATE OF amount, category_id ON transaction_splits BEGIN {split_line_upsert('OLD', '-')} {split_line_upsert('NEW', '')} END",
+        'trg_nws_budget_goals_insert': f"AFTER INSERT ON budget_goals BEGIN {budget_upsert('NEW', '')} END",
+        'trg_nws_budget_goals_delete': f"AFTER DELETE ON budget_goals BEGIN {budget_upsert('OLD', '-')} END",
+        'trg_nws_budget_goals_update': f"AFTER UPDATE OF budgeted_amount, category_id, year, month, currency ON budget_goals BEGIN {budget_upsert('OLD', '-')} {budget_upsert('NEW', '')} END",
+        # Re-classifying a category moves its whole history from the old bucket to the new one
+        'trg_nws_categories_goal_type': f"""AFTER UPDATE OF financial_goal_type ON categories
+            WHEN OLD.financial_goal_type IS NOT NEW.financial_goal_type BEGIN
+            {_nws_upsert_sql("CAST(strftime('%Y', date) AS INTEGER)", "CAST(strftime('%m', date) AS INTEGER)", "OLD.financial_goal_type",
+                             f"-SUM({amount_sql('transactions')})", "0",
+                             f"category_id = OLD.id AND type = 'expense' AND strftime('%Y', date) IS NOT NULL AND {not_split.format(row='transactions')} GROUP BY 1, 2",
+                             "FROM transactions")}
+            {_nws_upsert_sql("CAST(strftime('%Y', date) AS INTEGER)", "CAST(strftime('%m', date) AS INTEGER)", "NEW.financial_goal_type",
+                             f"SUM({amount_sql('transactions')})", "0",
+                             f"category_id = NEW.id AND type = 'expense' AND strftime('%Y', date) IS NOT NULL AND {not_split.format(row='transactions')} GROUP BY 1, 2",
+                             "FROM transactions")}
+            {_nws_upsert_sql("CAST(strftime('%Y', t.date) AS INTEGER)", "CAST(strftime('%m', t.date) AS INTEGER)", "OLD.financial_goal_type",
+                             f"-SUM({convert_sql('s.amount', 't.currency', 't.date')})", "0",
+                             "s.category_id = OLD.id AND t.type = 'expense' AND strftime('%Y', t.date) IS NOT NULL GROUP BY 1, 2",
+                             "FROM transaction_splits s JOIN transactions t ON t.id = s.transaction_id")}
+            {_nws_upsert_sql("CAST(strftime('%Y', t.date) AS INTEGER)", "CAST(strftime('%m', t.date) AS INTEGER)", "NEW.financial_goal_type",
+                             f"SUM({convert_sql('s.amount', 't.currency', 't.date')})", "0",
+                             "s.category_id = NEW.id AND t.type = 'expense' AND strftime('%Y', t.date) IS NOT NULL GROUP BY 1, 2",
+                             "FROM transaction_splits s JOIN transactions t ON t.id = s.transaction_id")}
+            {_nws_upsert_sql("year", "month", "OLD.financial_goal_type", "0", f"-SUM({budget_amount_sql('budget_goals')})", "category_id = OLD.id GROUP BY 1, 2", "FROM budget_goals")}
+            {_nws_upsert_sql("year", "month", "NEW.financial_goal_type", "0", f"SUM({budget_amount_sql('budget_goals')})", "category_id = NEW.id GROUP BY 1, 2", "FROM budget_goals")}
+            END""",
+    }
+    for trigger_name, trigger_body in triggers.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger_name} {trigger_body}")
+    print("NWS rollup triggers checked/created.")
+
+    cursor.execute("SELECT COUNT(*) FROM nws_monthly_rollup")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(NWS_ROLLUP_REBUILD_SQL)
+        print("'nws_monthly_rollup' populated from existing transactions and budget goals.")
+
+def _cash_flow_upsert_sql(row, sign):
+    """Builds an upsert that adds one transaction to its monthly_cash_flow month."""
+    amount = amount_sql(row)
+    return f"""
+        INSERT INTO monthly_cash_flow (year, month, income, expense)
+        SELECT CAST(strftime('%Y', {row}.date) AS INTEGER), CAST(strftime('%m', {row}.date) AS INTEGER),
+               CASE WHEN {row}.type = 'income' THEN {sign}{amount} ELSE 0 END,
+               CASE WHEN {row}.type = 'expense' THEN {sign}{amount} ELSE 0 END
+        WHERE strftime('%Y', {row}.date) IS NOT NULL
+        ON CONFLICT (year, month) DO UPDATE SET
+            income = income + excluded.income,
+            expense = expense + excluded.expense;
+    """
+
+def create_cash_flow_rollup(cursor):
+    """
+    Creates the monthly_cash_flow table (income and expenses per month, in the reporting
+    currency) plus the triggers that keep it in step with transactions, so opening
+    balances never need earlier history. Archived months are read from
+    archive_monthly_summary instead. Populates it from existing transactions when first created.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_cash_flow (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            income REAL NOT NULL DEFAULT 0,
+            expense REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month)
+        )
+    ''')
+    print("'monthly_cash_flow' table checked/created.")
+    triggers = {
+        'trg_cash_flow_transactions_insert': f"AFTER INSERT ON transactions BEGIN {_cash_flow_upsert_sql('NEW', '')} END",
+        'trg_cash_flow_transactions_delete': f"AFTER DELETE ON transactions BEGIN {_cash_flow_upsert_sql('OLD', '-')} END",
+        'trg_cash_flow_transactions_update': f"""AFTER UPDATE OF amount, date, type, currency ON transactions BEGIN
+            {_cash_flow_upsert_sql('OLD', '-')} {_cash_flow_upsert_sql('NEW', '')} END""",
+    }
+    for trigger_name, trigger_body in triggers.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {trigger_name} {trigger_body}")
+    print("Cash flow rollup triggers checked/created.")
+
+    cursor.execute("SELECT COUNT(*) FROM monthly_cash_flow")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(CASH_FLOW_REBUILD_SQL)
+        print("'monthly_cash_flow' populated from existing transactions.")
+
+def backfill_fingerprints(cursor, chunk_size=5000):
+    """
+    Fills in transactions.fingerprint for rows written before the column existed (or by
+    other tools). This is schema migration rather than a data change, so the change-log and
+    version triggers for transaction updates are dropped first and re-created by
+    create_change_log / create_table_versions later in initialize_database. Sync clients
+    don't re-download every row, and cached views stay valid. Needs the currency column.
+    """
+    # Found through idx_transactions_fingerprint_date, so this is cheap when nothing is missing
+    if cursor.execute("SELECT 1 FROM transactions WHERE fingerprint IS NULL LIMIT 1").fetchone() is None:
+        return
+    cursor.execute("DROP TRIGGER IF EXISTS trg_change_log_transactions_update")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_version_transactions_update")
+    updated = 0
+    while True:
+        rows = cursor.execute("SELECT id, amount, type, description, currency FROM transactions WHERE fingerprint IS NULL LIMIT ?",
+                              (chunk_size,)).fetchall()
+        if not rows:
+            break
+        cursor.executemany("UPDATE transactions SET fingerprint = ? WHERE id = ?",
+                           [(transaction_fingerprint(amount, txn_type, description, currency), txn_id)
+                            for txn_id, amount, txn_type, description, currency in rows])
+        updated += len(rows)
+    print(f"Filled in duplicate-check fingerprints for {updated} existing transactions.")
+
+# Tables whose writes bump table_versions
+VERSIONED_TABLES = ('transactions', 'categories', 'budget_goals', 'goals', 'paychecks', 'paycheck_deductions',
+                    'categorization_rules', 'fx_rates', 'transaction_splits')
+
+def create_table_versions(cursor):
+    """
+    Creates the table_versions table (one counter per tracked table) and the
+    triggers that increment a table's counter on every insert, update or delete.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in VERSIONED_TABLES:
+        cursor.execute("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (table,))
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{op.lower()} AFTER {op} ON {table}
+                BEGIN UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}'; END
+            """)
+    print("'table_versions' table and triggers checked/created.")
+
+# Tables whose row changes are appended to change_log
+CHANGE_LOG_TABLES = ('transactions', 'budget_goals', 'categories', 'goals', 'paychecks', 'transaction_splits')
+
+def create_change_log(cursor):
+    """
+    Creates the change_log table (one compact row per inserted, updated or deleted row of
+    CHANGE_LOG_TABLES, ordered by a never-reused sequence number) and its triggers.
+    change_log_meta records how far the log has been truncated by compaction.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, -- Monotonic; AUTOINCREMENT never reuses values
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK(op IN ('I', 'U', 'D')),
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_table_row ON change_log (table_name, row_id)")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO change_log_meta (key, value) VALUES ('truncated_through', 0)")
+    for table in CHANGE_LOG_TABLES:
+        for op, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_{op.lower()} AFTER {op} ON {table}
+                BEGIN INSERT INTO change_log (table_name, row_id, op) VALUES ('{table}', {row}.id, '{op[0]}'); END
+            """)
+    print("'change_log' table and triggers checked/created.")
+
+def create_archive_tables(cursor):
+    """
+    Creates the live-database side of year archiving: archived_years (one row per year
+    moved, or being moved, to the archive file) and archive_monthly_summary (archived
+    amounts per month, category and type, so totals never need the archive file).
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_years (
+            year INTEGER PRIMARY KEY,
+            transaction_count INTEGER NOT NULL DEFAULT 0,
+            completed_at TIMESTAMP -- NULL while the year is being archived
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archive_monthly_summary (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            category_id INTEGER, -- NULL for uncategorized
+            type TEXT NOT NULL CHECK(type IN ('income', 'expense')),
+            amount REAL NOT NULL DEFAULT 0,
+            transaction_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_archive_monthly_summary_period ON archive_monthly_summary (year, month, category_id)")
+    print("Archive tables checked/created.")
+
+def initialize_database(custom_categories_str=None, db_path=None):
     """
     Initializes the database with tables for categories, transactions, 
     budget goals, paychecks, paycheck deductions, and financial goals.
-    Ensures database is created in the 'instance' folder within the project directory.
+    Ensures database is created in the 'instance' folder within the project directory,
+    unless db_path is given (e.g. a scratch database for tooling).
     """
-    # Corrected path: Assumes init_db.py is in the project root.
-    # The instance folder will be created at Project_Root/instance/
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    instance_folder_path = os.path.join(project_root, 'instance')
+    if db_path is None:
+        # Corrected path: Assumes init_db.py is in the project root.
+        # The instance folder will be created at Project_Root/instance/
+        project_root = os.path.dirname(os.path.abspath(__file__))
+        instance_folder_path = os.path.join(project_root, 'instance')
 
-    if not os.path.exists(instance_folder_path):
-        os.makedirs(instance_folder_path)
-        print(f"Created instance folder at: {instance_folder_path}")
+        if not os.path.exists(instance_folder_path):
+            os.makedirs(instance_folder_path)
+            print(f"Created instance folder at: {instance_folder_path}")
 
-    db_path = os.path.join(instance_folder_path, 'budget.db')
+        db_path = os.path.join(instance_folder_path, 'budget.db')
     print(f"Initializing database at: {db_path}")
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
@@ -79,6 +396,16 @@ def initialize_database(custom_categories_str=None):
         else:
             # Log other operational errors if they occur
             print(f"Could not add 'financial_goal_type' (may already exist or other issue): {e}")
+    try:
+        # Envelope budgeting: first month whose leftover budget carries forward ('YYYY-MM-01'); NULL = no rollover
+        cursor.execute("ALTER TABLE categories ADD COLUMN rollover_since TEXT")
+        print("Added 'rollover_since' column to 'categories' table.")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e).lower():
+            print("'rollover_since' column already exists in 'categories' table.")
+        else:
+            print(f"Could not add 'rollover_since' (may already exist or other issue): {e}")
 
 
     # Transactions Table
@@ -90,7 +417,11 @@ def initialize_database(custom_categories_str=None):
             date TEXT NOT NULL, 
             type TEXT NOT NULL CHECK(type IN ('income', 'expense')),
             description TEXT, 
-            FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE SET NULL
+            fingerprint TEXT, -- 'type|cents|normalized description' (app.utils.duplicates)
+            currency TEXT, -- ISO 4217 code; NULL means the reporting currency (app.utils.currency)
+            goal_id INTEGER, -- Goal funded by a Goal Contributions/Withdrawals transaction; NULL otherwise
+            FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE SET NULL,
+            FOREIGN KEY (goal_id) REFERENCES goals (id) ON DELETE SET NULL
         )
     ''')
     print("'transactions' table checked/created.")
@@ -103,6 +434,22 @@ def initialize_database(custom_categories_str=None):
             print("'description' column already exists in 'transactions' table.")
         else:
              print(f"Could not add 'description' column (may already exist or other issue): {e}")
+    try:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN fingerprint TEXT")
+        print("Added 'fingerprint' column to 'transactions' table (existing rows are filled in below).")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e).lower():
+            print("'fingerprint' column already exists in 'transactions' table.")
+        else:
+            print(f"Could not add 'fingerprint' column (may already exist or other issue): {e}")
+
+    # Indexes for date-range scans and per-category lookups on transactions
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_category_date ON transactions (category_id, date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_fingerprint_date ON transactions (fingerprint, date)") # Duplicate checks
+    print("Transaction indexes checked/created.")
+
 
 
     # Budget Goals Table (for monthly category budgets)
@@ -113,12 +460,67 @@ def initialize_database(custom_categories_str=None):
             year INTEGER NOT NULL,
             month INTEGER NOT NULL, 
             budgeted_amount REAL NOT NULL DEFAULT 0,
+            currency TEXT, -- ISO 4217 code; NULL means the reporting currency
             FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE, 
             UNIQUE (category_id, year, month) 
         )
     ''')
     print("'budget_goals' table checked/created.")
 
+    # --- Multi-currency: currency codes on transactions and budgets, local exchange rates ---
+    currency_columns_added = False
+    for table in ('transactions', 'budget_goals'):
+        try:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN currency TEXT")
+            print(f"Added 'currency' column to '{table}' table (existing rows are in the reporting currency).")
+            currency_columns_added = True
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            if "duplicate column name" in str(e).lower():
+                print(f"'currency' column already exists in '{table}' table.")
+            else:
+                print(f"Could not add 'currency' column to '{table}' (may already exist or other issue): {e}")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fx_rates (
+            currency TEXT NOT NULL,   -- ISO 4217 code
+            rate_date TEXT NOT NULL,  -- YYYY-MM-DD; a rate applies from this date until the next one
+            rate REAL NOT NULL CHECK(rate > 0), -- Units of the reporting currency per unit of currency
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (currency, rate_date)
+        )
+    ''')
+    print("'fx_rates' table checked/created.")
+    # Foreign-currency rows only (NULL is the common case), so the missing-rate check stays cheap
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_currency ON transactions (currency) WHERE currency IS NOT NULL")
+
+    # --- Split lines: one transaction spread over several categories ---
+    splits_table_existed = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transaction_splits'").fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_splits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL,
+            category_id INTEGER,
+            amount REAL NOT NULL CHECK(amount > 0), -- In the parent's currency; lines add up to the parent amount
+            description TEXT,
+            FOREIGN KEY (transaction_id) REFERENCES transactions (id) ON DELETE CASCADE,
+            FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE SET NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transaction_splits_transaction ON transaction_splits (transaction_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transaction_splits_category ON transaction_splits (category_id)")
+    # Lines go first, while their parent still exists, so their rollup triggers can read it
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_splits BEFORE DELETE ON transactions
+        BEGIN DELETE FROM transaction_splits WHERE transaction_id = OLD.id; END
+    """)
+    print("'transaction_splits' table checked/created.")
+
+    if currency_columns_added or not splits_table_existed:
+        # The rollup triggers predate currency conversion or split lines; drop them so they are recreated below
+        for trigger_name in NWS_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+
     # Paychecks Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS paychecks (
@@ -146,6 +548,12 @@ def initialize_database(custom_categories_str=None):
     ''')
     print("'paycheck_deductions' table checked/created.")
 
+    # Indexes for payroll analytics (date-range scans and per-paycheck deduction lookups)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_paychecks_pay_date ON paychecks (pay_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_paychecks_net_pay_transaction ON paychecks (net_pay_transaction_id)") # Is a transaction net pay?
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_paycheck_deductions_paycheck_id ON paycheck_deductions (paycheck_id, type, amount)")
+    print("Payroll indexes checked/created.")
+
     # --- NEW: Goals Table (for financial savings goals) ---
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS goals (
@@ -159,8 +567,89 @@ def initialize_database(custom_categories_str=None):
         )
     ''')
     print("'goals' table checked/created.")
+    try:
+        cursor.execute("ALTER TABLE transactions ADD COLUMN goal_id INTEGER REFERENCES goals (id) ON DELETE SET NULL")
+        print("Added 'goal_id' column to 'transactions' table.")
+        # Link existing funding transactions once, by the description suffix they were written with
+        cursor.execute('''
+            UPDATE transactions SET goal_id = (
+                SELECT g.id FROM goals g
+                WHERE substr(transactions.description, -length(g.name) - 8) = '(Goal: ' || g.name || ')'
+                   OR substr(transactions.description, -length(g.name) - 10) = 'for Goal: ' || g.name
+                ORDER BY length(g.name) DESC LIMIT 1
+            )
+            WHERE category_id IN (
+                SELECT c.id FROM categories c JOIN categories sys ON sys.id = c.parent_id
+                WHERE sys.name = 'System' AND sys.parent_id IS NULL AND c.name IN ('Goal Contributions', 'Goal Withdrawals')
+            )
+        ''')
+        print(f"Linked {cursor.rowcount} existing goal funding transactions to their goals.")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e).lower():
+            print("'goal_id' column already exists in 'transactions' table.")
+        else:
+            print(f"Could not add 'goal_id' column (may already exist or other issue): {e}")
+    # Funding history per goal (goal projections); most transactions have no goal
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_goal_date ON transactions (goal_id, date) WHERE goal_id IS NOT NULL")
+    # After the currency and goal_id migrations, whose changes are still recorded as usual
+    backfill_fingerprints(cursor)
+    conn.commit()
     # --- End New Goals Table ---
 
+    # --- Auto-categorization rules (compiled into one matcher by app.utils.categorizer) ---
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categorization_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id INTEGER NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 100, -- Lower wins when several rules match
+            description_contains TEXT,             -- Case-insensitive substring
+            description_regex TEXT,                -- Case-insensitive Python regex
+            min_amount REAL,                       -- Inclusive; NULL for no lower bound
+            max_amount REAL,                       -- Inclusive; NULL for no upper bound
+            type TEXT CHECK(type IN ('income', 'expense')), -- NULL matches both
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id) ON DELETE CASCADE
+        )
+    ''')
+    print("'categorization_rules' table checked/created.")
+
+    # --- Totals of transactions moved to the archive database (app.utils.archive) ---
+    create_archive_tables(cursor)
+
+    # --- Needs/Wants/Savings monthly rollup (maintained by triggers) ---
+    create_nws_rollup(cursor)
+
+    # --- Monthly income/expense totals for opening balances (maintained by triggers) ---
+    create_cash_flow_rollup(cursor)
+
+    # --- Per-table data versions (bumped by triggers, used to key cached fragments) ---
+    create_table_versions(cursor)
+
+    # --- Change data capture log (appended by triggers, consumed via app.utils.change_log) ---
+    create_change_log(cursor)
+
+    # --- Background report jobs (status, progress and result file per job) ---
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,            -- uuid4 hex
+            kind TEXT NOT NULL,             -- report name, e.g. 'yearly_summary'
+            params TEXT NOT NULL DEFAULT '{}', -- JSON
+            status TEXT NOT NULL DEFAULT 'queued' CHECK(status IN ('queued', 'running', 'succeeded', 'failed')),
+            progress REAL NOT NULL DEFAULT 0, -- 0.0 - 1.0
+            message TEXT,
+            result_path TEXT,               -- File under the report output folder
+            result_name TEXT,               -- Download file name
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP -- Heartbeat; stale queued/running jobs are marked failed
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+    print("'jobs' table checked/created.")
+
 
     # Populate categories if a custom list is provided and the table is empty
     cursor.execute("SELECT COUNT(*) FROM categories")
@@ -208,37 +697,4 @@ def initialize_database(custom_categories_str=None):
     print("Database initialization complete (with financial goals table).")
 
 if __name__ == '__main__':
-    user_category_list = """
-Housing
-    Rent/Mortgage
-    Property Taxes
-Food
-    Groceries
-    Dining out
-Transportation
-    Gas
-    Car Insurance
-Savings
-    Emergency Fund
-    401k
-    HSA
-Utilities
-    Electricity
-    Internet
-Personal Care
-    Haircut
-    Toiletries
-Entertainment
-    Movies
-    Concerts
-Debt Payments
-    Student Loan
-    Credit Card
-Miscellaneous
-    Gifts
-    Donations
-System
-    Goal Contributions
-    Goal Withdrawals
-    """
-    initialize_database(custom_categories_str=user_category_list)
+    initialize_database(custom_categories_str=DEFAULT_CATEGORY_LIST)
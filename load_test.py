@@ -0,0 +1,306 @@
+# load_test.py
+# Load-testing harness: replays a mix of dashboard reads and writes from concurrent
+# simulated users and reports throughput, latency percentiles and lock errors.
+#
+# In-process (default; runs against a scratch copy of the database):
+#     python load_test.py --concurrency 1,2,4,8 --duration 10
+# Against a running server (writes go to that server's database):
+#     python load_test.py --url http://127.0.0.1:5000
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import numpy as np
+
+LOCKED_MESSAGE = 'database is locked'
+
+# Relative weights of each simulated action
+DEFAULT_MIX = {
+    'dashboard': 50,
+    'add_transaction': 20,
+    'save_budget': 10,
+    'log_paycheck': 10,
+    'goal_contribution': 10,
+}
+
+
+# --- Clients: get/post returning (status_code, body_bytes) ---
+
+class InProcessClient:
+    """Drives the app through Flask's test client (one per simulated user)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_data()
+
+    def post(self, path, data=None, json_body=None):
+        response = self.client.post(path, data=data, json=json_body)
+        return response.status_code, response.get_data()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None # Report the 302 itself, like the in-process client
+
+
+class HttpClient:
+    """Drives a running server over HTTP (redirects are not followed)."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(_NoRedirect)
+
+    def _send(self, request):
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post(self, path, data=None, json_body=None):
+        if json_body is not None:
+            request = urllib.request.Request(self.base_url + path, data=json.dumps(json_body).encode(),
+                                             headers={'Content-Type': 'application/json'})
+        else:
+            request = urllib.request.Request(self.base_url + path, data=urllib.parse.urlencode(data or {}, doseq=True).encode())
+        return self._send(request)
+
+
+# --- Simulated actions ---
+
+def _random_date(rng):
+    today = datetime.date.today()
+    return (today - datetime.timedelta(days=rng.randint(0, 400))).isoformat()
+
+def action_dashboard(client, rng, fixtures):
+    today = datetime.date.today()
+    params = {'period_type': rng.choice(['monthly', 'monthly', 'yearly']),
+              'year': rng.choice([today.year, today.year - 1])}
+    if params['period_type'] == 'monthly':
+        params['month'] = rng.randint(1, 12)
+    if fixtures['main_category_ids'] and rng.random() < 0.3:
+        params['main_cat_focus'] = rng.choice(fixtures['main_category_ids'])
+    return client.get('/?' + urllib.parse.urlencode(params))
+
+def action_add_transaction(client, rng, fixtures):
+    return client.post('/transactions/add', data={
+        'amount': f"{rng.uniform(1, 250):.2f}",
+        'final_category_id': rng.choice(fixtures['category_ids']) if fixtures['category_ids'] else '',
+        'date': _random_date(rng),
+        'type': 'expense' if rng.random() < 0.85 else 'income',
+    })
+
+def action_save_budget(client, rng, fixtures):
+    today = datetime.date.today()
+    category_ids = rng.sample(fixtures['category_ids'], min(len(fixtures['category_ids']), 8))
+    return client.post('/budget/set', data={
+        'year': today.year, 'month': rng.randint(1, 12),
+        'budget_category_id': category_ids,
+        'budgeted_amount': [f"{rng.uniform(0, 800):.2f}" for _ in category_ids],
+    })
+
+def action_log_paycheck(client, rng, fixtures):
+    gross = rng.uniform(1500, 5000)
+    return client.post('/paychecks/log', json_body={
+        'pay_date': _random_date(rng), 'employer_name': 'Load Test Inc.', 'gross_pay': f"{gross:.2f}",
+        'deductions': [
+            {'description': 'Federal Income Tax', 'amount': f"{gross * 0.12:.2f}", 'type': 'TAX'},
+            {'description': '401k Contribution', 'amount': f"{gross * 0.05:.2f}", 'type': 'PRETAX_RETIREMENT'},
+        ],
+    })
+
+def action_goal_contribution(client, rng, fixtures):
+    if not fixtures['goal_ids']:
+        return action_dashboard(client, rng, fixtures)
+    return client.post(f"/goals/api/{rng.choice(fixtures['goal_ids'])}/contribute",
+                       data={'amount': f"{rng.uniform(5, 100):.2f}", 'date': datetime.date.today().isoformat()})
+
+ACTIONS = {
+    'dashboard': action_dashboard,
+    'add_transaction': action_add_transaction,
+    'save_budget': action_save_budget,
+    'log_paycheck': action_log_paycheck,
+    'goal_contribution': action_goal_contribution,
+}
+
+
+# --- Runner ---
+
+class LockedLogCounter(logging.Handler):
+    """Counts app log records mentioning a locked database (routes that catch errors still log them)."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        if LOCKED_MESSAGE in record.getMessage():
+            with self._lock:
+                self.count += 1
+
+def load_fixtures(client):
+    """Category and goal IDs to use in requests, from a full sync snapshot; creates a goal if none exist."""
+    status, body = client.get('/sync/api/changes?tables=categories,goals')
+    if status != 200:
+        raise SystemExit(f"Could not read categories/goals from the app (HTTP {status}).")
+    changes = json.loads(body)['changes']
+    categories = changes['categories']['upserted']
+    goal_ids = [g['id'] for g in changes['goals']['upserted'] if not g['is_completed']]
+    if not goal_ids:
+        client.post('/goals/api/create', data={'name': f"Load test goal {int(time.time())}", 'target_amount': '100000'})
+        status, body = client.get('/sync/api/changes?tables=goals')
+        goal_ids = [g['id'] for g in json.loads(body)['changes']['goals']['upserted']]
+    return {
+        'category_ids': [c['id'] for c in categories if c['parent_id'] is not None] or [c['id'] for c in categories],
+        'main_category_ids': [c['id'] for c in categories if c['parent_id'] is None],
+        'goal_ids': goal_ids,
+    }
+
+def run_level(make_client, concurrency, duration, mix, fixtures, seed):
+    """Runs `concurrency` simulated users for `duration` seconds. Returns a list of (action, seconds, status, locked)."""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = []
+    results_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def user(index):
+        rng = random.Random(seed * 1000 + index)
+        client = make_client()
+        local = []
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status, body = ACTIONS[name](client, rng, fixtures)
+                locked = LOCKED_MESSAGE.encode() in body
+            except Exception as e:
+                status, locked = 599, LOCKED_MESSAGE in str(e)
+            local.append((name, time.perf_counter() - started, status, locked))
+        with results_lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def summarize(results, duration, locked_from_logs=0):
+    latencies = np.array([r[1] for r in results]) * 1000 if results else np.zeros(1)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': len(results),
+        'throughput': len(results) / duration,
+        'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+        'errors': sum(1 for r in results if r[2] >= 500),
+        'locked': max(sum(1 for r in results if r[3]), locked_from_logs),
+        'by_action': {name: (len(group), float(np.percentile(np.array(group) * 1000, 95)))
+                      for name in {r[0] for r in results}
+                      for group in [[r[1] for r in results if r[0] == name]]},
+    }
+
+def read_coalescing_totals(client):
+    """Single-flight counters from the app (None if the endpoint is unavailable)."""
+    try:
+        status, body = client.get('/analytics/api/coalescing')
+        return json.loads(body)['totals'] if status == 200 else None
+    except (ValueError, KeyError, OSError):
+        return None
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for part in text.split(','):
+            name, _, weight = part.partition('=')
+            if name.strip() not in ACTIONS:
+                raise SystemExit(f"Unknown action '{name.strip()}'. Available: {', '.join(ACTIONS)}")
+            mix[name.strip()] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate concurrent dashboard users and report latency and lock errors.')
+    parser.add_argument('--url', help='Base URL of a running server. Omit to run in-process.')
+    parser.add_argument('--database', help='In-process only: database to copy for the run (default: instance/budget.db).')
+    parser.add_argument('--in-place', action='store_true', help='In-process only: write to --database itself instead of a scratch copy.')
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help='Comma-separated concurrency levels (default: 1,2,4,8,16).')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per concurrency level (default: 10).')
+    parser.add_argument('--mix', help="Override action weights, e.g. 'dashboard=80,add_transaction=20'.")
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1).')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+    mix = parse_mix(args.mix)
+    scratch_dir = None
+    locked_counter = None
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        target = args.url
+    else:
+        from app import create_app
+        database = args.database or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'budget.db')
+        if not os.path.exists(database):
+            raise SystemExit(f"Database not found: {database} (run init_db.py first).")
+        if not args.in_place:
+            scratch_dir = tempfile.mkdtemp(prefix='budget-load-test-')
+            scratch = os.path.join(scratch_dir, 'budget.db')
+            source, copy = sqlite3.connect(database), sqlite3.connect(scratch)
+            source.backup(copy)
+            source.close()
+            copy.close()
+            database = scratch
+        app = create_app({'DATABASE': database, 'JINJA_BYTECODE_CACHE_DIR': None})
+        app.logger.setLevel(logging.WARNING) # Keep per-request info logging out of the timings
+        locked_counter = LockedLogCounter()
+        app.logger.addHandler(locked_counter)
+        make_client = lambda: InProcessClient(app)
+        target = f"in-process ({database})"
+
+    try:
+        fixtures = load_fixtures(make_client())
+        print(f"Target: {target}")
+        print(f"Mix: {', '.join(f'{name}={weight:g}' for name, weight in mix.items())}; {args.duration:g} s per level\n")
+        print(f"{'users':>5} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'5xx':>5} {'locked':>7} {'coalesced':>10}")
+        metrics_client = make_client()
+        for concurrency in levels:
+            locked_before = locked_counter.count if locked_counter else 0
+            coalescing_before = read_coalescing_totals(metrics_client)
+            results = run_level(make_client, concurrency, args.duration, mix, fixtures, args.seed)
+            stats = summarize(results, args.duration, (locked_counter.count - locked_before) if locked_counter else 0)
+            # Share of summary/category loads served by another request's in-flight execution
+            # (per server process, so only indicative against a multi-process server)
+            coalescing_after = read_coalescing_totals(metrics_client)
+            coalesced = 'n/a'
+            if coalescing_before and coalescing_after and coalescing_after['calls'] > coalescing_before['calls']:
+                calls = coalescing_after['calls'] - coalescing_before['calls']
+                coalesced = f"{(coalescing_after['coalesced'] - coalescing_before['coalesced']) / calls:.1%}"
+            print(f"{concurrency:>5} {stats['requests']:>9} {stats['throughput']:>8.1f} {stats['p50_ms']:>8.1f} "
+                  f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['errors']:>5} {stats['locked']:>7} {coalesced:>10}")
+            for name, (count, p95) in sorted(stats['by_action'].items()):
+                print(f"{'':>5}   {name:<18} {count:>6} requests, p95 {p95:.1f} ms")
+    finally:
+        if scratch_dir:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+# query_plan_check.py
+# Query-plan regression check. Seeds a large scratch database, drives the app's
+# endpoints in-process while recording every SQL statement they run, then checks each
+# statement's EXPLAIN QUERY PLAN and work (SQLite VM steps) against a recorded baseline.
+#
+#     python query_plan_check.py                    # exit status 1 on regressions
+#     python query_plan_check.py --update-baseline  # accept the current plans
+#
+# Rules:
+#   * Statements issued by hot-path endpoints must not SCAN transactions, unless the
+#     baseline records that scan as known (allowed_scan), e.g. the full history list.
+#   * A statement must not start scanning a table its baseline plan searched by index.
+#   * A SELECT must not need more than (1 + tolerance) x its baseline VM steps.
+# Plans depend on the SQLite version; refresh the baseline when upgrading SQLite.
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import shutil
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(PROJECT_ROOT, 'query_plan_baseline.json')
+DEFAULT_ROWS = 50000
+VM_STEP_GRANULARITY = 100 # Progress handler interval (VM instructions)
+
+SKIP_PREFIXES = ('--', 'BEGIN', 'COMMIT', 'ROLLBACK', 'PRAGMA', 'SAVEPOINT', 'RELEASE', 'CREATE', 'DROP')
+SQL_KEYWORDS = {'WHERE', 'JOIN', 'LEFT', 'INNER', 'ON', 'GROUP', 'ORDER', 'LIMIT', 'SET', 'VALUES', 'AND', 'OR',
+                'UNION', 'WHEN', 'THEN', 'ELSE', 'END', 'AS'}
+
+
+# --- Seeding ---
+
+def seed_database(db_path, rows, seed):
+    """Creates a scratch database with `rows` transactions spread over the last three years."""
+    import init_db
+    from app.utils.duplicates import transaction_fingerprint
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db.initialize_database(init_db.DEFAULT_CATEGORY_LIST, db_path=db_path)
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    categories = conn.execute("SELECT id, parent_id, name FROM categories").fetchall()
+    sub_ids = [c[0] for c in categories if c[1] is not None]
+    today = datetime.date.today()
+    start = datetime.date(today.year - 2, 1, 1)
+    span_days = (today - start).days
+
+    with conn:
+        seeded = [(round(rng.uniform(2, 400), 2), rng.choice(sub_ids),
+                   (start + datetime.timedelta(days=rng.randint(0, span_days))).isoformat(),
+                   'expense' if rng.random() < 0.9 else 'income', f"Seed {i}") for i in range(rows)]
+        conn.executemany(
+            "INSERT INTO transactions (amount, category_id, date, type, description, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+            [row + (transaction_fingerprint(row[0], row[3], row[4]),) for row in seeded])
+        conn.executemany(
+            "INSERT INTO budget_goals (category_id, year, month, budgeted_amount) VALUES (?, ?, ?, ?)",
+            [(cat_id, year, month, round(rng.uniform(50, 900), 2))
+             for cat_id in sub_ids for year in range(start.year, today.year + 1) for month in range(1, 13)])
+        pay_date = start
+        while pay_date <= today:
+            gross = round(rng.uniform(3000, 4000), 2)
+            net_id = conn.execute("INSERT INTO transactions (amount, category_id, date, type, description, fingerprint) "
+                                  "VALUES (?, NULL, ?, 'income', 'Net Pay - Seed', ?)",
+                                  (gross * 0.7, pay_date.isoformat(), transaction_fingerprint(gross * 0.7, 'income', 'Net Pay - Seed'))).lastrowid
+            paycheck_id = conn.execute("INSERT INTO paychecks (pay_date, employer_name, gross_pay, net_pay_transaction_id) "
+                                       "VALUES (?, 'Seed Co', ?, ?)", (pay_date.isoformat(), gross, net_id)).lastrowid
+            conn.executemany("INSERT INTO paycheck_deductions (paycheck_id, description, amount, type) VALUES (?, ?, ?, ?)",
+                             [(paycheck_id, 'Federal Income Tax', gross * 0.2, 'TAX'),
+                              (paycheck_id, '401k', gross * 0.1, 'PRETAX_RETIREMENT')])
+            pay_date += datetime.timedelta(days=14)
+        conn.executemany("INSERT INTO goals (name, target_amount, current_amount) VALUES (?, ?, 0)",
+                         [(f"Seed goal {i}", 5000 + 1000 * i) for i in range(5)])
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+# --- Workload ---
+
+def run_workload(app, db_path):
+    """
+    Calls each endpoint once through the test client, recording the SQL it runs.
+    Returns:
+        dict: normalized key -> {'sql', 'sources', 'hot'} (sql is one expanded example).
+    """
+    from flask import g
+    from app.database import get_db
+    statements = {}
+    current = {'source': None, 'hot': False}
+
+    def record(sql):
+        text = ' '.join(sql.split())
+        if not text or text.upper().startswith(SKIP_PREFIXES):
+            return
+        key = statement_key(text)
+        entry = statements.setdefault(key, {'sql': text, 'sources': [], 'hot': False})
+        if current['source'] not in entry['sources']:
+            entry['sources'].append(current['source'])
+        entry['hot'] = entry['hot'] or current['hot']
+
+    @app.before_request
+    def trace_queries():
+        get_db().set_trace_callback(record)
+
+    conn = sqlite3.connect(db_path)
+    main_id = conn.execute("SELECT id FROM categories WHERE parent_id IS NULL AND name = 'Food'").fetchone()[0]
+    sub_id = conn.execute("SELECT id FROM categories WHERE parent_id = ? LIMIT 1", (main_id,)).fetchone()[0]
+    goal_id = conn.execute("SELECT MIN(id) FROM goals").fetchone()[0]
+    txn_id = conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+    cursor = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()[0] - 20
+    conn.close()
+
+    today = datetime.date.today()
+    txn_form = {'amount': '12.34', 'final_category_id': sub_id, 'date': today.isoformat(), 'type': 'expense'}
+    # (source, hot, method, path, kwargs)
+    workload = [
+        ('dashboard', True, 'get', '/', {}),
+        ('dashboard_yearly', True, 'get', '/?period_type=yearly', {}),
+        ('dashboard_focus', True, 'get', f'/?main_cat_focus={main_id}', {}),
+        ('dashboard_past_month', True, 'get', f'/?year={today.year - 1}&month=6', {}),
+        ('charts_api', True, 'get', f'/analytics/api/charts?main_cat_focus={main_id}', {}),
+        ('cash_flow', True, 'get', f'/analytics/api/cash_flow?start_date={today - datetime.timedelta(days=45)}&end_date={today}', {}),
+        ('add_transaction', True, 'post', '/transactions/add', {'data': txn_form}),
+        ('update_transaction', True, 'post', f'/transactions/update/{txn_id}', {'data': txn_form}),
+        ('delete_transaction', True, 'post', f'/transactions/delete/{txn_id}', {}),
+        ('sync_delta', True, 'get', f'/sync/api/changes?cursor={cursor}', {}),
+        ('cube', False, 'get', '/analytics/api/cube?level=category&by_month=true', {}),
+        ('goals_list', False, 'get', '/goals/api/list', {}),
+        ('goal_contribute', False, 'post', f'/goals/api/{goal_id}/contribute', {'data': {'amount': '50', 'date': today.isoformat()}}),
+        ('budget_planning', False, 'get', f'/budget/get_planning_data?year={today.year}&month={today.month}', {}),
+        ('budget_save', False, 'post', '/budget/set', {'data': {'year': today.year, 'month': today.month,
+                                                                'budget_category_id': [sub_id], 'budgeted_amount': ['321']}}),
+        ('nws_ratios', False, 'get', '/budget/api/nws_ratios', {}),
+        ('duplicate_report', False, 'get', '/transactions/api/duplicates', {}),
+        ('payroll_ytd', False, 'get', '/paychecks/api/analytics/ytd', {}),
+        ('tax_rate_trend', False, 'get', f'/paychecks/api/analytics/tax_rate_trend?start_year={today.year - 2}', {}),
+        ('paycheck_log', False, 'post', '/paychecks/log', {'json': {'pay_date': today.isoformat(), 'gross_pay': '3000',
+                                                                   'deductions': [{'description': 'Tax', 'amount': '300', 'type': 'TAX'}]}}),
+        ('categories_save', False, 'post', '/categories/save_all_category_changes',
+         {'json': {'new_sub_categories': [{'name': 'Plan check', 'parent_id': main_id}]}}),
+    ]
+    client = app.test_client()
+    for source, hot, method, path, kwargs in workload:
+        current.update(source=source, hot=hot)
+        response = getattr(client, method)(path, **kwargs)
+        if response.status_code >= 400:
+            print(f"warning: {source} returned HTTP {response.status_code}", file=sys.stderr)
+    return statements
+
+
+# --- Analysis ---
+
+def statement_key(sql):
+    """Normalizes literals and IN lists so one statement shape maps to one key."""
+    text = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    text = re.sub(r'\b\d+(?:\.\d+)?\b', '?', text)
+    text = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?...)', text)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def transactions_aliases(sql):
+    names = {'transactions'}
+    for alias in re.findall(r'\btransactions\s+(?:AS\s+)?(\w+)', sql, flags=re.IGNORECASE):
+        if alias.upper() not in SQL_KEYWORDS:
+            names.add(alias)
+    return names
+
+def scanned_tables(plan, sql):
+    """Tables (transactions aliases normalized to 'transactions') that the plan reads with a full SCAN."""
+    aliases = transactions_aliases(sql)
+    scanned = set()
+    for detail in plan:
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if match:
+            name = match.group(1)
+            scanned.add('transactions' if name in aliases else name)
+    return scanned
+
+def analyze(db_path, statements):
+    """Adds 'plan', 'scans' and (for SELECTs) 'vm_steps' to each recorded statement."""
+    conn = sqlite3.connect(db_path)
+    steps = [0]
+
+    def count_steps():
+        steps[0] += VM_STEP_GRANULARITY
+        return 0
+
+    for entry in statements.values():
+        sql = entry['sql']
+        try:
+            entry['plan'] = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+        except sqlite3.Error as e:
+            entry['plan'] = [f"error: {e}"]
+        entry['scans'] = sorted(scanned_tables(entry['plan'], sql))
+        entry['vm_steps'] = None
+        if sql.upper().startswith(('SELECT', 'WITH')):
+            steps[0] = 0
+            conn.set_progress_handler(count_steps, VM_STEP_GRANULARITY)
+            try:
+                conn.execute(sql).fetchall()
+                entry['vm_steps'] = steps[0]
+            except sqlite3.Error:
+                pass
+            finally:
+                conn.set_progress_handler(None, 0)
+    conn.close()
+    return statements
+
+def compare(current, baseline, tolerance):
+    """Returns (failures, notes) as lists of strings."""
+    failures, notes = [], []
+    known = baseline.get('queries', {})
+    for key, entry in sorted(current.items(), key=lambda item: item[1]['sources'][0]):
+        label = f"[{key}] {', '.join(entry['sources'])}: {entry['sql'][:140]}"
+        base = known.get(key)
+        if entry['hot'] and 'transactions' in entry['scans'] and not (base and base.get('allowed_scan')):
+            failures.append(f"hot-path SCAN transactions {label}\n      plan: {entry['plan']}")
+        if base is None:
+            notes.append(f"new statement {label}")
+            continue
+        new_scans = set(entry['scans']) - set(base.get('scans', []))
+        if new_scans:
+            failures.append(f"now scans {', '.join(sorted(new_scans))} {label}\n      was: {base['plan']}\n      now: {entry['plan']}")
+        elif entry['plan'] != base.get('plan'):
+            notes.append(f"plan changed {label}\n      was: {base['plan']}\n      now: {entry['plan']}")
+        if entry['vm_steps'] is not None and base.get('vm_steps'):
+            limit = base['vm_steps'] * (1 + tolerance) + VM_STEP_GRANULARITY * 10
+            if entry['vm_steps'] > limit:
+                failures.append(f"VM steps {base['vm_steps']} -> {entry['vm_steps']} {label}")
+    for key in sorted(set(known) - set(current)):
+        notes.append(f"statement no longer issued [{key}]: {known[key]['sql'][:140]}")
+    return failures, notes
+
+def write_baseline(path, current, rows):
+    queries = {}
+    for key, entry in sorted(current.items()):
+        queries[key] = {
+            'sql': entry['sql'], 'sources': entry['sources'], 'hot': entry['hot'],
+            'plan': entry['plan'], 'scans': entry['scans'], 'vm_steps': entry['vm_steps'],
+            # Hot-path scans present when the baseline is taken are recorded as known
+            'allowed_scan': entry['hot'] and 'transactions' in entry['scans'],
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'rows': rows, 'sqlite_version': sqlite3.sqlite_version, 'queries': queries}, f, indent=1, sort_keys=True)
+        f.write('\n')
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description='Check application query plans against a recorded baseline.')
+    parser.add_argument('--rows', type=int, default=None, help=f'Transactions to seed (default: baseline value or {DEFAULT_ROWS}).')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline file (default: query_plan_baseline.json).')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the current plans as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed VM step growth over baseline (default: 0.5 = 50%%).')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    rows = args.rows or baseline.get('rows') or DEFAULT_ROWS
+
+    sys.path.insert(0, PROJECT_ROOT)
+    from app import create_app
+    scratch_dir = tempfile.mkdtemp(prefix='budget-plan-check-')
+    try:
+        db_path = os.path.join(scratch_dir, 'budget.db')
+        seed_database(db_path, rows, args.seed)
+        app = create_app({'DATABASE': db_path, 'TESTING': True, 'JINJA_BYTECODE_CACHE_DIR': None,
+                          'REPORT_OUTPUT_DIR': os.path.join(scratch_dir, 'reports')})
+        current = analyze(db_path, run_workload(app, db_path))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    if args.update_baseline:
+        queries = write_baseline(args.baseline, current, rows)
+        allowed = [q for q in queries.values() if q['allowed_scan']]
+        print(f"Baseline written to {args.baseline}: {len(queries)} statements, {len(allowed)} known hot-path scans.")
+        for q in allowed:
+            print(f"  known scan ({', '.join(q['sources'])}): {q['sql'][:140]}")
+        return 0
+
+    if not baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline first.", file=sys.stderr)
+        return 1
+    if baseline.get('sqlite_version') != sqlite3.sqlite_version:
+        print(f"note: baseline taken with SQLite {baseline.get('sqlite_version')}, running {sqlite3.sqlite_version}")
+    failures, notes = compare(current, baseline, args.tolerance)
+    for note in notes:
+        print(f"NOTE {note}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print(f"{len(current)} statements checked ({rows} seeded transactions): {len(failures)} failures, {len(notes)} notes.")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())